@@ -6,11 +6,28 @@ Version: 1.0
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from roots_engine import (
+    CASH_FLOW_FREQUENCIES, COST_SHEETS, DUE_KINDS, EXPORT_FORMATS, EntryJournal, WorkbookData, WorkbookDatabase, build_updated_workbook, complete_entry_row,
+    compute_summary_metrics, content_hash, current_trace, finish_trace, frame_fingerprint, get_cash_flow_ledger, get_crop_season_pnl, get_dimension, get_dues_index, get_report_filter_values, get_running_totals,
+    get_season_rollup, export_report, read_sheet_columns, select_report_rows, start_trace, summarize_traces, timed_span
+)
 
 # ====================
 # PAGE CONFIGURATION
@@ -57,12 +74,210 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# ====================
+# CACHE CONFIGURATION
+# ====================
+# Uploaded workbooks shared by every session; the least recently used one is evicted first.
+# ROOTS_WORKBOOK_CACHE_ENTRIES caps how many are kept and ROOTS_WORKBOOK_CACHE_MB sets
+# the memory budget for all of them together.
+WORKBOOK_CACHE_MAX_ENTRIES = int(os.environ.get('ROOTS_WORKBOOK_CACHE_ENTRIES', 50))
+WORKBOOK_CACHE_MAX_MB = int(os.environ.get('ROOTS_WORKBOOK_CACHE_MB', 1024))
+
+# Per-sheet Arrow snapshots of uploaded workbooks, shared by all sessions and restarts.
+# The first page to need a sheet parses all of it once to write its snapshot, so later
+# column reads come from disk. Set ROOTS_SNAPSHOT_DIR to an empty string to parse from the
+# xlsx instead, streaming just the needed columns. Like the databases, only the most
+# recently loaded WORKBOOK_CACHE_MAX_ENTRIES snapshot directories are kept.
+SNAPSHOT_DIR = os.environ.get(
+    'ROOTS_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.roots_cache')
+)
+
+# Optional SQL storage: set ROOTS_DATABASE_DIR to keep every uploaded workbook, and the rows
+# entered for it, in an indexed SQLite database there. Summary metrics, crop comparison and
+# season analysis then total the cost and sales sheets in SQL rather than in memory; cash flow,
+# dues, reports and master data still read the sheets. Only the most recently loaded
+# WORKBOOK_CACHE_MAX_ENTRIES databases are kept, always including those of cached workbooks.
+DATABASE_DIR = os.environ.get('ROOTS_DATABASE_DIR', '')
+
+# Dashboard names of the cost sheet registry's production phases
+PHASE_LABELS = {'PRE_PROD': "Pre-production", 'PROD': "Production", 'POST_PROD': "Post-production"}
+
+# Rows per page offered by the Reports tables
+REPORT_PAGE_SIZES = [25, 50, 100, 250]
+
+# Comparison tables longer than this skip the profit colour gradient and keep only column formats
+STYLED_TABLE_MAX_ROWS = 500
+
+# RdYlGn colour stops, lowest value first, for the profit gradient on comparison tables
+GRADIENT_COLORS = ['#a50026', '#d73027', '#f46d43', '#fdae61', '#fee08b', '#ffffbf',
+                   '#d9ef8b', '#a6d96a', '#66bd63', '#1a9850', '#006837']
+
+# Plotly figures kept for reuse across reruns and sessions; the least recently used one is evicted first
+FIGURE_CACHE_MAX_ENTRIES = 64
+
+# Background threads that prepare every page's aggregates and figures after an upload
+PRECOMPUTE_WORKERS = 2
+
+# Reruns whose timing spans are kept for the performance panel in Settings
+PROFILE_MAX_RERUNS = 20
+
+# ====================
+# CLASS: WORKBOOK CACHE
+# ====================
+class WorkbookCache:
+    """LRU store of parsed workbooks keyed by a hash of the uploaded bytes, shared by every session
+
+    Sessions uploading the same file get the same WorkbookData, so its parsed sheets
+    and derived aggregates are held once per distinct workbook rather than once per
+    user. Sessions only read from it; entered rows reach it through the entry journal.
+    """
+
+    def __init__(self, max_entries=WORKBOOK_CACHE_MAX_ENTRIES, max_mb=WORKBOOK_CACHE_MAX_MB):
+        self.max_entries = max_entries
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._entries = OrderedDict()  # content hash -> WorkbookData
+        self._usage = {}  # content hash -> sessions, hits and times for the admin view
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self):
+        # Workbooks grow as pages parse more sheets, so measure on demand
+        return sum(workbook.nbytes for workbook in list(self._entries.values()))
+
+    def get(self, key, session_id=None):
+        """Return the cached workbook for a key and mark it as recently used"""
+        with self._lock:
+            workbook = self._entries.get(key)
+            if workbook is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            self._touch(key, session_id, hit=True)
+            self._evict()
+            return workbook
+
+    def peek(self, key):
+        """Return the cached workbook for a key without counting a hit or marking it as used"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, workbook, session_id=None):
+        """Store a workbook and evict least recently used ones over the limits
+
+        Returns the stored workbook, which is an earlier one for the same key when
+        another session loaded it first.
+        """
+        with self._lock:
+            stored = self._entries.setdefault(key, workbook)
+            self._entries.move_to_end(key)
+            self._usage.setdefault(key, {'sessions': set(), 'hits': 0, 'loaded_at': datetime.now()})
+            self._touch(key, session_id)
+            self._evict()
+            return stored
+
+    def _touch(self, key, session_id, hit=False):
+        usage = self._usage[key]
+        usage['last_used'] = datetime.now()
+        usage['hits'] += hit
+        if session_id is not None:
+            usage['sessions'].add(session_id)
+
+    def _evict(self):
+        # Always keep the newest workbook, even if it alone exceeds the size limit
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            key, workbook = self._entries.popitem(last=False)
+            self._usage.pop(key, None)
+            workbook.detach_database()
+            self.evictions += 1
+            self.evicted_bytes += workbook.nbytes
+
+    def stats(self):
+        """One row per held workbook, most recently used first"""
+        with self._lock:
+            rows = [
+                (key[:12], len(workbook.sheet_stats()), workbook.nbytes / 1024 / 1024,
+                 len(self._usage[key]['sessions']), self._usage[key]['hits'],
+                 self._usage[key]['loaded_at'], self._usage[key]['last_used'])
+                for key, workbook in reversed(self._entries.items())
+            ]
+        return pd.DataFrame(rows, columns=['Workbook', 'Parsed Sheets', 'Memory (MB)', 'Sessions',
+                                           'Hits', 'Loaded', 'Last Used'])
+
+    def keys(self):
+        """Content hashes of the held workbooks"""
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+# ====================
+# CLASS: FIGURE CACHE
+# ====================
+class FigureCache:
+    """LRU cache of built Plotly figures, keyed by chart, options and a fingerprint of the data
+
+    Shared by every session, so cached figures must not be modified after they
+    are returned; build_figure applies trace updates before storing them.
+    """
+
+    def __init__(self, max_entries=FIGURE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # cache key -> Plotly figure
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            fig = self._entries.get(key)
+            if fig is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return fig
+
+    def put(self, key, fig):
+        with self._lock:
+            self._entries[key] = fig
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+# ====================
+# DATA ENTRY JOURNAL
+# ====================
+# Rows entered through the forms, kept until they are flushed into an updated workbook
+JOURNAL_PATH = os.environ.get(
+    'ROOTS_JOURNAL_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roots_journal.jsonl')
+)
+entry_journal = EntryJournal(JOURNAL_PATH)
+
 # ====================
 # SESSION STATE INITIALIZATION
 # ====================
 if 'excel_file' not in st.session_state:
     st.session_state.excel_file = None
 
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+if 'rerun_traces' not in st.session_state:
+    st.session_state.rerun_traces = deque(maxlen=PROFILE_MAX_RERUNS)
+
 # ====================
 # FUNCTION: CREATE SAMPLE EXCEL
 # ====================
@@ -237,17 +452,428 @@ def create_sample_excel():
     output.seek(0)
     return output
 
+@st.cache_resource(show_spinner=False)
+def get_sample_template_bytes():
+    """Build the sample template once per process and share the bytes across sessions"""
+    return create_sample_excel().getvalue()
+
 # ====================
 # FUNCTION: LOAD EXCEL DATA
 # ====================
-def load_excel_data(uploaded_file):
-    """Load all sheets from the uploaded Excel file"""
+@st.cache_resource(show_spinner=False)
+def get_workbook_cache():
+    """One workbook store per process, shared across sessions"""
+    return WorkbookCache()
+
+def prune_workbook_files(directory, keep, cached, suffix=''):
+    """Delete workbook files or directories beyond the keep most recently loaded, never those of cached workbooks
+
+    Each is named by its workbook's content hash plus suffix. A database and a snapshot directory are written per uploaded version of a workbook,
+    so without this they pile up. The workbook cache evicts by use rather than by load,
+    so a workbook's files are kept for as long as it is cached, however long ago it was
+    loaded; the others, left by evicted workbooks or earlier runs, are kept newest first
+    in the room that remains.
+    """
+    held = {f"{key}{suffix}" for key in cached}
     try:
-        excel_data = pd.read_excel(uploaded_file, sheet_name=None)
+        paths = [
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.endswith(suffix) and re.fullmatch(r'[0-9a-f]{64}', name[:len(name) - len(suffix)]) and name not in held
+        ]
+        paths.sort(key=os.path.getmtime, reverse=True)
+    except OSError:
+        return
+    for path in paths[max(keep - len(held), 0):]:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError:
+            pass
+
+def load_excel_data(uploaded_file):
+    """Open the uploaded Excel file, reusing the cached workbook and its parsed sheets on reruns"""
+    file_bytes = uploaded_file.getvalue()
+    cache = get_workbook_cache()
+    key = content_hash(file_bytes)
+    
+    excel_data = cache.get(key, st.session_state.session_id)
+    if excel_data is not None:
+        entry_journal.sync(excel_data)
+        st.session_state.workbook_key = key
         return excel_data
+    
+    try:
+        snapshot_dir = os.path.join(SNAPSHOT_DIR, key) if SNAPSHOT_DIR else None
+        excel_data = WorkbookData(file_bytes, content_key=key, snapshot_dir=snapshot_dir)
     except Exception as e:
         st.error(f"Error loading Excel file: {e}")
         return None
+    
+    # A re-upload of the session's last workbook only parses the sheets that changed; only
+    # xlsx files have the sheet fingerprints that tell which did
+    previous = cache.peek(st.session_state.get('workbook_key'))
+    if previous is not None and excel_data.sheet_fingerprints() and previous.sheet_fingerprints():
+        changed = excel_data.reuse_unchanged(previous)
+        if len(changed) < len(excel_data):
+            st.toast(f"{len(changed)} of {len(excel_data)} sheets changed since the last upload; the rest were reused.")
+    
+    if DATABASE_DIR:
+        try:
+            excel_data.attach_database(WorkbookDatabase(os.path.join(DATABASE_DIR, f"{key}.sqlite")))
+        except Exception as e:
+            st.error(f"Error importing into the database, continuing in memory: {e}")
+    
+    entry_journal.sync(excel_data)
+    stored = cache.put(key, excel_data, st.session_state.session_id)
+    if stored is excel_data:
+        start_precompute(excel_data)
+    else:
+        # Another session loaded this workbook first; its database connection is the one kept
+        excel_data.detach_database()
+    # Only now is this workbook among the cached ones whose files are kept
+    if SNAPSHOT_DIR:
+        prune_workbook_files(SNAPSHOT_DIR, keep=cache.max_entries, cached=cache.keys())
+    if DATABASE_DIR:
+        prune_workbook_files(DATABASE_DIR, keep=cache.max_entries, cached=cache.keys(), suffix='.sqlite')
+    st.session_state.workbook_key = key
+    return stored
+
+# ====================
+# FUNCTION: BUILD FIGURES
+# ====================
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    """One figure cache per process, shared across sessions"""
+    return FigureCache()
+
+def build_figure(chart, data, traces=None, figure_cache=None, **options):
+    """Build a Plotly Express figure, or reuse one built from identical data and options
+
+    Timed as a span of the current rerun, noting whether the figure came from the cache.
+    Background threads pass the figure cache in, since Streamlit's caches belong to the script thread.
+    """
+    with timed_span(f"figure {options.get('title', chart.__name__)}", rows=len(data)) as span:
+        cache = figure_cache if figure_cache is not None else get_figure_cache()
+        key = (
+            chart.__name__,
+            frame_fingerprint(data),
+            json.dumps(options, sort_keys=True, default=str),
+            json.dumps(traces, sort_keys=True, default=str)
+        )
+        fig = cache.get(key)
+        span['cache'] = 'hit' if fig is not None else 'miss'
+        if fig is None:
+            fig = chart(data, **options)
+            if traces:
+                fig.update_traces(**traces)
+            cache.put(key, fig)
+    return fig
+
+# ====================
+# FUNCTION: PAGE FIGURES
+# ====================
+# Shared by the pages and the background precomputation, so both build figures with the same cache keys
+def dashboard_figures(excel_data, metrics, figure_cache=None):
+    """Cost distribution pie (None when nothing was spent) and revenue vs cost bar of the dashboard"""
+    # Cost breakdown read from the running category totals
+    cost_by_category = get_running_totals(excel_data).cost_by_category
+    categories = [category for _, _, category, _ in COST_SHEETS]
+    df_costs = pd.DataFrame({
+        'Category': categories,
+        'Amount': [cost_by_category.get(category, 0) for category in categories]
+    })
+    df_costs = df_costs[df_costs['Amount'] > 0]
+    
+    fig_pie = None
+    if not df_costs.empty:
+        fig_pie = build_figure(px.pie, df_costs, values='Amount', names='Category', 
+                               title='Cost Distribution by Category',
+                               color_discrete_sequence=px.colors.sequential.Greens,
+                               figure_cache=figure_cache)
+    
+    # Revenue vs Cost bar chart
+    comparison_data = {
+        'Metric': ['Total Cost', 'Total Revenue'],
+        'Amount': [metrics['total_cost'], metrics['total_revenue']]
+    }
+    df_comparison = pd.DataFrame(comparison_data)
+    
+    fig_bar = build_figure(px.bar, df_comparison, x='Metric', y='Amount',
+                           title='Revenue vs Cost Comparison',
+                           color='Metric',
+                           color_discrete_map={'Total Cost': '#ef5350', 'Total Revenue': '#66bb6a'},
+                           figure_cache=figure_cache)
+    return fig_pie, fig_bar
+
+def cash_flow_figures(flows, figure_cache=None):
+    """Outflow vs inflow bars per period and the cumulative net cash line of the dashboard"""
+    fig_flows = build_figure(px.bar, flows, x='Period', y=['Outflow', 'Inflow'],
+                             title='Cash Outflow vs Inflow',
+                             barmode='group',
+                             color_discrete_map={'Outflow': '#ef5350', 'Inflow': '#66bb6a'},
+                             figure_cache=figure_cache)
+    fig_net = build_figure(px.line, flows, x='Period', y='Cumulative_Net',
+                           title='Cumulative Net Cash',
+                           markers=True,
+                           figure_cache=figure_cache)
+    return fig_flows, fig_net
+
+def working_capital_figure(history, figure_cache=None):
+    """One crop season's working capital after each of its dated rows, as a step line"""
+    return build_figure(px.line, history, x='Date', y='Working_Capital',
+                        title='Working Capital',
+                        line_shape='hv',
+                        markers=True,
+                        hover_data=['Outflow', 'Inflow'],
+                        figure_cache=figure_cache)
+
+def season_to_date_table(excel_data, cash_flow, as_of):
+    """Cost, revenue and profit of each season up to a date, named by season where MASTER_Season knows it"""
+    totals = cash_flow.season_to_date(as_of)
+    season_ids = totals.pop('Season_ID').astype(object)
+    names = pd.Series(get_dimension(excel_data, 'season').lookup('Season_Name', season_ids), index=totals.index, dtype=object)
+    totals.insert(0, 'Season', names.fillna(season_ids))
+    return totals
+
+def crop_comparison_table(excel_data):
+    """Per crop season comparison table with display column names"""
+    pnl = get_crop_season_pnl(excel_data)
+    return pnl.rename(columns={
+        'Crop_Name': 'Crop',
+        'Area_Acres': 'Area (Acres)',
+        'Total_Cost': 'Total Cost',
+        'Total_Revenue': 'Total Revenue',
+        'Profit': 'Profit/Loss',
+        'ROI': 'ROI (%)',
+        'Cost_Per_Acre': 'Cost per Acre',
+        'Revenue_Per_Acre': 'Revenue per Acre',
+        'Yield_Per_Acre': 'Yield per Acre'
+    })[['Crop', 'Crop_Season_ID', 'Area (Acres)', 'Total Cost', 'Total Revenue', 'Profit/Loss',
+        'ROI (%)', 'Cost per Acre', 'Revenue per Acre', 'Yield per Acre']]
+
+def crop_comparison_figures(df_comparison, figure_cache=None):
+    """Profit, ROI, cost vs revenue per acre and yield per acre bars of the crop comparison page"""
+    fig_profit = build_figure(
+        px.bar,
+        df_comparison, 
+        x='Crop', 
+        y='Profit/Loss',
+        title='Profit/Loss by Crop',
+        color='Profit/Loss',
+        color_continuous_scale=['red', 'yellow', 'green'],
+        text='Profit/Loss',
+        traces=dict(texttemplate='₹%{text:,.0f}', textposition='outside'),
+        figure_cache=figure_cache
+    )
+    fig_roi = build_figure(
+        px.bar,
+        df_comparison,
+        x='Crop',
+        y='ROI (%)',
+        title='Return on Investment (%) by Crop',
+        color='ROI (%)',
+        color_continuous_scale='Greens',
+        text='ROI (%)',
+        traces=dict(texttemplate='%{text:.1f}%', textposition='outside'),
+        figure_cache=figure_cache
+    )
+    fig_cost = build_figure(
+        px.bar,
+        df_comparison,
+        x='Crop',
+        y=['Cost per Acre', 'Revenue per Acre'],
+        title='Cost vs Revenue per Acre',
+        barmode='group',
+        color_discrete_map={'Cost per Acre': '#ef5350', 'Revenue per Acre': '#66bb6a'},
+        figure_cache=figure_cache
+    )
+    fig_yield = build_figure(
+        px.bar,
+        df_comparison,
+        x='Crop',
+        y='Yield per Acre',
+        title='Yield per Acre (Quintals)',
+        color='Yield per Acre',
+        color_continuous_scale='Blues',
+        text='Yield per Acre',
+        traces=dict(texttemplate='%{text:.1f}', textposition='outside'),
+        figure_cache=figure_cache
+    )
+    return fig_profit, fig_roi, fig_cost, fig_yield
+
+def season_table(season_data):
+    """Crops of one season with display column names"""
+    return season_data.rename(columns={
+        'Crop_Name': 'Crop',
+        'Area_Acres': 'Area (Acres)',
+        'Total_Cost': 'Cost',
+        'Total_Revenue': 'Revenue'
+    })[['Crop', 'Area (Acres)', 'Cost', 'Revenue', 'Profit']].reset_index(drop=True)
+
+def season_figures(df_season, season, figure_cache=None):
+    """Land distribution pie and profit by crop bar for one season"""
+    fig_area = build_figure(
+        px.pie,
+        df_season,
+        values='Area (Acres)',
+        names='Crop',
+        title=f'Land Distribution - {season} Season',
+        color_discrete_sequence=px.colors.sequential.Greens,
+        figure_cache=figure_cache
+    )
+    fig_profit = build_figure(
+        px.bar,
+        df_season,
+        x='Crop',
+        y='Profit',
+        title=f'Profit by Crop - {season} Season',
+        color='Profit',
+        color_continuous_scale=['red', 'yellow', 'green'],
+        figure_cache=figure_cache
+    )
+    return fig_area, fig_profit
+
+def season_comparison_figures(df_all_seasons, figure_cache=None):
+    """Cost vs revenue and ROI bars comparing all seasons"""
+    fig_seasons = build_figure(
+        px.bar,
+        df_all_seasons,
+        x='Season',
+        y=['Total Cost', 'Total Revenue'],
+        title='Cost vs Revenue by Season',
+        barmode='group',
+        color_discrete_map={'Total Cost': '#ef5350', 'Total Revenue': '#66bb6a'},
+        figure_cache=figure_cache
+    )
+    fig_roi = build_figure(
+        px.bar,
+        df_all_seasons,
+        x='Season',
+        y='ROI (%)',
+        title='Return on Investment by Season',
+        color='ROI (%)',
+        color_continuous_scale='Greens',
+        text='ROI (%)',
+        traces=dict(texttemplate='%{text:.1f}%', textposition='outside'),
+        figure_cache=figure_cache
+    )
+    return fig_seasons, fig_roi
+
+# ====================
+# FUNCTION: PRECOMPUTE PAGES
+# ====================
+@st.cache_resource(show_spinner=False)
+def get_precompute_pool():
+    """One pool of background threads per process, shared across sessions"""
+    return ThreadPoolExecutor(max_workers=PRECOMPUTE_WORKERS, thread_name_prefix='roots-precompute')
+
+def precompute_pages(excel_data, figure_cache):
+    """Build every page's aggregates and figures ahead of the first visit; returns the time taken in ms
+    
+    Runs on a background thread. Results land in the workbook's derived aggregates
+    and the shared figure cache, where the pages find them when they are opened.
+    """
+    started = time.perf_counter()
+    
+    metrics = compute_summary_metrics(excel_data)
+    dashboard_figures(excel_data, metrics, figure_cache)
+    cash_flow = get_cash_flow_ledger(excel_data)
+    if len(cash_flow):
+        cash_flow_figures(cash_flow.flows(), figure_cache)
+    
+    if 'Crop_Season_Master' in excel_data:
+        df_comparison = crop_comparison_table(excel_data)
+        if not df_comparison.empty:
+            crop_comparison_figures(df_comparison, figure_cache)
+        
+        if 'MASTER_Season' in excel_data:
+            crop_seasons = get_crop_season_pnl(excel_data)
+            for season in crop_seasons['Season_Name'].dropna().unique():
+                season_data = crop_seasons[crop_seasons['Season_Name'] == season]
+                season_figures(season_table(season_data), season, figure_cache)
+            season_comparison_figures(get_season_rollup(excel_data), figure_cache)
+    
+    get_dues_index(excel_data)
+    
+    # Report sheets are not parsed here; a report reads its whole sheet only when it is opened
+    return (time.perf_counter() - started) * 1000
+
+def start_precompute(excel_data):
+    """Start preparing every page of a newly loaded workbook without blocking this rerun"""
+    future = get_precompute_pool().submit(precompute_pages, excel_data, get_figure_cache())
+    st.session_state.precompute = (excel_data.content_key, future)
+
+# ====================
+# FUNCTION: DISPLAY TABLES
+# ====================
+def gradient_css(values):
+    """Cell CSS shading each value from red (lowest) to green (highest), computed for the whole column at once"""
+    values = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+    css = np.full(len(values), '', dtype=object)
+    known = ~np.isnan(values)
+    if not known.any():
+        return css
+    
+    low, high = values[known].min(), values[known].max()
+    position = (values[known] - low) / (high - low) if high > low else np.zeros(known.sum())
+    stops = np.linspace(0, 1, len(GRADIENT_COLORS))
+    palette = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in GRADIENT_COLORS])
+    rgb = np.column_stack([np.interp(position, stops, palette[:, channel]) for channel in range(3)]).round().astype(int)
+    
+    # Light text on dark cells, using the same luminance threshold as Styler.background_gradient
+    linear = rgb / 255
+    linear = np.where(linear <= 0.03928, linear / 12.92, ((linear + 0.055) / 1.055) ** 2.4)
+    luminance = linear @ np.array([0.2126, 0.7152, 0.0722])
+    text = np.where(luminance < 0.408, '#f1f1f1', '#000000')
+    
+    hex_codes = np.char.mod('%02x', rgb)
+    background = np.char.add(np.char.add('#', hex_codes[:, 0]), np.char.add(hex_codes[:, 1], hex_codes[:, 2]))
+    css[known] = np.char.add(np.char.add(np.char.add('background-color: ', background), '; color: '), text)
+    return css
+
+def display_table(df, formats, gradient_column=None):
+    """Show a table formatted by column_config, shading gradient_column when the table is small enough
+
+    Formats are printf-style strings such as '₹%,.0f' or '%.2f%%' and are applied
+    in the browser. Only tables up to STYLED_TABLE_MAX_ROWS rows go through a
+    Styler, and then just to attach the precomputed gradient colours.
+    """
+    column_config = {
+        column: st.column_config.NumberColumn(column, format=number_format)
+        for column, number_format in formats.items() if column in df
+    }
+    data = df
+    if gradient_column in df and len(df) <= STYLED_TABLE_MAX_ROWS:
+        css = pd.DataFrame('', index=df.index, columns=df.columns)
+        css[gradient_column] = gradient_css(df[gradient_column])
+        data = df.style.apply(lambda _: css, axis=None)
+    st.dataframe(data, use_container_width=True, column_config=column_config)
+
+# ====================
+# FUNCTION: PAGE FRAGMENTS
+# ====================
+def page_fragment(function):
+    """Make a page section a Streamlit fragment, so its own widgets rerun just that section
+
+    A fragment rerun skips main() and with it the sidebar, workbook lookup and
+    summary metrics; the section works on the data it was last given. Such a
+    rerun is traced on its own, so it shows up in the performance panel.
+    """
+    @functools.wraps(function)
+    def run(*args, **kwargs):
+        span = f"fragment {function.__name__}"
+        if current_trace() is not None:
+            with timed_span(span):
+                return function(*args, **kwargs)
+        start_trace()
+        try:
+            with timed_span(span):
+                return function(*args, **kwargs)
+        finally:
+            st.session_state.rerun_traces.append(finish_trace())
+    return st.fragment(run)
 
 # ====================
 # FUNCTION: CALCULATE SUMMARY METRICS
@@ -257,29 +883,8 @@ def calculate_summary_metrics(excel_data):
     metrics = {}
     
     try:
-        # Calculate costs from different sheets
-        land_prep_cost = excel_data.get('PRE_PROD_Land_Preparation', pd.DataFrame())['Total_Cost'].sum() if 'PRE_PROD_Land_Preparation' in excel_data else 0
-        seed_cost = excel_data.get('PRE_PROD_Seed_Costs', pd.DataFrame())['Total_Seed_Cost'].sum() if 'PRE_PROD_Seed_Costs' in excel_data else 0
-        manure_cost = excel_data.get('PRE_PROD_Organic_Manure', pd.DataFrame())['Total_Manure_Cost'].sum() if 'PRE_PROD_Organic_Manure' in excel_data else 0
-        fertilizer_cost = excel_data.get('PROD_Fertilizer_Application', pd.DataFrame())['Total_Fertilizer_Cost'].sum() if 'PROD_Fertilizer_Application' in excel_data else 0
-        irrigation_cost = excel_data.get('PROD_Irrigation_Costs', pd.DataFrame())['Total_Irrigation_Cost'].sum() if 'PROD_Irrigation_Costs' in excel_data else 0
-        
-        # Total costs
-        total_cost = land_prep_cost + seed_cost + manure_cost + fertilizer_cost + irrigation_cost
-        
-        # Revenue
-        total_revenue = excel_data.get('REVENUE_Sales', pd.DataFrame())['Gross_Revenue'].sum() if 'REVENUE_Sales' in excel_data else 0
-        
-        # Profit
-        net_profit = total_revenue - total_cost
-        roi = (net_profit / total_cost * 100) if total_cost > 0 else 0
-        
-        metrics = {
-            'total_cost': total_cost,
-            'total_revenue': total_revenue,
-            'net_profit': net_profit,
-            'roi': roi
-        }
+        with timed_span('summary metrics'):
+            metrics = compute_summary_metrics(excel_data)
     except Exception as e:
         st.error(f"Error calculating metrics: {e}")
     
@@ -312,40 +917,122 @@ def display_dashboard(excel_data, metrics):
     
     col1, col2 = st.columns(2)
     
+    fig_pie, fig_bar = dashboard_figures(excel_data, metrics)
+    
     with col1:
-        # Cost breakdown pie chart
-        cost_data = {
-            'Category': ['Land Preparation', 'Seeds', 'Manure', 'Fertilizers', 'Irrigation'],
-            'Amount': [
-                excel_data.get('PRE_PROD_Land_Preparation', pd.DataFrame())['Total_Cost'].sum() if 'PRE_PROD_Land_Preparation' in excel_data else 0,
-                excel_data.get('PRE_PROD_Seed_Costs', pd.DataFrame())['Total_Seed_Cost'].sum() if 'PRE_PROD_Seed_Costs' in excel_data else 0,
-                excel_data.get('PRE_PROD_Organic_Manure', pd.DataFrame())['Total_Manure_Cost'].sum() if 'PRE_PROD_Organic_Manure' in excel_data else 0,
-                excel_data.get('PROD_Fertilizer_Application', pd.DataFrame())['Total_Fertilizer_Cost'].sum() if 'PROD_Fertilizer_Application' in excel_data else 0,
-                excel_data.get('PROD_Irrigation_Costs', pd.DataFrame())['Total_Irrigation_Cost'].sum() if 'PROD_Irrigation_Costs' in excel_data else 0
-            ]
-        }
-        df_costs = pd.DataFrame(cost_data)
-        df_costs = df_costs[df_costs['Amount'] > 0]
-        
-        if not df_costs.empty:
-            fig_pie = px.pie(df_costs, values='Amount', names='Category', 
-                           title='Cost Distribution by Category',
-                           color_discrete_sequence=px.colors.sequential.Greens)
+        if fig_pie is not None:
             st.plotly_chart(fig_pie, use_container_width=True)
     
     with col2:
-        # Revenue vs Cost bar chart
-        comparison_data = {
-            'Metric': ['Total Cost', 'Total Revenue'],
-            'Amount': [metrics['total_cost'], metrics['total_revenue']]
-        }
-        df_comparison = pd.DataFrame(comparison_data)
-        
-        fig_bar = px.bar(df_comparison, x='Metric', y='Amount',
-                        title='Revenue vs Cost Comparison',
-                        color='Metric',
-                        color_discrete_map={'Total Cost': '#ef5350', 'Total Revenue': '#66bb6a'})
         st.plotly_chart(fig_bar, use_container_width=True)
+    
+    st.caption(" · ".join(
+        f"{PHASE_LABELS.get(phase, phase)}: ₹{amount:,.0f}" for phase, amount in metrics['cost_by_phase'].items()
+    ))
+    
+    display_cash_flow(excel_data)
+
+@page_fragment
+def display_cash_flow(excel_data):
+    """Cash flow per month or week over a date range, and season P&L and crop season working capital at its end"""
+    st.markdown('<p class="sub-header">Cash Flow</p>', unsafe_allow_html=True)
+    
+    cash_flow = get_cash_flow_ledger(excel_data)
+    if not len(cash_flow):
+        st.info("No dated cost or sale rows yet.")
+        return
+    
+    first, last = cash_flow.dates[0].date(), cash_flow.dates[-1].date()
+    col1, col2 = st.columns(2)
+    with col1:
+        frequency = st.selectbox("Frequency", list(CASH_FLOW_FREQUENCIES), key="cash_flow_frequency")
+    with col2:
+        date_range = st.date_input("Period", (first, last), min_value=first, max_value=last, key="cash_flow_dates")
+    start, end = date_range if len(date_range) == 2 else (first, last)
+    
+    fig_flows, fig_net = cash_flow_figures(cash_flow.flows(frequency, start, end))
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(fig_flows, use_container_width=True)
+    with col2:
+        st.plotly_chart(fig_net, use_container_width=True)
+    
+    st.markdown(f"**Season to date, as of {end:%d %b %Y}**")
+    display_table(season_to_date_table(excel_data, cash_flow, end), {
+        'Cost': '₹%,.0f',
+        'Revenue': '₹%,.0f',
+        'Profit': '₹%,.0f'
+    }, gradient_column='Profit')
+    
+    st.markdown(f"**Working capital by crop season, as of {end:%d %b %Y}**")
+    working_capital = cash_flow.working_capital(end)
+    col1, col2 = st.columns(2)
+    with col1:
+        display_table(working_capital, {'Working_Capital': '₹%,.0f'})
+    with col2:
+        crop_season_ids = working_capital['Crop_Season_ID'].dropna().astype(str).tolist()
+        if crop_season_ids:
+            crop_season_id = st.selectbox("Crop Season", crop_season_ids, key="cash_flow_crop_season")
+            history = cash_flow.crop_season_history(crop_season_id, start, end)
+            st.plotly_chart(working_capital_figure(history), use_container_width=True)
+    st.caption("Working capital is the cash put into a crop season and not yet got back from its sales.")
+    if cash_flow.undated_rows:
+        st.caption(f"{cash_flow.undated_rows} rows without a date are left out of the cash flow.")
+
+# ====================
+# FUNCTION: DATA ENTRY HELPERS
+# ====================
+# Entry type -> target sheet, record ID column and prefix, and the columns computed from the inputs
+ENTRY_SHEETS = {
+    "Land Preparation": ('PRE_PROD_Land_Preparation', 'Land_Prep_ID', 'LP', ['Total_Cost']),
+    "Seed Costs": ('PRE_PROD_Seed_Costs', 'Seed_Cost_ID', 'SC', ['Seed_Cost', 'Total_Seed_Cost']),
+    "Fertilizer Application": ('PROD_Fertilizer_Application', 'Fertilizer_ID', 'FR', ['Fertilizer_Cost', 'Total_Fertilizer_Cost']),
+    "Sales Record": ('REVENUE_Sales', 'Sale_ID', 'SL', ['Gross_Revenue', 'Outstanding'])
+}
+
+def next_record_id(excel_data, sheet_name, id_column, prefix):
+    """Next sequential record ID for a sheet, e.g. LP007 when the highest existing one is LP006
+
+    Counting rows instead would repeat an ID after a deletion or a blank row. When no
+    existing ID has the prefix and a number, the count of rows is used.
+    """
+    existing = read_sheet_columns(excel_data, sheet_name, [id_column])
+    ids = existing[id_column].dropna().astype(str) if id_column in existing else pd.Series(dtype=str)
+    numbers = pd.to_numeric(ids.str.extract(rf"^{re.escape(prefix)}(\d+)$")[0], errors='coerce').dropna()
+    highest = int(numbers.max()) if len(numbers) else len(existing)
+    return f"{prefix}{highest + 1:03d}"
+
+def save_entry(excel_data, sheet_name, row, entry_id=None):
+    """Validate a new or edited row and append it to the journal; returns True when it was saved"""
+    if sheet_name not in excel_data:
+        st.error(f"The uploaded workbook has no {sheet_name} sheet.")
+        return False
+    
+    if 'Crop_Season_Master' in excel_data:
+        known_ids = read_sheet_columns(excel_data, 'Crop_Season_Master', ['Crop_Season_ID'])
+        if 'Crop_Season_ID' in known_ids and row.get('Crop_Season_ID') not in set(known_ids['Crop_Season_ID']):
+            st.error(f"Crop Season ID {row.get('Crop_Season_ID')} is not in Crop_Season_Master.")
+            return False
+    
+    entry_journal.record_entry(excel_data, sheet_name, complete_entry_row(sheet_name, row), entry_id)
+    return True
+
+def apply_entry_edits(excel_data, entry_type, entry_ids, editor_key):
+    """Journal the edits, additions and deletions made in the entered-rows editor, one change per row"""
+    sheet_name, id_column, prefix, _ = ENTRY_SHEETS[entry_type]
+    changes = st.session_state[editor_key]
+    entries = excel_data.entries(sheet_name)
+    
+    for position, edits in changes.get('edited_rows', {}).items():
+        entry_id = entry_ids[int(position)]
+        save_entry(excel_data, sheet_name, {**entries[entry_id], **edits}, entry_id)
+    
+    for row in changes.get('added_rows', []):
+        save_entry(excel_data, sheet_name, {**row, id_column: next_record_id(excel_data, sheet_name, id_column, prefix)})
+    
+    for position in changes.get('deleted_rows', []):
+        entry_journal.record_entry(excel_data, sheet_name, None, entry_ids[int(position)])
 
 # ====================
 # FUNCTION: DISPLAY DATA ENTRY FORMS
@@ -379,7 +1066,54 @@ def display_data_entry(excel_data):
             notes = st.text_area("Notes")
             
             if st.form_submit_button("Add Entry"):
-                st.success("Entry added successfully!")
+                row = {
+                    'Land_Prep_ID': next_record_id(excel_data, 'PRE_PROD_Land_Preparation', 'Land_Prep_ID', 'LP'),
+                    'Crop_Season_ID': crop_season_id,
+                    'Date': date.isoformat(),
+                    'Operation_Type': operation_type,
+                    'Quantity': quantity,
+                    'Unit': unit,
+                    'Rate_Per_Unit': rate_per_unit,
+                    'Payment_Mode': payment_mode,
+                    'Payment_Status': payment_status,
+                    'Notes': notes
+                }
+                if save_entry(excel_data, 'PRE_PROD_Land_Preparation', row):
+                    st.success("Entry added successfully!")
+    
+    elif entry_type == "Seed Costs":
+        with st.form("seed_cost_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                crop_season_id = st.text_input("Crop Season ID", "CS001")
+                date = st.date_input("Date")
+                variety = st.text_input("Variety")
+                qty_kg = st.number_input("Quantity (KG)", min_value=0.0)
+                rate_per_kg = st.number_input("Rate per KG", min_value=0.0)
+            
+            with col2:
+                treatment_chemical = st.text_input("Treatment Chemical")
+                treatment_cost = st.number_input("Treatment Cost", min_value=0.0)
+                biofertilizer_cost = st.number_input("Biofertilizer Cost", min_value=0.0)
+                payment_mode = st.selectbox("Payment Mode", ["Cash", "UPI", "Bank Transfer"])
+                payment_status = st.selectbox("Payment Status", ["Paid", "Pending", "Partial"])
+            
+            if st.form_submit_button("Add Entry"):
+                row = {
+                    'Seed_Cost_ID': next_record_id(excel_data, 'PRE_PROD_Seed_Costs', 'Seed_Cost_ID', 'SC'),
+                    'Crop_Season_ID': crop_season_id,
+                    'Date': date.isoformat(),
+                    'Variety': variety,
+                    'Qty_KG': qty_kg,
+                    'Rate_Per_KG': rate_per_kg,
+                    'Treatment_Chemical': treatment_chemical,
+                    'Treatment_Cost': treatment_cost,
+                    'Biofertilizer_Cost': biofertilizer_cost,
+                    'Payment_Mode': payment_mode,
+                    'Payment_Status': payment_status
+                }
+                if save_entry(excel_data, 'PRE_PROD_Seed_Costs', row):
+                    st.success("Seed cost entry added successfully!")
     
     elif entry_type == "Fertilizer Application":
         with st.form("fertilizer_form"):
@@ -397,7 +1131,19 @@ def display_data_entry(excel_data):
                 payment_status = st.selectbox("Payment Status", ["Paid", "Pending", "Partial"])
             
             if st.form_submit_button("Add Entry"):
-                st.success("Fertilizer entry added successfully!")
+                row = {
+                    'Fertilizer_ID': next_record_id(excel_data, 'PROD_Fertilizer_Application', 'Fertilizer_ID', 'FR'),
+                    'Crop_Season_ID': crop_season_id,
+                    'Date': date.isoformat(),
+                    'Stage': stage,
+                    'Fertilizer_Name': fertilizer_name,
+                    'Qty_KG': qty_kg,
+                    'Rate_Per_KG': rate_per_kg,
+                    'Labor_Cost': labor_cost,
+                    'Payment_Status': payment_status
+                }
+                if save_entry(excel_data, 'PROD_Fertilizer_Application', row):
+                    st.success("Fertilizer entry added successfully!")
     
     elif entry_type == "Sales Record":
         with st.form("sales_form"):
@@ -415,13 +1161,206 @@ def display_data_entry(excel_data):
                 payment_received = st.number_input("Payment Received", min_value=0.0)
             
             if st.form_submit_button("Add Sale"):
-                st.success("Sale record added successfully!")
+                row = {
+                    'Sale_ID': next_record_id(excel_data, 'REVENUE_Sales', 'Sale_ID', 'SL'),
+                    'Crop_Season_ID': crop_season_id,
+                    'Sale_Date': sale_date.isoformat(),
+                    'Product_Type': product_type,
+                    'Qty_Qtls': qty_qtls,
+                    'Rate_Per_Qtl': rate_per_qtl,
+                    'Buyer_Name': buyer_name,
+                    'Buyer_Type': buyer_type,
+                    'Payment_Received': payment_received
+                }
+                if save_entry(excel_data, 'REVENUE_Sales', row):
+                    st.success("Sale record added successfully!")
+    
+    # Rows entered so far for this sheet can be corrected or removed in place
+    sheet_name, id_column, _, computed_columns = ENTRY_SHEETS[entry_type]
+    entries = excel_data.entries(sheet_name)
+    if entries:
+        st.markdown("### ✏️ Entered Rows")
+        editor_key = f"entry_editor_{sheet_name}_{excel_data.journal_offset}"
+        st.data_editor(
+            pd.DataFrame(list(entries.values())),
+            key=editor_key,
+            num_rows="dynamic",
+            hide_index=True,
+            disabled=[id_column] + computed_columns,
+            on_change=apply_entry_edits,
+            args=(excel_data, entry_type, list(entries), editor_key),
+            use_container_width=True
+        )
+        st.caption("Edit, add or delete rows here to correct them; totals are recalculated automatically.")
+    
+    # Entries are written back to the workbook in batches, not one rewrite per row
+    st.markdown("---")
+    st.markdown("### 📦 Entries Not Yet in the Workbook")
+    
+    pending = excel_data.pending_changes
+    st.metric("Pending Changes", pending)
+    
+    if pending > 0 and st.button("Prepare Updated Workbook"):
+        st.session_state.updated_workbook = (excel_data.content_key, build_updated_workbook(excel_data))
+        entry_journal.record_flush(excel_data)
+        st.rerun()
+    
+    updated_key, updated_bytes = st.session_state.get('updated_workbook') or (None, None)
+    if updated_key == excel_data.content_key:
+        st.download_button(
+            label="📥 Download Updated Excel",
+            data=updated_bytes,
+            file_name="roots_farm_data_updated.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        st.caption("Upload the downloaded file next time to continue from it.")
 
 # ====================
 # FUNCTION: DISPLAY REPORTS
 # ====================
+# Report -> (sheet, date column, (column, total label) pairs, heading) for each of its tables
+REPORT_TABLES = {
+    "Cost Summary": [
+        ('PRE_PROD_Land_Preparation', 'Date', [('Total_Cost', "Total Land Preparation Cost")], "Land Preparation Costs"),
+        ('PROD_Fertilizer_Application', 'Date', [('Total_Fertilizer_Cost', "Total Fertilizer Cost")], "Fertilizer Application Costs")
+    ],
+    "Revenue Summary": [
+        ('REVENUE_Sales', 'Sale_Date', [('Gross_Revenue', "Total Sales Revenue"), ('Outstanding', "Outstanding")], "Sales Records")
+    ],
+    "Yield Analysis": [
+        ('POST_PROD_Yield_Record', 'Harvest_Date', [('Main_Product_Qtls', "Main Product (Qtls)"), ('By_Product_Qtls', "By-Product (Qtls)")], "Yield Performance")
+    ]
+}
+
+def date_column_config(df):
+    """Show datetime columns, parsed once at ingest, as plain dates"""
+    return {
+        column: st.column_config.DatetimeColumn(column, format="YYYY-MM-DD")
+        for column in df.columns
+        if pd.api.types.is_datetime64_any_dtype(df[column])
+    }
+
+def report_filters(excel_data, report_key, tables):
+    """Crop season, date range and payment status filters shared by a report's (sheet, date column) tables"""
+    values = [get_report_filter_values(excel_data, sheet_name, date_column) for sheet_name, date_column in tables]
+    
+    crop_season_ids = sorted({value for ids, _, _ in values for value in ids}, key=str)
+    date_bounds = [bounds for _, bounds, _ in values if bounds is not None]
+    statuses = sorted({value for _, _, sheet_statuses in values for value in sheet_statuses}, key=str)
+    
+    filters = {}
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        filters['crop_season_ids'] = st.multiselect("Crop Season ID", crop_season_ids, key=f"{report_key}_crop_seasons")
+    
+    with col2:
+        if date_bounds:
+            first, last = min(first for first, _ in date_bounds), max(last for _, last in date_bounds)
+            date_range = st.date_input("Date Range", (first, last), min_value=first, max_value=last,
+                                       key=f"{report_key}_dates")
+            # Only a narrowed, complete range filters, so undated rows stay visible by default
+            if len(date_range) == 2 and tuple(date_range) != (first, last):
+                filters['date_range'] = tuple(date_range)
+    
+    with col3:
+        if statuses:
+            filters['payment_statuses'] = st.multiselect("Payment Status", statuses, key=f"{report_key}_statuses")
+    
+    return filters
+
+def get_report_rows(excel_data, sheet_name, options, table_key):
+    """Filtered, sorted row positions of a sheet, reused while only the page changes
+
+    The last selection of each report table is kept in this session, tagged with the
+    workbook and its entered-row version, so entered rows or another upload never
+    reuse a stale one.
+    """
+    sheet = excel_data[sheet_name]
+    selection = (getattr(excel_data, 'content_key', None), getattr(excel_data, 'entry_version', None), options)
+    cached = st.session_state.get(f"{table_key}_rows")
+    if cached is None or cached[0] != selection:
+        with timed_span(f"filter {sheet_name}", rows=len(sheet)):
+            cached = (selection, select_report_rows(sheet, **options))
+        st.session_state[f"{table_key}_rows"] = cached
+    return sheet, cached[1]
+
+def display_report_table(excel_data, sheet_name, date_column, total_columns, filters, table_key):
+    """Show one sheet filtered and sorted over all its rows, sending only the current page to the browser
+
+    Returns the totals of the matching rows and their positions, in display order.
+    """
+    sheet = excel_data[sheet_name]
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_by = st.selectbox("Sort by", ["Sheet order"] + list(sheet.columns), key=f"{table_key}_sort")
+    with col2:
+        descending = st.toggle("Descending", key=f"{table_key}_descending")
+    with col3:
+        page_size = st.selectbox("Rows per page", REPORT_PAGE_SIZES, key=f"{table_key}_page_size")
+    
+    options = {
+        **filters,
+        'date_column': date_column,
+        'sort_by': None if sort_by == "Sheet order" else sort_by,
+        'ascending': not descending
+    }
+    sheet, positions = get_report_rows(excel_data, sheet_name, options, table_key)
+    
+    # Start again from the first page whenever the selection, its size or the page size changes
+    page_key = f"{table_key}_page"
+    view = (repr(options), len(positions), page_size)
+    if st.session_state.get(f"{table_key}_view") != view:
+        st.session_state[f"{table_key}_view"] = view
+        st.session_state[page_key] = 1
+    
+    page_count = max((len(positions) - 1) // page_size + 1, 1)
+    with col4:
+        page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key=page_key)
+    
+    first = (page - 1) * page_size
+    page_rows = sheet.iloc[positions[first:first + page_size]]
+    st.dataframe(page_rows, use_container_width=True, column_config=date_column_config(page_rows))
+    st.caption(f"Rows {min(first + 1, len(positions))}–{first + len(page_rows)} of {len(positions)} matching "
+               f"({len(sheet)} in the sheet) · page {page} of {page_count}")
+    
+    # Totals cover every matching row, not just the page on screen
+    totals = {
+        label: pd.to_numeric(sheet[column].iloc[positions], errors='coerce').sum()
+        for column, label in total_columns if column in sheet
+    }
+    return totals, positions
+
+def display_report_export(excel_data, report_key, ledgers):
+    """Download the crop season P&L, season roll-up and the report's filtered (sheet, positions) ledgers"""
+    st.markdown("### 📤 Export")
+    
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        extension = st.selectbox("Format", EXPORT_FORMATS, key=f"{report_key}_export_format")
+    
+    tables = [
+        ('Crop Season P&L', get_crop_season_pnl(excel_data), None),
+        ('Season Rollup', get_season_rollup(excel_data), None)
+    ] + [(sheet_name, excel_data[sheet_name], positions) for sheet_name, positions in ledgers]
+    file_name = f"roots_{report_key.removeprefix('report_').lower().replace(' ', '_')}"
+    
+    with col2:
+        st.write("")
+        # The file is written only when the button is clicked; Streamlit then holds its bytes for the download
+        st.download_button(
+            label="📥 Download Report",
+            data=lambda: export_report(tables, extension),
+            file_name=f"{file_name}.xlsx" if extension == '.xlsx' else f"{file_name}_{extension[1:]}.zip",
+            mime=("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                  if extension == '.xlsx' else "application/zip"),
+            key=f"{report_key}_export"
+        )
+
+@page_fragment
 def display_reports(excel_data):
-    """Display various reports from the data"""
+    """Display various reports from the data; the report, filter and page widgets rerun only this page"""
     st.markdown('<p class="sub-header">📊 Reports</p>', unsafe_allow_html=True)
     
     report_type = st.selectbox("Select Report", [
@@ -430,27 +1369,88 @@ def display_reports(excel_data):
         "Yield Analysis"
     ])
     
-    if report_type == "Cost Summary":
-        if 'PRE_PROD_Land_Preparation' in excel_data:
-            st.write("**Land Preparation Costs**")
-            st.dataframe(excel_data['PRE_PROD_Land_Preparation'], use_container_width=True)
+    tables = [table for table in REPORT_TABLES[report_type] if table[0] in excel_data]
+    
+    if not tables:
+        return
+    
+    report_key = f"report_{report_type}"
+    filters = report_filters(excel_data, report_key, [(sheet_name, date_column) for sheet_name, date_column, _, _ in tables])
+    
+    ledgers = []
+    for sheet_name, date_column, total_columns, heading in tables:
+        st.write(f"**{heading}**")
+        totals, positions = display_report_table(excel_data, sheet_name, date_column, total_columns, filters, f"{report_key}_{sheet_name}")
         
-        if 'PROD_Fertilizer_Application' in excel_data:
-            st.write("**Fertilizer Application Costs**")
-            st.dataframe(excel_data['PROD_Fertilizer_Application'], use_container_width=True)
-    
-    elif report_type == "Revenue Summary":
-        if 'REVENUE_Sales' in excel_data:
-            st.write("**Sales Records**")
-            st.dataframe(excel_data['REVENUE_Sales'], use_container_width=True)
-            
-            total_revenue = excel_data['REVENUE_Sales']['Gross_Revenue'].sum()
-            st.metric("Total Sales Revenue", f"₹{total_revenue:,.0f}")
+        columns = st.columns(len(totals) or 1)
+        for column, (label, total) in zip(columns, totals.items()):
+            with column:
+                if sheet_name == 'POST_PROD_Yield_Record':
+                    st.metric(label, f"{total:,.1f}")
+                else:
+                    st.metric(label, f"₹{total:,.0f}")
+        ledgers.append((sheet_name, positions))
+    
+    display_report_export(excel_data, report_key, ledgers)
+
+# ====================
+# FUNCTION: DISPLAY DUES
+# ====================
+@page_fragment
+def display_dues(excel_data):
+    """Payables and receivables open as of a date, by age, counterparty and crop season"""
+    st.markdown('<p class="sub-header">💳 Dues</p>', unsafe_allow_html=True)
+    
+    dues = get_dues_index(excel_data)
+    if dues.last_date is None:
+        st.info("No pending or partly paid costs, and no sales with money outstanding.")
+        return
     
-    elif report_type == "Yield Analysis":
-        if 'POST_PROD_Yield_Record' in excel_data:
-            st.write("**Yield Performance**")
-            st.dataframe(excel_data['POST_PROD_Yield_Record'], use_container_width=True)
+    as_of = st.date_input("As of", dues.last_date.date(), key="dues_as_of")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("I Owe (Payables)", f"₹{dues.total('Payable', as_of):,.0f}",
+                  help="Costs marked Pending or Partial. A partly paid cost counts at its whole total, "
+                       "as the cost sheets record no amount paid.")
+    with col2:
+        st.metric("Owed to Me (Receivables)", f"₹{dues.total('Receivable', as_of):,.0f}",
+                  help="Outstanding amount of sales not yet paid in full.")
+    st.caption("Pending and partly paid costs are listed at their whole total, as the cost sheets record no amount paid. "
+               "Payables are grouped by cost category, receivables by buyer.")
+    
+    st.markdown("### ⏳ Ageing")
+    display_table(dues.aging(as_of), {'Payable': '₹%,.0f', 'Receivable': '₹%,.0f'})
+    
+    kind = st.radio("Show", DUE_KINDS, horizontal=True, key="dues_kind")
+    by_counterparty = dues.by(kind, 'Counterparty', as_of)
+    by_crop_season = dues.by(kind, 'Crop_Season_ID', as_of)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**By Counterparty**")
+        display_table(by_counterparty, {'Amount': '₹%,.0f'})
+    with col2:
+        st.markdown("**By Crop Season**")
+        display_table(by_crop_season, {'Amount': '₹%,.0f'})
+    
+    st.markdown("### 📋 Open Items")
+    col1, col2 = st.columns(2)
+    with col1:
+        counterparty = st.selectbox("Counterparty", ["All"] + by_counterparty['Counterparty'].tolist(),
+                                    key="dues_counterparty")
+    with col2:
+        crop_season_id = st.selectbox("Crop Season ID", ["All"] + sorted(by_crop_season['Crop_Season_ID'], key=str),
+                                      key="dues_crop_season")
+    items = dues.open_items(kind, as_of,
+                            counterparty=None if counterparty == "All" else counterparty,
+                            crop_season_id=None if crop_season_id == "All" else crop_season_id)
+    st.dataframe(items.drop(columns='Kind'), use_container_width=True, column_config={
+        **date_column_config(items),
+        'Amount': st.column_config.NumberColumn('Amount', format='₹%,.0f')
+    })
+    if dues.undated_items:
+        st.caption(f"{dues.undated_items} open items without a date are left out.")
 
 # ====================
 # FUNCTION: DISPLAY CROP COMPARISON
@@ -463,102 +1463,12 @@ def display_crop_comparison(excel_data):
         st.warning("No crop season data available. Please upload data first.")
         return
     
-    crop_seasons = excel_data['Crop_Season_Master']
-    
-    if crop_seasons.empty:
+    if excel_data['Crop_Season_Master'].empty:
         st.warning("No crop seasons found.")
         return
     
-    # Merge with crop master to get crop names
-    if 'MASTER_Crops' in excel_data:
-        crops_master = excel_data['MASTER_Crops']
-        crop_seasons = crop_seasons.merge(
-            crops_master[['Crop_ID', 'Crop_Name', 'Category']], 
-            on='Crop_ID', 
-            how='left'
-        )
-    
-    # Calculate costs and revenue for each crop season
-    comparison_data = []
-    
-    for _, season in crop_seasons.iterrows():
-        cs_id = season['Crop_Season_ID']
-        crop_name = season.get('Crop_Name', 'Unknown')
-        area = season.get('Area_Acres', 0)
-        
-        # Calculate total costs
-        total_cost = 0
-        
-        # Land preparation
-        if 'PRE_PROD_Land_Preparation' in excel_data:
-            land_cost = excel_data['PRE_PROD_Land_Preparation'][
-                excel_data['PRE_PROD_Land_Preparation']['Crop_Season_ID'] == cs_id
-            ]['Total_Cost'].sum()
-            total_cost += land_cost
-        
-        # Seed costs
-        if 'PRE_PROD_Seed_Costs' in excel_data:
-            seed_cost = excel_data['PRE_PROD_Seed_Costs'][
-                excel_data['PRE_PROD_Seed_Costs']['Crop_Season_ID'] == cs_id
-            ]['Total_Seed_Cost'].sum()
-            total_cost += seed_cost
-        
-        # Manure costs
-        if 'PRE_PROD_Organic_Manure' in excel_data:
-            manure_cost = excel_data['PRE_PROD_Organic_Manure'][
-                excel_data['PRE_PROD_Organic_Manure']['Crop_Season_ID'] == cs_id
-            ]['Total_Manure_Cost'].sum()
-            total_cost += manure_cost
-        
-        # Fertilizer costs
-        if 'PROD_Fertilizer_Application' in excel_data:
-            fert_cost = excel_data['PROD_Fertilizer_Application'][
-                excel_data['PROD_Fertilizer_Application']['Crop_Season_ID'] == cs_id
-            ]['Total_Fertilizer_Cost'].sum()
-            total_cost += fert_cost
-        
-        # Irrigation costs
-        if 'PROD_Irrigation_Costs' in excel_data:
-            irr_cost = excel_data['PROD_Irrigation_Costs'][
-                excel_data['PROD_Irrigation_Costs']['Crop_Season_ID'] == cs_id
-            ]['Total_Irrigation_Cost'].sum()
-            total_cost += irr_cost
-        
-        # Revenue
-        total_revenue = 0
-        if 'REVENUE_Sales' in excel_data:
-            total_revenue = excel_data['REVENUE_Sales'][
-                excel_data['REVENUE_Sales']['Crop_Season_ID'] == cs_id
-            ]['Gross_Revenue'].sum()
-        
-        # Yield
-        yield_per_acre = 0
-        if 'POST_PROD_Yield_Record' in excel_data:
-            yield_data = excel_data['POST_PROD_Yield_Record'][
-                excel_data['POST_PROD_Yield_Record']['Crop_Season_ID'] == cs_id
-            ]
-            if not yield_data.empty:
-                yield_per_acre = yield_data['Yield_Per_Acre'].iloc[0]
-        
-        profit = total_revenue - total_cost
-        roi = (profit / total_cost * 100) if total_cost > 0 else 0
-        cost_per_acre = total_cost / area if area > 0 else 0
-        revenue_per_acre = total_revenue / area if area > 0 else 0
-        
-        comparison_data.append({
-            'Crop': crop_name,
-            'Crop_Season_ID': cs_id,
-            'Area (Acres)': area,
-            'Total Cost': total_cost,
-            'Total Revenue': total_revenue,
-            'Profit/Loss': profit,
-            'ROI (%)': roi,
-            'Cost per Acre': cost_per_acre,
-            'Revenue per Acre': revenue_per_acre,
-            'Yield per Acre': yield_per_acre
-        })
-    
-    df_comparison = pd.DataFrame(comparison_data)
+    # Costs, revenue and yield for every crop season, computed once per workbook
+    df_comparison = crop_comparison_table(excel_data)
     
     if df_comparison.empty:
         st.warning("No data available for comparison.")
@@ -584,75 +1494,36 @@ def display_crop_comparison(excel_data):
     
     # Display comparison table
     st.markdown("### 📋 Detailed Comparison Table")
-    st.dataframe(
-        df_comparison.style.format({
-            'Total Cost': '₹{:,.0f}',
-            'Total Revenue': '₹{:,.0f}',
-            'Profit/Loss': '₹{:,.0f}',
-            'ROI (%)': '{:.2f}%',
-            'Cost per Acre': '₹{:,.0f}',
-            'Revenue per Acre': '₹{:,.0f}',
-            'Yield per Acre': '{:.2f}',
-            'Area (Acres)': '{:.1f}'
-        }).background_gradient(subset=['Profit/Loss'], cmap='RdYlGn'),
-        use_container_width=True
-    )
+    display_table(df_comparison, {
+        'Total Cost': '₹%,.0f',
+        'Total Revenue': '₹%,.0f',
+        'Profit/Loss': '₹%,.0f',
+        'ROI (%)': '%.2f%%',
+        'Cost per Acre': '₹%,.0f',
+        'Revenue per Acre': '₹%,.0f',
+        'Yield per Acre': '%.2f',
+        'Area (Acres)': '%.1f'
+    }, gradient_column='Profit/Loss')
     
     # Visualizations
     st.markdown("### 📊 Visual Comparisons")
     
+    fig_profit, fig_roi, fig_cost, fig_yield = crop_comparison_figures(df_comparison)
+    
     col1, col2 = st.columns(2)
     
     with col1:
-        fig_profit = px.bar(
-            df_comparison, 
-            x='Crop', 
-            y='Profit/Loss',
-            title='Profit/Loss by Crop',
-            color='Profit/Loss',
-            color_continuous_scale=['red', 'yellow', 'green'],
-            text='Profit/Loss'
-        )
-        fig_profit.update_traces(texttemplate='₹%{text:,.0f}', textposition='outside')
         st.plotly_chart(fig_profit, use_container_width=True)
     
     with col2:
-        fig_roi = px.bar(
-            df_comparison,
-            x='Crop',
-            y='ROI (%)',
-            title='Return on Investment (%) by Crop',
-            color='ROI (%)',
-            color_continuous_scale='Greens',
-            text='ROI (%)'
-        )
-        fig_roi.update_traces(texttemplate='%{text:.1f}%', textposition='outside')
         st.plotly_chart(fig_roi, use_container_width=True)
     
     col1, col2 = st.columns(2)
     
     with col1:
-        fig_cost = px.bar(
-            df_comparison,
-            x='Crop',
-            y=['Cost per Acre', 'Revenue per Acre'],
-            title='Cost vs Revenue per Acre',
-            barmode='group',
-            color_discrete_map={'Cost per Acre': '#ef5350', 'Revenue per Acre': '#66bb6a'}
-        )
         st.plotly_chart(fig_cost, use_container_width=True)
     
     with col2:
-        fig_yield = px.bar(
-            df_comparison,
-            x='Crop',
-            y='Yield per Acre',
-            title='Yield per Acre (Quintals)',
-            color='Yield per Acre',
-            color_continuous_scale='Blues',
-            text='Yield per Acre'
-        )
-        fig_yield.update_traces(texttemplate='%{text:.1f}', textposition='outside')
         st.plotly_chart(fig_yield, use_container_width=True)
     
     # Recommendations
@@ -690,32 +1561,11 @@ def display_crop_comparison(excel_data):
 # ====================
 # FUNCTION: DISPLAY SEASON ANALYSIS
 # ====================
-def display_season_analysis(excel_data):
-    """Display comprehensive season-wise analysis"""
-    st.markdown('<p class="sub-header">📅 Season-wise Analysis</p>', unsafe_allow_html=True)
-    
-    if 'Crop_Season_Master' not in excel_data or 'MASTER_Season' not in excel_data:
-        st.warning("Season data not available. Please upload complete data.")
-        return
-    
-    seasons_master = excel_data['MASTER_Season']
-    crop_seasons = excel_data['Crop_Season_Master']
-    
-    # Merge to get season names
-    crop_seasons = crop_seasons.merge(
-        seasons_master[['Season_ID', 'Season_Name']], 
-        on='Season_ID', 
-        how='left'
-    )
-    
-    # Merge with crop names
-    if 'MASTER_Crops' in excel_data:
-        crops_master = excel_data['MASTER_Crops']
-        crop_seasons = crop_seasons.merge(
-            crops_master[['Crop_ID', 'Crop_Name']], 
-            on='Crop_ID', 
-            how='left'
-        )
+@page_fragment
+def display_season_summary(excel_data):
+    """Season selector with the chosen season's summary, crops and charts; picking a season reruns only this"""
+    # Per crop season figures, already labelled with crop and season names
+    crop_seasons = get_crop_season_pnl(excel_data)
     
     # Season selector
     available_seasons = crop_seasons['Season_Name'].dropna().unique().tolist()
@@ -734,63 +1584,11 @@ def display_season_analysis(excel_data):
         return
     
     # Calculate season metrics
-    season_metrics = []
     total_area = season_data['Area_Acres'].sum()
-    total_cost = 0
-    total_revenue = 0
+    total_cost = season_data['Total_Cost'].sum()
+    total_revenue = season_data['Total_Revenue'].sum()
     
-    for _, crop_season in season_data.iterrows():
-        cs_id = crop_season['Crop_Season_ID']
-        crop_name = crop_season.get('Crop_Name', 'Unknown')
-        area = crop_season.get('Area_Acres', 0)
-        
-        # Calculate costs
-        crop_cost = 0
-        
-        if 'PRE_PROD_Land_Preparation' in excel_data:
-            crop_cost += excel_data['PRE_PROD_Land_Preparation'][
-                excel_data['PRE_PROD_Land_Preparation']['Crop_Season_ID'] == cs_id
-            ]['Total_Cost'].sum()
-        
-        if 'PRE_PROD_Seed_Costs' in excel_data:
-            crop_cost += excel_data['PRE_PROD_Seed_Costs'][
-                excel_data['PRE_PROD_Seed_Costs']['Crop_Season_ID'] == cs_id
-            ]['Total_Seed_Cost'].sum()
-        
-        if 'PRE_PROD_Organic_Manure' in excel_data:
-            crop_cost += excel_data['PRE_PROD_Organic_Manure'][
-                excel_data['PRE_PROD_Organic_Manure']['Crop_Season_ID'] == cs_id
-            ]['Total_Manure_Cost'].sum()
-        
-        if 'PROD_Fertilizer_Application' in excel_data:
-            crop_cost += excel_data['PROD_Fertilizer_Application'][
-                excel_data['PROD_Fertilizer_Application']['Crop_Season_ID'] == cs_id
-            ]['Total_Fertilizer_Cost'].sum()
-        
-        if 'PROD_Irrigation_Costs' in excel_data:
-            crop_cost += excel_data['PROD_Irrigation_Costs'][
-                excel_data['PROD_Irrigation_Costs']['Crop_Season_ID'] == cs_id
-            ]['Total_Irrigation_Cost'].sum()
-        
-        # Calculate revenue
-        crop_revenue = 0
-        if 'REVENUE_Sales' in excel_data:
-            crop_revenue = excel_data['REVENUE_Sales'][
-                excel_data['REVENUE_Sales']['Crop_Season_ID'] == cs_id
-            ]['Gross_Revenue'].sum()
-        
-        total_cost += crop_cost
-        total_revenue += crop_revenue
-        
-        season_metrics.append({
-            'Crop': crop_name,
-            'Area (Acres)': area,
-            'Cost': crop_cost,
-            'Revenue': crop_revenue,
-            'Profit': crop_revenue - crop_cost
-        })
-    
-    df_season = pd.DataFrame(season_metrics)
+    df_season = season_table(season_data)
     
     # Display season summary
     st.markdown(f"### 🌱 {selected_season} Season Summary")
@@ -812,134 +1610,60 @@ def display_season_analysis(excel_data):
     
     # Crops in this season
     st.markdown("### 🌾 Crops Cultivated")
-    st.dataframe(
-        df_season.style.format({
-            'Area (Acres)': '{:.1f}',
-            'Cost': '₹{:,.0f}',
-            'Revenue': '₹{:,.0f}',
-            'Profit': '₹{:,.0f}'
-        }).background_gradient(subset=['Profit'], cmap='RdYlGn'),
-        use_container_width=True
-    )
+    display_table(df_season, {
+        'Area (Acres)': '%.1f',
+        'Cost': '₹%,.0f',
+        'Revenue': '₹%,.0f',
+        'Profit': '₹%,.0f'
+    }, gradient_column='Profit')
     
     # Visualizations
+    fig_area, fig_profit = season_figures(df_season, selected_season)
+    
     col1, col2 = st.columns(2)
     
     with col1:
-        fig_area = px.pie(
-            df_season,
-            values='Area (Acres)',
-            names='Crop',
-            title=f'Land Distribution - {selected_season} Season',
-            color_discrete_sequence=px.colors.sequential.Greens
-        )
         st.plotly_chart(fig_area, use_container_width=True)
     
     with col2:
-        fig_profit = px.bar(
-            df_season,
-            x='Crop',
-            y='Profit',
-            title=f'Profit by Crop - {selected_season} Season',
-            color='Profit',
-            color_continuous_scale=['red', 'yellow', 'green']
-        )
         st.plotly_chart(fig_profit, use_container_width=True)
+
+def display_season_analysis(excel_data):
+    """Display comprehensive season-wise analysis"""
+    st.markdown('<p class="sub-header">📅 Season-wise Analysis</p>', unsafe_allow_html=True)
     
-    # Compare all seasons
-    st.markdown("### 📊 Compare All Seasons")
+    if 'Crop_Season_Master' not in excel_data or 'MASTER_Season' not in excel_data:
+        st.warning("Season data not available. Please upload complete data.")
+        return
     
-    all_seasons_data = []
+    display_season_summary(excel_data)
     
-    for season in available_seasons:
-        season_crops = crop_seasons[crop_seasons['Season_Name'] == season]
-        
-        season_cost = 0
-        season_revenue = 0
-        season_area = season_crops['Area_Acres'].sum()
-        
-        for _, crop_season in season_crops.iterrows():
-            cs_id = crop_season['Crop_Season_ID']
-            
-            if 'PRE_PROD_Land_Preparation' in excel_data:
-                season_cost += excel_data['PRE_PROD_Land_Preparation'][
-                    excel_data['PRE_PROD_Land_Preparation']['Crop_Season_ID'] == cs_id
-                ]['Total_Cost'].sum()
-            
-            if 'PRE_PROD_Seed_Costs' in excel_data:
-                season_cost += excel_data['PRE_PROD_Seed_Costs'][
-                    excel_data['PRE_PROD_Seed_Costs']['Crop_Season_ID'] == cs_id
-                ]['Total_Seed_Cost'].sum()
-            
-            if 'PRE_PROD_Organic_Manure' in excel_data:
-                season_cost += excel_data['PRE_PROD_Organic_Manure'][
-                    excel_data['PRE_PROD_Organic_Manure']['Crop_Season_ID'] == cs_id
-                ]['Total_Manure_Cost'].sum()
-            
-            if 'PROD_Fertilizer_Application' in excel_data:
-                season_cost += excel_data['PROD_Fertilizer_Application'][
-                    excel_data['PROD_Fertilizer_Application']['Crop_Season_ID'] == cs_id
-                ]['Total_Fertilizer_Cost'].sum()
-            
-            if 'PROD_Irrigation_Costs' in excel_data:
-                season_cost += excel_data['PROD_Irrigation_Costs'][
-                    excel_data['PROD_Irrigation_Costs']['Crop_Season_ID'] == cs_id
-                ]['Total_Irrigation_Cost'].sum()
-            
-            if 'REVENUE_Sales' in excel_data:
-                season_revenue += excel_data['REVENUE_Sales'][
-                    excel_data['REVENUE_Sales']['Crop_Season_ID'] == cs_id
-                ]['Gross_Revenue'].sum()
-        
-        all_seasons_data.append({
-            'Season': season,
-            'Total Area': season_area,
-            'Total Cost': season_cost,
-            'Total Revenue': season_revenue,
-            'Net Profit': season_revenue - season_cost,
-            'ROI (%)': (season_revenue - season_cost) / season_cost * 100 if season_cost > 0 else 0
-        })
+    df_all_seasons = get_season_rollup(excel_data)
+    if df_all_seasons.empty:
+        return
+    
+    # Compare all seasons
+    st.markdown("### 📊 Compare All Seasons")
     
-    df_all_seasons = pd.DataFrame(all_seasons_data)
+    fig_seasons, fig_roi = season_comparison_figures(df_all_seasons)
     
     col1, col2 = st.columns(2)
     
     with col1:
-        fig_seasons = px.bar(
-            df_all_seasons,
-            x='Season',
-            y=['Total Cost', 'Total Revenue'],
-            title='Cost vs Revenue by Season',
-            barmode='group',
-            color_discrete_map={'Total Cost': '#ef5350', 'Total Revenue': '#66bb6a'}
-        )
         st.plotly_chart(fig_seasons, use_container_width=True)
     
     with col2:
-        fig_roi = px.bar(
-            df_all_seasons,
-            x='Season',
-            y='ROI (%)',
-            title='Return on Investment by Season',
-            color='ROI (%)',
-            color_continuous_scale='Greens',
-            text='ROI (%)'
-        )
-        fig_roi.update_traces(texttemplate='%{text:.1f}%', textposition='outside')
         st.plotly_chart(fig_roi, use_container_width=True)
     
     # Season comparison table
     st.markdown("### 📋 Season Comparison Table")
-    st.dataframe(
-        df_all_seasons.style.format({
-            'Total Area': '{:.1f}',
-            'Total Cost': '₹{:,.0f}',
-            'Total Revenue': '₹{:,.0f}',
-            'Net Profit': '₹{:,.0f}',
-            'ROI (%)': '{:.2f}%'
-        }).background_gradient(subset=['Net Profit'], cmap='RdYlGn'),
-        use_container_width=True
-    )
+    display_table(df_all_seasons, {
+        'Total Area': '%.1f',
+        'Total Cost': '₹%,.0f',
+        'Total Revenue': '₹%,.0f',
+        'Net Profit': '₹%,.0f',
+        'ROI (%)': '%.2f%%'
+    }, gradient_column='Net Profit')
     
     # Best season recommendation
     best_season = df_all_seasons.loc[df_all_seasons['Net Profit'].idxmax()]
@@ -953,6 +1677,90 @@ def display_season_analysis(excel_data):
     **Recommendation:** Focus on optimizing practices for this season to maximize returns.
     """)
 
+# ====================
+# FUNCTION: DISPLAY SETTINGS
+# ====================
+def display_settings(excel_data):
+    """Display the settings panel, including timing profiles of recent reruns"""
+    st.markdown('<p class="sub-header">⚙️ Settings</p>', unsafe_allow_html=True)
+    st.info("Settings panel - Configure your farm profile and preferences")
+    
+    st.markdown("### ⏱️ Performance")
+    
+    max_reruns = st.number_input("Reruns to profile", min_value=1, max_value=500,
+                                 value=st.session_state.rerun_traces.maxlen)
+    if max_reruns != st.session_state.rerun_traces.maxlen:
+        st.session_state.rerun_traces = deque(st.session_state.rerun_traces, maxlen=int(max_reruns))
+    
+    # The rerun drawing this page is still being recorded, so only finished ones are shown
+    traces = list(st.session_state.rerun_traces)
+    if not traces:
+        st.caption("Timings appear here after the next rerun.")
+    else:
+        st.markdown(f"**Timing over the last {len(traces)} reruns**")
+        display_table(summarize_traces(traces), {
+            'p50 (ms)': '%,.1f',
+            'p95 (ms)': '%,.1f',
+            'Max (ms)': '%,.1f',
+            'Rows': '%,d'
+        })
+        
+        st.markdown("**Spans of the previous rerun**")
+        last_spans = pd.DataFrame(traces[-1].spans, columns=['name', 'ms', 'rows', 'source', 'cache'])
+        st.dataframe(last_spans.rename(columns={
+            'name': 'Span', 'ms': 'Time (ms)', 'rows': 'Rows', 'source': 'Source', 'cache': 'Cache'
+        }), use_container_width=True)
+        
+        figure_cache = get_figure_cache()
+        st.caption(f"Figure cache: {len(figure_cache)} of {figure_cache.max_entries} figures held, "
+                   f"{figure_cache.hits} hits, {figure_cache.misses} misses.")
+        
+        st.download_button(
+            label="📥 Export Profile (JSON)",
+            data=json.dumps([trace.to_dict() for trace in traces], indent=2, default=str),
+            file_name="roots_profile.json",
+            mime="application/json"
+        )
+    
+    precompute_key, precompute = st.session_state.get('precompute') or (None, None)
+    if precompute_key == excel_data.content_key:
+        if not precompute.done():
+            st.caption("Pages are still being prepared in the background.")
+        elif precompute.exception() is not None:
+            st.caption(f"Preparing pages in the background failed: {precompute.exception()}")
+        else:
+            st.caption(f"All pages were prepared in the background in {precompute.result():,.0f} ms after the upload.")
+    
+    st.markdown("**Parsed sheets in memory**")
+    sheet_stats = excel_data.sheet_stats() if hasattr(excel_data, 'sheet_stats') else pd.DataFrame()
+    if sheet_stats.empty:
+        st.caption("No sheets have been parsed yet.")
+    else:
+        # Sheets are normalized to compact dtypes at ingest; Parsed is their size beforehand
+        sheet_stats['Parsed (MB)'] = sheet_stats.pop('Bytes Parsed') / 1024 / 1024
+        sheet_stats['Memory (MB)'] = sheet_stats.pop('Bytes') / 1024 / 1024
+        display_table(sheet_stats, {'Rows': '%,d', 'Parsed (MB)': '%.2f', 'Memory (MB)': '%.2f'})
+        
+        compared = sheet_stats.dropna(subset=['Parsed (MB)'])
+        if not compared.empty:
+            before, after = compared['Parsed (MB)'].sum(), compared['Memory (MB)'].sum()
+            st.caption(f"Normalizing dtypes took these sheets from {before:.2f} MB to {after:.2f} MB "
+                       f"({(1 - after / before) * 100 if before else 0:.0f}% smaller).")
+        st.caption(f"Total held for this workbook, including the raw upload: {excel_data.nbytes / 1024 / 1024:.2f} MB")
+    
+    database = getattr(excel_data, 'database', None)
+    if database is not None:
+        st.caption(f"SQL storage: {database.row_count():,} rows in {database.path}")
+    
+    # Admin view of the workbooks held for all sessions of this server
+    st.markdown("### 🗄️ Shared Workbook Store")
+    workbook_cache = get_workbook_cache()
+    st.caption(f"{len(workbook_cache)} of {workbook_cache.max_entries} workbooks held for all sessions, "
+               f"{workbook_cache.total_bytes / 1024 / 1024:.1f} of {workbook_cache.max_bytes / 1024 / 1024:,.0f} MB. "
+               f"{workbook_cache.hits} hits, {workbook_cache.misses} misses, {workbook_cache.evictions} evictions "
+               f"({workbook_cache.evicted_bytes / 1024 / 1024:.1f} MB freed).")
+    display_table(workbook_cache.stats(), {'Parsed Sheets': '%,d', 'Memory (MB)': '%.2f', 'Sessions': '%,d', 'Hits': '%,d'})
+
 # ====================
 # MAIN APPLICATION
 # ====================
@@ -970,6 +1778,7 @@ def main():
             "🏠 Dashboard",
             "📝 Data Entry",
             "📊 Reports",
+            "💳 Dues",
             "🌾 Crop Comparison",
             "📅 Season Analysis",
             "⚙️ Settings"
@@ -984,34 +1793,36 @@ def main():
         # Download sample template
         st.markdown("---")
         st.subheader("Download Template")
-        sample_file = create_sample_excel()
         st.download_button(
             label="📥 Download Sample Excel",
-            data=sample_file,
+            data=get_sample_template_bytes(),
             file_name="roots_farm_template.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
     
     # Main content area
     if uploaded_file is not None:
-        excel_data = load_excel_data(uploaded_file)
+        with timed_span('load workbook'):
+            excel_data = load_excel_data(uploaded_file)
         
         if excel_data:
             metrics = calculate_summary_metrics(excel_data)
             
-            if page == "🏠 Dashboard":
-                display_dashboard(excel_data, metrics)
-            elif page == "📝 Data Entry":
-                display_data_entry(excel_data)
-            elif page == "📊 Reports":
-                display_reports(excel_data)
-            elif page == "🌾 Crop Comparison":
-                display_crop_comparison(excel_data)
-            elif page == "📅 Season Analysis":
-                display_season_analysis(excel_data)
-            elif page == "⚙️ Settings":
-                st.markdown('<p class="sub-header">⚙️ Settings</p>', unsafe_allow_html=True)
-                st.info("Settings panel - Configure your farm profile and preferences")
+            with timed_span(f"page {page}"):
+                if page == "🏠 Dashboard":
+                    display_dashboard(excel_data, metrics)
+                elif page == "📝 Data Entry":
+                    display_data_entry(excel_data)
+                elif page == "📊 Reports":
+                    display_reports(excel_data)
+                elif page == "💳 Dues":
+                    display_dues(excel_data)
+                elif page == "🌾 Crop Comparison":
+                    display_crop_comparison(excel_data)
+                elif page == "📅 Season Analysis":
+                    display_season_analysis(excel_data)
+                elif page == "⚙️ Settings":
+                    display_settings(excel_data)
     else:
         st.info("👆 Please upload an Excel file or download the sample template to get started")
         
@@ -1041,7 +1852,12 @@ def main():
 # APPLICATION ENTRY POINT
 # ====================
 if __name__ == "__main__":
-    main()
+    start_trace()
+    try:
+        main()
+    finally:
+        # Also keep reruns cut short by st.rerun, which raises out of main
+        st.session_state.rerun_traces.append(finish_trace())
 
 # ====================
 # END OF CODE
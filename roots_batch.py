@@ -0,0 +1,161 @@
+"""
+ROOTS - Batch Profit and Loss
+Runs the crop season P&L over a directory of ROOTS workbooks without the web app
+and writes every workbook's results to one CSV, Parquet, JSON or Excel file.
+
+Usage:
+    python roots_batch.py WORKBOOK_DIR --output results.csv [--workers 8] [--recursive]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from roots_engine import WorkbookData, compute_crop_season_pnl, content_hash, write_report
+
+# ====================
+# BATCH CONFIGURATION
+# ====================
+# Columns of the consolidated results, one row per crop season per workbook
+BATCH_COLUMNS = [
+    'Source_File', 'Crop_Season_ID', 'Farm_ID', 'Season_ID', 'Season_Name', 'Crop_ID', 'Crop_Name',
+    'Area_Acres', 'Total_Cost', 'Total_Revenue', 'Profit', 'ROI',
+    'Cost_Per_Acre', 'Revenue_Per_Acre', 'Yield_Per_Acre'
+]
+
+OUTPUT_FORMATS = ('.csv', '.parquet', '.json', '.xlsx')
+
+# ====================
+# FUNCTION: EVALUATE WORKBOOKS
+# ====================
+def evaluate_workbook(path, snapshot_dir=None):
+    """Per crop season P&L of one workbook file, tagged with the file it came from"""
+    with open(path, 'rb') as f:
+        file_bytes = f.read()
+
+    key = content_hash(file_bytes)
+    workbook = WorkbookData(file_bytes, content_key=key,
+                            snapshot_dir=os.path.join(snapshot_dir, key) if snapshot_dir else None)
+
+    pnl = compute_crop_season_pnl(workbook)
+    pnl['Source_File'] = os.path.basename(path)
+    return pnl.reindex(columns=BATCH_COLUMNS)
+
+def _evaluate_safely(path, snapshot_dir):
+    """Worker entry point: a broken workbook is reported instead of stopping the batch"""
+    try:
+        return path, evaluate_workbook(path, snapshot_dir), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+def find_workbooks(directory, recursive=False):
+    """Every .xlsx file under a directory, skipping Excel's ~$ lock files"""
+    pattern = os.path.join(directory, '**', '*.xlsx') if recursive else os.path.join(directory, '*.xlsx')
+    return sorted(
+        path for path in glob.glob(pattern, recursive=recursive)
+        if not os.path.basename(path).startswith('~$')
+    )
+
+def run_batch(paths, workers=None, snapshot_dir=None):
+    """Evaluate workbooks in parallel, one process per core by default
+
+    Returns the consolidated results and a list of (path, error) for workbooks
+    that could not be read. Each workbook is independent, so throughput grows
+    with the number of worker processes until the disk becomes the limit.
+    """
+    if workers == 1 or len(paths) <= 1:
+        outcomes = (_evaluate_safely(path, snapshot_dir) for path in paths)
+        frames, failures = _collect(outcomes)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = pool.map(_evaluate_safely, paths, [snapshot_dir] * len(paths))
+            frames, failures = _collect(outcomes)
+
+    if not frames:
+        return pd.DataFrame(columns=BATCH_COLUMNS), failures
+    return pd.concat(frames, ignore_index=True), failures
+
+def _collect(outcomes):
+    frames, failures = [], []
+    for path, pnl, error in outcomes:
+        if error is None:
+            frames.append(pnl)
+        else:
+            failures.append((path, error))
+    return frames, failures
+
+# ====================
+# FUNCTION: WRITE RESULTS
+# ====================
+def output_format(output_path):
+    """Extension of a results file, raising ValueError when it is not one of OUTPUT_FORMATS"""
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format {extension or '(none)'}; use one of {', '.join(OUTPUT_FORMATS)}")
+    return extension
+
+def write_results(results, output_path):
+    """Write the consolidated results in the format given by the output file's extension"""
+    extension = output_format(output_path)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if extension == '.csv':
+        results.to_csv(output_path, index=False)
+    elif extension == '.parquet':
+        results.to_parquet(output_path, index=False)
+    elif extension == '.xlsx':
+        # Written row by row, so thousands of farms' seasons do not build up in memory
+        write_report([('Crop Season P&L', results, None)], output_path, '.xlsx')
+    else:
+        results.to_json(output_path, orient='records', indent=2)
+
+# ====================
+# COMMAND LINE ENTRY POINT
+# ====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute crop season P&L for every ROOTS workbook in a directory")
+    parser.add_argument('directory', help="directory containing .xlsx workbooks")
+    parser.add_argument('-o', '--output', required=True, help="results file ending in .csv, .parquet, .json or .xlsx")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="also search subdirectories")
+    parser.add_argument('--snapshot-dir', default=None, help="reuse or write per-sheet Arrow snapshots here")
+    args = parser.parse_args(argv)
+
+    # Check the output before spending the whole batch on results that cannot be written
+    try:
+        output_format(args.output)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    paths = find_workbooks(args.directory, args.recursive)
+    if not paths:
+        print(f"No .xlsx workbooks found in {args.directory}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    results, failures = run_batch(paths, args.workers, args.snapshot_dir)
+    elapsed = time.perf_counter() - started
+
+    try:
+        write_results(results, args.output)
+    except (ValueError, ImportError) as e:
+        print(f"Error writing results: {e}", file=sys.stderr)
+        return 1
+
+    for path, error in failures:
+        print(f"Skipped {path}: {error}", file=sys.stderr)
+    print(
+        f"{len(paths) - len(failures)} of {len(paths)} workbooks, {len(results)} crop seasons "
+        f"in {elapsed:.2f}s ({len(paths) / elapsed:.1f} workbooks/s) -> {args.output}",
+        file=sys.stderr
+    )
+    return 1 if failures and len(failures) == len(paths) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
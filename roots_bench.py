@@ -0,0 +1,468 @@
+"""
+ROOTS - Synthetic Workbooks and Benchmarks
+Generates ROOTS workbooks of any size with the same 11 sheets as the sample
+template, and times the app's hot paths on them against a stored baseline.
+
+Usage:
+    python roots_bench.py generate farm.xlsx --farms 20 --seasons 6 --transactions 5000
+    python roots_bench.py run [--sizes small,medium] [--save-baseline] [--tolerance 0.25]
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from roots_engine import (
+    WorkbookData, compute_summary_metrics, get_cash_flow_ledger, get_crop_season_pnl, get_season_rollup
+)
+
+# ====================
+# BENCHMARK CONFIGURATION
+# ====================
+# Size name -> (farms, crop seasons per farm, transactions per fact sheet)
+BENCH_SIZES = {
+    'small': (1, 3, 100),
+    'medium': (10, 6, 2000),
+    'large': (50, 12, 20000),
+    'xlarge': (200, 12, 100000),
+}
+DEFAULT_SIZES = ['small', 'medium', 'large']
+
+BENCH_STAGES = ['load', 'summary_metrics', 'crop_comparison', 'season_analysis', 'charts']
+
+# Timings are machine specific, so the baseline lives next to the app rather than in git
+BASELINE_PATH = os.environ.get(
+    'ROOTS_BENCH_BASELINE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roots_bench_baseline.json')
+)
+
+SEASONS = [('S001', 'Rabi', 'October', 'March'), ('S002', 'Kharif', 'June', 'September'), ('S003', 'Zaid', 'March', 'June')]
+CROPS = [
+    ('C001', 'Wheat', 'Cereals'), ('C002', 'Rice', 'Cereals'), ('C003', 'Maize', 'Cereals'),
+    ('C004', 'Gram', 'Pulses'), ('C005', 'Moong', 'Pulses'), ('C006', 'Mustard', 'Oilseeds'),
+    ('C007', 'Sunflower', 'Oilseeds'), ('C008', 'Berseem', 'Fodder'), ('C009', 'Potato', 'Major Veg'),
+    ('C010', 'Onion', 'Major Veg')
+]
+
+# ====================
+# FUNCTION: GENERATE SYNTHETIC WORKBOOK
+# ====================
+def _ids(prefix, count, width=5):
+    return [f"{prefix}{i:0{width}d}" for i in range(1, count + 1)]
+
+def _dates(rng, count, start='2023-01-01', days=730):
+    offsets = rng.integers(0, days, count)
+    return (pd.Timestamp(start) + pd.to_timedelta(offsets, unit='D')).strftime('%Y-%m-%d')
+
+def _payment_status(rng, count):
+    return rng.choice(['Paid', 'Pending', 'Partial'], count, p=[0.8, 0.15, 0.05])
+
+def generate_workbook_sheets(farms, seasons_per_farm, transactions, seed=0):
+    """Sheet name -> DataFrame for a synthetic farm book
+
+    Every farm grows seasons_per_farm crop seasons, and each of the five cost
+    sheets and the sales sheet holds `transactions` rows spread randomly over
+    those crop seasons. Totals are consistent with their inputs, and about one
+    sale in ten has no MSP rate ('NA') just like the sample template.
+    """
+    rng = np.random.default_rng(seed)
+    k = transactions
+    farm_ids = _ids('F', farms, 3)
+    crop_season_ids = _ids('CS', farms * seasons_per_farm)
+    n_cs = len(crop_season_ids)
+    cs_of_rows = lambda count: rng.choice(crop_season_ids, count)
+    sheets = {}
+
+    sheets['MASTER_Farm_Profile'] = pd.DataFrame({
+        'Farm_ID': farm_ids,
+        'Farmer_Name': [f"Farmer {i}" for i in range(1, farms + 1)],
+        'Location': rng.choice(['Agra, UP', 'Karnal, HR', 'Ludhiana, PB', 'Indore, MP'], farms),
+        'Total_Area_Acres': rng.integers(5, 60, farms),
+        'Soil_Type': rng.choice(['Loamy', 'Clay', 'Sandy'], farms),
+        'Irrigation_Source': rng.choice(['Tubewell', 'Canal', 'Rainfed'], farms),
+        'Contact': [f"98{i:08d}" for i in range(farms)],
+        'Bank_Account': [f"XXXX{i:04d}" for i in range(farms)]
+    })
+    sheets['MASTER_Season'] = pd.DataFrame(SEASONS, columns=['Season_ID', 'Season_Name', 'Start_Month', 'End_Month'])
+    crops = pd.DataFrame(CROPS, columns=['Crop_ID', 'Crop_Name', 'Category'])
+    crops['Sub_Category'] = 'General'
+    crops['Unit_Measure'] = 'Quintals'
+    sheets['MASTER_Crops'] = crops
+
+    sheets['Crop_Season_Master'] = pd.DataFrame({
+        'Crop_Season_ID': crop_season_ids,
+        'Farm_ID': np.repeat(farm_ids, seasons_per_farm),
+        'Season_ID': rng.choice([s[0] for s in SEASONS], n_cs),
+        'Crop_ID': rng.choice([c[0] for c in CROPS], n_cs),
+        'Variety': 'Local',
+        'Area_Acres': rng.integers(1, 11, n_cs),
+        'Sowing_Date': _dates(rng, n_cs),
+        'Expected_Harvest': _dates(rng, n_cs, '2023-04-01'),
+        'Status': rng.choice(['Active', 'Completed'], n_cs),
+        'Created_Date': _dates(rng, n_cs)
+    })
+
+    quantity, rate = rng.integers(1, 6, k), rng.choice([150, 400, 500], k)
+    sheets['PRE_PROD_Land_Preparation'] = pd.DataFrame({
+        'Land_Prep_ID': _ids('LP', k),
+        'Crop_Season_ID': cs_of_rows(k),
+        'Date': _dates(rng, k),
+        'Operation_Type': rng.choice(['Ploughing', 'Planking', 'Laser Leveling'], k),
+        'Quantity': quantity,
+        'Unit': 'times',
+        'Rate_Per_Unit': rate,
+        'Total_Cost': quantity * rate,
+        'Payment_Mode': rng.choice(['Cash', 'UPI'], k),
+        'Payment_Status': _payment_status(rng, k),
+        'Notes': ''
+    })
+
+    qty, rate = rng.integers(50, 250, k), rng.choice([35, 80, 150], k)
+    treatment, bio = rng.integers(200, 700, k), rng.integers(100, 350, k)
+    sheets['PRE_PROD_Seed_Costs'] = pd.DataFrame({
+        'Seed_Cost_ID': _ids('SC', k),
+        'Crop_Season_ID': cs_of_rows(k),
+        'Date': _dates(rng, k),
+        'Variety': 'Local',
+        'Qty_KG': qty,
+        'Rate_Per_KG': rate,
+        'Seed_Cost': qty * rate,
+        'Treatment_Chemical': rng.choice(['Vitavax', 'Thiram', 'Carbendazim'], k),
+        'Treatment_Cost': treatment,
+        'Biofertilizer_Cost': bio,
+        'Total_Seed_Cost': qty * rate + treatment + bio,
+        'Payment_Mode': rng.choice(['Cash', 'UPI'], k),
+        'Payment_Status': _payment_status(rng, k)
+    })
+
+    tonnes, rate = rng.integers(5, 40, k), rng.choice([800, 1000], k)
+    labour, transport = rng.integers(500, 2500, k), rng.integers(500, 3500, k)
+    sheets['PRE_PROD_Organic_Manure'] = pd.DataFrame({
+        'Manure_ID': _ids('OM', k),
+        'Crop_Season_ID': cs_of_rows(k),
+        'Date': _dates(rng, k),
+        'Manure_Type': rng.choice(['FYM', 'Compost'], k),
+        'Qty_Tonnes': tonnes,
+        'Rate_Per_Tonne': rate,
+        'Material_Cost': tonnes * rate,
+        'Labor_Cost': labour,
+        'Transport_Cost': transport,
+        'Total_Manure_Cost': tonnes * rate + labour + transport,
+        'Payment_Mode': rng.choice(['Cash', 'Bank Transfer'], k),
+        'Payment_Status': _payment_status(rng, k)
+    })
+
+    qty, rate, labour = rng.integers(50, 300, k), rng.choice([8, 32], k), rng.integers(200, 600, k)
+    sheets['PROD_Fertilizer_Application'] = pd.DataFrame({
+        'Fertilizer_ID': _ids('FR', k),
+        'Crop_Season_ID': cs_of_rows(k),
+        'Date': _dates(rng, k),
+        'Stage': rng.choice(['Basal', '1st Split', '2nd Split'], k),
+        'Fertilizer_Name': rng.choice(['DAP', 'Urea'], k),
+        'Qty_KG': qty,
+        'Rate_Per_KG': rate,
+        'Fertilizer_Cost': qty * rate,
+        'Labor_Cost': labour,
+        'Total_Fertilizer_Cost': qty * rate + labour,
+        'Payment_Mode': rng.choice(['Cash', 'UPI'], k),
+        'Payment_Status': _payment_status(rng, k)
+    })
+
+    units, diesel, labour = rng.integers(50, 200, k), rng.choice([0, 500], k), rng.integers(100, 400, k)
+    sheets['PROD_Irrigation_Costs'] = pd.DataFrame({
+        'Irrigation_ID': _ids('IR', k),
+        'Crop_Season_ID': cs_of_rows(k),
+        'Date': _dates(rng, k),
+        'Irrigation_No': rng.integers(1, 8, k),
+        'Method': rng.choice(['Flood', 'Sprinkler', 'Drip'], k),
+        'Water_Source': rng.choice(['Tubewell', 'Canal'], k),
+        'Hours_Run': rng.integers(4, 12, k),
+        'Electricity_Units': units,
+        'Electricity_Cost': units * 8,
+        'Diesel_Cost': diesel,
+        'Labor_Cost': labour,
+        'Total_Irrigation_Cost': units * 8 + diesel + labour,
+        'Payment_Status': _payment_status(rng, k)
+    })
+
+    area = sheets['Crop_Season_Master']['Area_Acres'].to_numpy()
+    yield_per_acre = rng.uniform(8, 30, n_cs).round(1)
+    expected = rng.uniform(8, 30, n_cs).round(1)
+    sheets['POST_PROD_Yield_Record'] = pd.DataFrame({
+        'Yield_ID': _ids('YD', n_cs),
+        'Crop_Season_ID': crop_season_ids,
+        'Harvest_Date': _dates(rng, n_cs, '2023-04-01'),
+        'Main_Product_Qtls': (yield_per_acre * area).round(1),
+        'Yield_Per_Acre': yield_per_acre,
+        'By_Product_Qtls': (yield_per_acre * area * 0.6).round(1),
+        'Expected_Yield_Per_Acre': expected,
+        'Variance_%': ((yield_per_acre - expected) / expected * 100).round(2)
+    })
+
+    qty, rate = rng.integers(5, 150, k), rng.choice([200, 2100, 2275, 5500], k)
+    gross = qty * rate
+    received = np.where(rng.random(k) < 0.85, gross, (gross * rng.uniform(0, 1, k)).round())
+    msp = rate.astype(object)
+    msp[rng.random(k) < 0.1] = 'NA'
+    sheets['REVENUE_Sales'] = pd.DataFrame({
+        'Sale_ID': _ids('SL', k),
+        'Crop_Season_ID': cs_of_rows(k),
+        'Sale_Date': _dates(rng, k, '2023-04-01'),
+        'Product_Type': rng.choice(['Main Product', 'Straw'], k),
+        'Qty_Qtls': qty,
+        'Rate_Per_Qtl': rate,
+        'Gross_Revenue': gross,
+        'Buyer_Name': rng.choice(['Mandi', 'Local Buyer', 'FPO'], k),
+        'Buyer_Type': rng.choice(['Mandi', 'Direct'], k),
+        'MSP_Rate': msp,
+        'Payment_Received': received,
+        'Outstanding': gross - received
+    })
+    return sheets
+
+def generate_workbook(farms, seasons_per_farm, transactions, seed=0):
+    """Synthetic workbook as xlsx bytes, ready to load like an upload"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for sheet_name, sheet in generate_workbook_sheets(farms, seasons_per_farm, transactions, seed).items():
+            sheet.to_excel(writer, sheet_name=sheet_name, index=False)
+    return output.getvalue()
+
+# ====================
+# FUNCTION: BENCHMARK STAGES
+# ====================
+def _app():
+    """The Streamlit app, imported on first use for its page figure helpers
+
+    Outside `streamlit run` its page setup only logs bare mode warnings, which are silenced.
+    """
+    logging.disable(logging.WARNING)
+    try:
+        import app
+    finally:
+        logging.disable(logging.NOTSET)
+    return app
+
+def _page_chart_inputs(excel_data):
+    """Tables every page's figures are drawn from, built before the charts stage is timed"""
+    app = _app()
+    crop_seasons = get_crop_season_pnl(excel_data)
+    return {
+        'excel_data': excel_data,
+        'metrics': compute_summary_metrics(excel_data),
+        'flows': get_cash_flow_ledger(excel_data).flows(),
+        'comparison': app.crop_comparison_table(excel_data),
+        'seasons': {
+            season: app.season_table(crop_seasons[crop_seasons['Season_Name'] == season])
+            for season in crop_seasons['Season_Name'].dropna().unique()
+        },
+        'rollup': get_season_rollup(excel_data),
+    }
+
+def build_page_charts(inputs):
+    """Build every page's figures with the app's own figure helpers, starting from an empty figure cache"""
+    app = _app()
+    figure_cache = app.FigureCache()
+    figures = [
+        *app.dashboard_figures(inputs['excel_data'], inputs['metrics'], figure_cache),
+        *app.cash_flow_figures(inputs['flows'], figure_cache),
+        *app.crop_comparison_figures(inputs['comparison'], figure_cache),
+        *app.season_comparison_figures(inputs['rollup'], figure_cache),
+    ]
+    for season, table in inputs['seasons'].items():
+        figures.extend(app.season_figures(table, season, figure_cache))
+    return figures
+
+def _season_analysis(excel_data):
+    """Season roll-up plus the per-season totals for every season, as the selectbox would request"""
+    crop_seasons = get_crop_season_pnl(excel_data)
+    season_totals = {
+        season_name: crop_seasons[crop_seasons['Season_Name'] == season_name][['Area_Acres', 'Total_Cost', 'Total_Revenue']].sum()
+        for season_name in crop_seasons['Season_Name'].dropna().unique()
+    }
+    return get_season_rollup(excel_data), season_totals
+
+# Stages after the load, each run on the loaded workbook with no aggregates built yet
+STAGE_FUNCTIONS = {
+    'summary_metrics': compute_summary_metrics,
+    'crop_comparison': get_crop_season_pnl,
+    'season_analysis': _season_analysis,
+    'charts': build_page_charts,
+}
+
+# Untimed preparation of a stage's argument, for stages timing only part of a page
+STAGE_INPUTS = {
+    'charts': _page_chart_inputs,
+}
+
+def _run_pipeline(file_bytes, track_memory=False):
+    """Run every stage once on a fresh workbook; returns stage -> (seconds, peak bytes or None)
+
+    Each stage after the load starts without aggregates, so it pays for every one it
+    builds and its timing does not depend on the stages run before it.
+    """
+    results = {}
+    workbook = None
+    for stage in BENCH_STAGES:
+        if stage != 'load':
+            _drop_aggregates(workbook)
+            argument = STAGE_INPUTS.get(stage, lambda excel_data: excel_data)(workbook)
+        if track_memory:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        if stage == 'load':
+            workbook = _load_all_sheets(file_bytes)
+        else:
+            STAGE_FUNCTIONS[stage](argument)
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] - traced_before if track_memory else None
+        results[stage] = (seconds, peak)
+    return results
+
+def _drop_aggregates(workbook):
+    """Forget every derived aggregate, keeping the parsed sheets"""
+    with workbook.lock:
+        workbook.derived.clear()
+        workbook.derived_sheets.clear()
+        workbook.derived_nbytes.clear()
+
+def _load_all_sheets(file_bytes):
+    workbook = WorkbookData(file_bytes)
+    for sheet_name in workbook:
+        workbook[sheet_name]
+    return workbook
+
+def benchmark_size(size, repeat=3, seed=0):
+    """Time each stage on one synthetic workbook size; the best of `repeat` runs is kept"""
+    farms, seasons_per_farm, transactions = BENCH_SIZES[size]
+    file_bytes = generate_workbook(farms, seasons_per_farm, transactions, seed)
+    fact_rows = transactions * 6 + farms * seasons_per_farm
+
+    runs = [_run_pipeline(file_bytes) for _ in range(repeat)]
+    tracemalloc.start()
+    try:
+        memory = _run_pipeline(file_bytes, track_memory=True)
+    finally:
+        tracemalloc.stop()
+
+    stages = {}
+    for stage in BENCH_STAGES:
+        seconds = min(run[stage][0] for run in runs)
+        stages[stage] = {
+            'seconds': seconds,
+            'rows_per_second': fact_rows / seconds if seconds > 0 else None,
+            'peak_mb': memory[stage][1] / 1024 / 1024
+        }
+    return {
+        'farms': farms,
+        'seasons_per_farm': seasons_per_farm,
+        'transactions': transactions,
+        'rows': fact_rows,
+        'xlsx_mb': len(file_bytes) / 1024 / 1024,
+        'stages': stages
+    }
+
+def run_benchmarks(sizes, repeat=3, seed=0):
+    """Benchmark results for each size, with when and where they were taken"""
+    return {
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+        'sizes': {size: benchmark_size(size, repeat, seed) for size in sizes}
+    }
+
+# ====================
+# FUNCTION: BASELINE COMPARISON
+# ====================
+def find_regressions(results, baseline, tolerance=0.25):
+    """(size, stage, metric, baseline, current) for every stage slower or larger than the baseline allows"""
+    regressions = []
+    for size, current in results['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if previous is None:
+            continue
+        for stage, figures in current['stages'].items():
+            before = previous['stages'].get(stage)
+            if before is None:
+                continue
+            for metric in ('seconds', 'peak_mb'):
+                if figures[metric] > before[metric] * (1 + tolerance):
+                    regressions.append((size, stage, metric, before[metric], figures[metric]))
+    return regressions
+
+def format_report(results, regressions=()):
+    """Plain text table of every size and stage, followed by any regressions"""
+    lines = [f"{'size':<8} {'stage':<16} {'seconds':>9} {'rows/s':>12} {'peak MB':>9}"]
+    for size, current in results['sizes'].items():
+        for stage, figures in current['stages'].items():
+            throughput = f"{figures['rows_per_second']:,.0f}" if figures['rows_per_second'] else '-'
+            lines.append(f"{size:<8} {stage:<16} {figures['seconds']:>9.4f} {throughput:>12} {figures['peak_mb']:>9.1f}")
+    for size, stage, metric, before, after in regressions:
+        lines.append(f"REGRESSION {size} {stage} {metric}: {before:.4f} -> {after:.4f} ({(after / before - 1) * 100:+.0f}%)")
+    return '\n'.join(lines)
+
+# ====================
+# COMMAND LINE ENTRY POINT
+# ====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic ROOTS workbooks and benchmark the app's hot paths")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="write one synthetic workbook")
+    generate.add_argument('output', help="path of the .xlsx to write")
+    generate.add_argument('--farms', type=int, default=10)
+    generate.add_argument('--seasons', type=int, default=6, help="crop seasons per farm")
+    generate.add_argument('--transactions', type=int, default=1000, help="rows per cost and sales sheet")
+    generate.add_argument('--seed', type=int, default=0)
+
+    run = commands.add_parser('run', help="benchmark load, metrics, page aggregations and charts")
+    run.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help=f"comma separated, from {', '.join(BENCH_SIZES)}")
+    run.add_argument('--repeat', type=int, default=3)
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON to compare against")
+    run.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    run.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown or growth before flagging, e.g. 0.25")
+    run.add_argument('--json', dest='json_path', default=None, help="also write the full results here")
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        with open(args.output, 'wb') as f:
+            f.write(generate_workbook(args.farms, args.seasons, args.transactions, args.seed))
+        print(f"Wrote {args.output}", file=sys.stderr)
+        return 0
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in BENCH_SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    results = run_benchmarks(sizes, args.repeat, args.seed)
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = find_regressions(results, baseline, args.tolerance) if baseline else []
+    print(format_report(results, regressions))
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
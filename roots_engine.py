@@ -0,0 +1,1927 @@
+"""
+ROOTS - Farm Accounting Engine
+Workbook loading and profit and loss calculations shared by the Streamlit app
+and the batch command line tool; nothing here depends on Streamlit.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+from datetime import datetime
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+import copy
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # columnar snapshots are skipped without pyarrow
+    pa = None
+
+try:
+    import xlsxwriter
+except ImportError:  # xlsx exports fall back to openpyxl, which holds the whole workbook in memory
+    xlsxwriter = None
+
+# ====================
+# CLASS: RERUN TRACE
+# ====================
+class RerunTrace:
+    """Timed spans recorded while one rerun of the app script runs
+
+    Spans are plain dicts with the span name, its duration in milliseconds and
+    whatever the instrumented code reported, such as rows read or bytes held.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.spans = []
+        self.total_ms = None
+        self._started = time.perf_counter()
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self):
+        return {'started_at': self.started_at, 'total_ms': self.total_ms, 'spans': self.spans}
+
+# Each Streamlit session runs its script in its own thread, so traces are per thread
+_trace_state = threading.local()
+
+def start_trace():
+    """Begin recording spans for the current thread's rerun"""
+    _trace_state.trace = RerunTrace()
+    return _trace_state.trace
+
+def current_trace():
+    """The trace being recorded on this thread, or None"""
+    return getattr(_trace_state, 'trace', None)
+
+def finish_trace():
+    """Stop recording and return the finished trace, or None when none was started"""
+    trace = getattr(_trace_state, 'trace', None)
+    _trace_state.trace = None
+    if trace is not None:
+        trace.finish()
+    return trace
+
+@contextmanager
+def timed_span(name, **details):
+    """Time a block as one span of the current rerun; a no-op outside a trace
+
+    Yields the span's details dict so the block can add figures it only knows
+    at the end, e.g. span['rows'] = len(frame).
+    """
+    trace = getattr(_trace_state, 'trace', None)
+    started = time.perf_counter()
+    try:
+        yield details
+    finally:
+        if trace is not None:
+            trace.spans.append({'name': name, 'ms': (time.perf_counter() - started) * 1000, **details})
+
+def summarize_traces(traces):
+    """p50, p95 and worst time, call count and rows per span name over a set of reruns"""
+    spans = [span for trace in traces for span in trace.spans]
+    spans += [{'name': 'rerun total', 'ms': trace.total_ms} for trace in traces if trace.total_ms is not None]
+    if not spans:
+        return pd.DataFrame(columns=['Span', 'Calls', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Rows'])
+    
+    spans = pd.DataFrame(spans).reindex(columns=['name', 'ms', 'rows'])
+    grouped = spans.groupby('name', sort=False)
+    summary = pd.DataFrame({
+        'Calls': grouped['ms'].count(),
+        'p50 (ms)': grouped['ms'].quantile(0.5),
+        'p95 (ms)': grouped['ms'].quantile(0.95),
+        'Max (ms)': grouped['ms'].max(),
+        'Rows': grouped['rows'].max()
+    }).rename_axis('Span').reset_index()
+    return summary.sort_values('p95 (ms)', ascending=False, ignore_index=True)
+
+# ====================
+# SHEET SCHEMA
+# ====================
+# Column kinds of the ROOTS sheets. Identifiers and short enumerations become
+# categoricals, dates datetime64, and numbers compact numeric columns; columns
+# not listed (names, notes, contact details) are kept as parsed.
+SHEET_SCHEMA = {
+    'MASTER_Farm_Profile': {
+        'Farm_ID': 'id', 'Location': 'category', 'Total_Area_Acres': 'number',
+        'Soil_Type': 'category', 'Irrigation_Source': 'category'
+    },
+    'MASTER_Season': {'Season_ID': 'id', 'Start_Month': 'category', 'End_Month': 'category'},
+    'MASTER_Crops': {'Crop_ID': 'id', 'Category': 'category', 'Sub_Category': 'category', 'Unit_Measure': 'category'},
+    'Crop_Season_Master': {
+        'Crop_Season_ID': 'id', 'Farm_ID': 'id', 'Season_ID': 'id', 'Crop_ID': 'id', 'Variety': 'category',
+        'Area_Acres': 'number', 'Sowing_Date': 'date', 'Expected_Harvest': 'date', 'Status': 'category',
+        'Created_Date': 'date'
+    },
+    'PRE_PROD_Land_Preparation': {
+        'Land_Prep_ID': 'id', 'Crop_Season_ID': 'id', 'Date': 'date', 'Operation_Type': 'category',
+        'Quantity': 'number', 'Unit': 'category', 'Rate_Per_Unit': 'number', 'Total_Cost': 'number',
+        'Payment_Mode': 'category', 'Payment_Status': 'category'
+    },
+    'PRE_PROD_Seed_Costs': {
+        'Seed_Cost_ID': 'id', 'Crop_Season_ID': 'id', 'Date': 'date', 'Variety': 'category',
+        'Qty_KG': 'number', 'Rate_Per_KG': 'number', 'Seed_Cost': 'number', 'Treatment_Chemical': 'category',
+        'Treatment_Cost': 'number', 'Biofertilizer_Cost': 'number', 'Total_Seed_Cost': 'number',
+        'Payment_Mode': 'category', 'Payment_Status': 'category'
+    },
+    'PRE_PROD_Organic_Manure': {
+        'Manure_ID': 'id', 'Crop_Season_ID': 'id', 'Date': 'date', 'Manure_Type': 'category',
+        'Qty_Tonnes': 'number', 'Rate_Per_Tonne': 'number', 'Material_Cost': 'number', 'Labor_Cost': 'number',
+        'Transport_Cost': 'number', 'Total_Manure_Cost': 'number',
+        'Payment_Mode': 'category', 'Payment_Status': 'category'
+    },
+    'PROD_Fertilizer_Application': {
+        'Fertilizer_ID': 'id', 'Crop_Season_ID': 'id', 'Date': 'date', 'Stage': 'category',
+        'Fertilizer_Name': 'category', 'Qty_KG': 'number', 'Rate_Per_KG': 'number', 'Fertilizer_Cost': 'number',
+        'Labor_Cost': 'number', 'Total_Fertilizer_Cost': 'number',
+        'Payment_Mode': 'category', 'Payment_Status': 'category'
+    },
+    'PROD_Irrigation_Costs': {
+        'Irrigation_ID': 'id', 'Crop_Season_ID': 'id', 'Date': 'date', 'Irrigation_No': 'number',
+        'Method': 'category', 'Water_Source': 'category', 'Hours_Run': 'number', 'Electricity_Units': 'number',
+        'Electricity_Cost': 'number', 'Diesel_Cost': 'number', 'Labor_Cost': 'number',
+        'Total_Irrigation_Cost': 'number', 'Payment_Status': 'category'
+    },
+    'POST_PROD_Yield_Record': {
+        'Yield_ID': 'id', 'Crop_Season_ID': 'id', 'Harvest_Date': 'date', 'Main_Product_Qtls': 'number',
+        'Yield_Per_Acre': 'number', 'By_Product_Qtls': 'number', 'Expected_Yield_Per_Acre': 'number',
+        'Variance_%': 'number'
+    },
+    'REVENUE_Sales': {
+        'Sale_ID': 'id', 'Crop_Season_ID': 'id', 'Sale_Date': 'date', 'Product_Type': 'category',
+        'Qty_Qtls': 'number', 'Rate_Per_Qtl': 'number', 'Gross_Revenue': 'number', 'Buyer_Name': 'category',
+        'Buyer_Type': 'category', 'MSP_Rate': 'number', 'Payment_Received': 'number', 'Outstanding': 'number'
+    },
+}
+
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+def _normalize_column(series, kind):
+    """Convert one column to the compact dtype for its kind; already converted columns pass through"""
+    if kind == 'date':
+        return series if pd.api.types.is_datetime64_any_dtype(series) else pd.to_datetime(series, errors='coerce')
+    
+    if kind == 'number':
+        # Text such as MSP_Rate's 'NA' becomes missing rather than a mixed column
+        numbers = pd.to_numeric(series, errors='coerce')
+        if numbers.dtype == 'int32' or numbers.dtype.kind not in 'iuf' or numbers.isna().any():
+            return numbers
+        # Whole numbers drop to int32 when they fit; fractions stay float64 so amounts keep every paisa
+        if (numbers % 1 == 0).all() and (numbers.empty or (numbers.min() >= INT32_MIN and numbers.max() <= INT32_MAX)):
+            return numbers.astype('int32')
+        return numbers
+    
+    # Identifiers and enumerations only pay off as categoricals when values repeat
+    if isinstance(series.dtype, pd.CategoricalDtype) or series.nunique() * 2 > len(series):
+        return series
+    return series.astype('category')
+
+def normalize_sheet(sheet_name, sheet):
+    """Apply the ROOTS schema to a parsed sheet or column subset; unknown sheets are returned as is"""
+    schema = SHEET_SCHEMA.get(sheet_name)
+    if not schema:
+        return sheet
+    converted = {
+        column: _normalize_column(sheet[column], kind)
+        for column, kind in schema.items()
+        if column in sheet
+    }
+    converted = {column: values for column, values in converted.items() if values.dtype != sheet[column].dtype}
+    return sheet.assign(**converted) if converted else sheet
+
+# ====================
+# CLASS: WORKBOOK DATA
+# ====================
+def content_hash(file_bytes):
+    """Hash raw workbook bytes so identical uploads share cached sheets, snapshots and journal lines"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def frame_fingerprint(frame):
+    """Hash a DataFrame's values, index, column names and dtypes, e.g. to key figures built from it"""
+    digest = hashlib.sha256()
+    digest.update(repr(list(zip(frame.columns, map(str, frame.dtypes)))).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    return digest.hexdigest()
+
+# Layout of the snapshot files; bump when their contents change meaning
+SNAPSHOT_FORMAT_VERSION = 1
+
+def snapshot_version():
+    """Snapshot format and sheet schema together, so snapshots of an older schema are never read back"""
+    schema = sorted((name, sorted(columns.items())) for name, columns in SHEET_SCHEMA.items())
+    return f"{SNAPSHOT_FORMAT_VERSION}:{hashlib.sha256(repr(schema).encode()).hexdigest()[:16]}"
+
+def _column_names(header):
+    """Column names a full parse gives a header row: blanks become 'Unnamed: <position>' and repeats get '.1', '.2'"""
+    names, counts = [], {}
+    for i, name in enumerate(header):
+        name = f"Unnamed: {i}" if name is None or name == '' else name
+        count = counts.get(name, 0)
+        while count:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts.get(name, 0)
+        counts[name] = count + 1
+        names.append(name)
+    return names
+
+# Cells holding a shared string index; group 2 is the index
+_SHARED_STRING_CELL = re.compile(rb'(<c\b[^>]*\bt="s"[^>]*>\s*<v>)(\d+)(</v>)')
+
+_RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+def sheet_fingerprints(file_bytes):
+    """Content hash of every sheet's XML part in an xlsx, keyed by sheet name
+
+    Shared string indexes are replaced by the strings they point to, so a sheet
+    keeps its fingerprint when other sheets add strings to the shared table. The
+    styles part and the 1904 date flag go into every fingerprint, since they decide
+    how cells read back. Files that are not xlsx have no fingerprints.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+            parts = set(archive.namelist())
+            workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+            relationships = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+            targets = {rel.get('Id'): rel.get('Target') for rel in relationships}
+            
+            shared_strings = []
+            if 'xl/sharedStrings.xml' in parts:
+                shared_strings = [''.join(item.itertext()).encode() for item in ElementTree.fromstring(archive.read('xl/sharedStrings.xml'))]
+            
+            common = hashlib.sha256()
+            common.update(archive.read('xl/styles.xml') if 'xl/styles.xml' in parts else b'')
+            for element in workbook.iter():
+                if element.tag.endswith('}workbookPr'):
+                    common.update(str(element.get('date1904')).encode())
+            
+            fingerprints = {}
+            for element in workbook.iter():
+                if not element.tag.endswith('}sheet'):
+                    continue
+                target = targets[element.get(_RELATIONSHIP_ID)]
+                part = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+                content = _SHARED_STRING_CELL.sub(
+                    lambda match: match.group(1) + shared_strings[int(match.group(2))] + match.group(3),
+                    archive.read(part)
+                )
+                digest = common.copy()
+                digest.update(content)
+                fingerprints[element.get('name')] = digest.hexdigest()
+            return fingerprints
+    except (zipfile.BadZipFile, KeyError, IndexError, ElementTree.ParseError):
+        return {}
+
+# Sheets read by the aggregates being built on this thread, innermost last
+_read_tracking = threading.local()
+
+@contextmanager
+def tracking_sheet_reads():
+    """Collect the names of the sheets read inside the block, including through nested aggregates"""
+    stack = _read_tracking.__dict__.setdefault('stack', [])
+    reads = set()
+    stack.append(reads)
+    try:
+        yield reads
+    finally:
+        stack.pop()
+
+def record_sheet_reads(sheet_names):
+    """Note sheets as read by every aggregate currently being built on this thread"""
+    for reads in getattr(_read_tracking, 'stack', ()):
+        reads.update(sheet_names)
+
+class WorkbookData(Mapping):
+    """Lazily parsed sheets of one uploaded workbook, plus aggregates derived from them
+
+    Sheets are parsed from the raw bytes only when first accessed, and a page that
+    needs just a few columns can stream those out of the sheet with read_columns
+    without materializing the rest. With a snapshot_dir, every parsed sheet is also
+    written there as an uncompressed Arrow file, and later loads of the same
+    workbook memory-map those files instead of opening the xlsx at all. Snapshots
+    written under another snapshot_version are deleted and written again.
+    
+    Rows added, edited or deleted through the Data Entry page are overlaid on their
+    sheets with set_entry, so every page sees them without the workbook being
+    rewritten. Derived aggregates that can absorb a single row change (those with
+    an apply_row_change method) are updated in place; the rest are rebuilt on use.
+
+    One instance may be shared by many sessions. Sheets and aggregates are handed
+    out as copy-on-write views, so a caller modifying them never changes what
+    other sessions see; entered rows are the only writes, and they arrive through
+    the entry journal. Each sheet and aggregate is built under its own build_lock,
+    so callers wanting the same one share its build while reads of anything
+    already built go on; the workbook lock is only held to update the bookkeeping.
+
+    A re-uploaded workbook takes over, with reuse_unchanged, the parsed sheets of
+    the version it replaces whose content did not change, along with aggregates
+    built only from those sheets; only the changed sheets are parsed again.
+    """
+
+    def __init__(self, file_bytes, content_key=None, snapshot_dir=None):
+        self.content_key = content_key or content_hash(file_bytes)
+        self.nbytes_raw = len(file_bytes)
+        self.derived = {}  # aggregate name -> result, filled lazily by workbook_aggregate
+        self.derived_nbytes = {}  # aggregate name -> memory it holds, measured when built
+        self.derived_sheets = {}  # aggregate name -> sheets read while building it
+        self.journal_offset = 0  # bytes of the entry journal already applied
+        self.pending_changes = 0  # entry changes not yet written out in an updated workbook
+        self.snapshot_dir = snapshot_dir if pa is not None else None
+        self.database = None  # WorkbookDatabase mirroring the sheets and entered rows, if attached
+        self._file_bytes = file_bytes
+        self._excel_file = None
+        self._sheets = {}  # sheet name -> fully parsed DataFrame
+        self._column_subsets = {}  # (sheet name, column) -> that column alone, or None when the sheet lacks it
+        self._sheet_bytes = {}
+        self._sheet_bytes_parsed = {}  # same keys, memory as parsed before applying the sheet schema
+        self._entries = {}  # sheet name -> {entry ID: row} added through data entry
+        self._merged = {}  # (sheet name, columns) -> parsed rows plus entered rows
+        self._merged_bytes = {}  # same keys -> memory of the merged rows
+        self._lock = threading.RLock()
+        self._build_locks = {}  # ('sheet' | 'columns' | 'aggregate', key), or 'xlsx' for the reader -> lock
+        self.entry_version = 0  # bumped on every entered row change, so builds can tell they went stale
+        self._fingerprints = None  # sheet name -> content fingerprint, see sheet_fingerprints
+        
+        self._sheet_names = self._read_manifest()
+        if self._sheet_names is None:
+            self._remove_snapshots()
+            self._sheet_names = list(self._open().sheet_names)
+            self._write_manifest()
+
+    def _open(self):
+        """Open the raw workbook, which is only needed for sheets without a snapshot"""
+        with self._lock:
+            if self._excel_file is None:
+                with timed_span('open workbook', bytes=self.nbytes_raw):
+                    self._excel_file = pd.ExcelFile(io.BytesIO(self._file_bytes))
+        return self._excel_file
+
+    def __getitem__(self, sheet_name):
+        if sheet_name not in self._sheet_names:
+            raise KeyError(sheet_name)
+        record_sheet_reads([sheet_name])
+        parsed = self._parsed_sheet(sheet_name)
+        with self._lock:
+            return self._with_entries(sheet_name, None, parsed).copy(deep=False)
+
+    def build_lock(self, key):
+        """Lock held while one sheet, column subset or aggregate is built, shared by everyone building it"""
+        with self._lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def _parsed_sheet(self, sheet_name):
+        """Sheet as parsed from its snapshot or the xlsx, without entered rows"""
+        if sheet_name in self._sheets:
+            return self._sheets[sheet_name]
+        with self.build_lock(('sheet', sheet_name)):
+            if sheet_name not in self._sheets:
+                with timed_span(f"read sheet {sheet_name}", sheet=sheet_name, source='snapshot') as span:
+                    sheet = self._load_snapshot(sheet_name)
+                    if sheet is None:
+                        span['source'] = 'xlsx'
+                        sheet = self._normalized(sheet_name, sheet_name, self._parse(sheet_name))
+                        self._save_snapshot(sheet_name, sheet)
+                    nbytes = int(sheet.memory_usage(deep=True).sum())
+                    with self._lock:
+                        self._sheets[sheet_name] = sheet
+                        self._sheet_bytes[sheet_name] = nbytes
+                        # Columns read earlier are now slices of the whole sheet, so stop holding them
+                        for key in [key for key in self._column_subsets if key[0] == sheet_name]:
+                            del self._column_subsets[key]
+                            self._sheet_bytes.pop(key, None)
+                            self._sheet_bytes_parsed.pop(key, None)
+                    span.update(rows=len(sheet), bytes=nbytes)
+        return self._sheets[sheet_name]
+
+    def _parse(self, sheet_name, **kwargs):
+        """Parse a sheet of the raw workbook; openpyxl's reader is not safe to share between threads"""
+        with self.build_lock('xlsx'):
+            return self._open().parse(sheet_name, **kwargs)
+
+    def __contains__(self, sheet_name):
+        return sheet_name in self._sheet_names
+
+    def __iter__(self):
+        return iter(self._sheet_names)
+
+    def __len__(self):
+        return len(self._sheet_names)
+
+    def read_columns(self, sheet_name, columns):
+        """Return only the named columns of a sheet, skipping those the sheet does not have"""
+        if sheet_name not in self._sheet_names:
+            raise KeyError(sheet_name)
+        record_sheet_reads([sheet_name])
+        parsed = self._parsed_columns(sheet_name, columns)
+        with self._lock:
+            return self._with_entries(sheet_name, tuple(columns), parsed).copy(deep=False)
+
+    def _parsed_columns(self, sheet_name, columns):
+        """Column subset as parsed, without entered rows
+
+        Each column is read once and cached on its own, so overlapping column sets
+        only read the columns not seen before, in one pass over the sheet.
+        """
+        if sheet_name in self._sheets:
+            sheet = self._sheets[sheet_name]
+            return sheet[[column for column in columns if column in sheet]]
+        
+        if any((sheet_name, column) not in self._column_subsets for column in columns):
+            with self.build_lock(('columns', sheet_name)):
+                missing = [column for column in columns if (sheet_name, column) not in self._column_subsets]
+                if missing and sheet_name not in self._sheets:
+                    self._read_columns(sheet_name, missing)
+        with self._lock:
+            # The whole sheet may have been parsed meanwhile, which drops the columns read on their own
+            sheet = self._sheets.get(sheet_name)
+            if sheet is None:
+                subset = {column: self._column_subsets[(sheet_name, column)] for column in columns}
+        if sheet is not None:
+            return sheet[[column for column in columns if column in sheet]]
+        return pd.DataFrame({column: values for column, values in subset.items() if values is not None}, copy=False)
+
+    def _read_columns(self, sheet_name, columns):
+        """Read columns not cached yet from the snapshot or the xlsx and cache each of them"""
+        with timed_span(f"read columns {sheet_name}", sheet=sheet_name, source='snapshot') as span:
+            parsed = None
+            subset = self._load_snapshot(sheet_name, columns)
+            if subset is None and self.snapshot_dir:
+                # Convert the whole sheet once so any later column set can be read from disk
+                span['source'] = 'xlsx'
+                parsed = self._parse(sheet_name)
+                sheet = normalize_sheet(sheet_name, parsed)
+                self._save_snapshot(sheet_name, sheet)
+                subset = sheet[[column for column in columns if column in sheet]]
+            elif subset is None:
+                if self._open().engine == 'openpyxl':
+                    span['source'] = 'xlsx stream'
+                    parsed = self._stream_columns(sheet_name, columns)
+                else:
+                    span['source'] = 'xlsx'
+                    parsed = self._parse(sheet_name, usecols=lambda column: column in columns)
+                subset = normalize_sheet(sheet_name, parsed)
+            
+            with self._lock:
+                for column in columns:
+                    key = (sheet_name, column)
+                    if column not in subset:
+                        self._column_subsets[key] = None
+                        continue
+                    # A copy, so a column taken from a whole parsed sheet does not keep the rest alive
+                    self._column_subsets[key] = subset[column].copy()
+                    self._sheet_bytes[key] = int(subset[column].memory_usage(deep=True))
+                    if parsed is not None:
+                        self._sheet_bytes_parsed[key] = int(parsed[column].memory_usage(deep=True))
+            span.update(rows=len(subset), bytes=int(subset.memory_usage(deep=True).sum()))
+
+    def _normalized(self, sheet_name, key, parsed):
+        """Apply the sheet schema to freshly parsed rows, noting their memory before and after"""
+        self._sheet_bytes_parsed[key] = int(parsed.memory_usage(deep=True).sum())
+        return normalize_sheet(sheet_name, parsed)
+
+    def _stream_columns(self, sheet_name, columns):
+        """Walk the sheet row by row with the read-only reader, keeping only the wanted cells
+
+        Cells are kept by position and columns named like a full parse names them, so
+        a repeated header gives a second column ('Total_Cost.1') rather than mixing
+        two. Blank rows are kept like a full parse keeps them, up to the last row
+        with any cell filled, and the kept cells go through the parser pandas uses
+        for a full parse, so values and dtypes come out the same however a sheet
+        was read.
+        """
+        from openpyxl.cell.cell import ERROR_CODES
+        
+        with self.build_lock('xlsx'):
+            rows = self._open().book[sheet_name].iter_rows(values_only=True)
+            names = _column_names(next(rows, None) or ())
+            positions = [i for i, name in enumerate(names) if name in columns]
+            
+            kept = [[names[i] for i in positions]]
+            filled = 0
+            for row in rows:
+                kept.append([row[i] if i < len(row) else None for i in positions])
+                if any(cell is not None and cell != '' for cell in row):
+                    filled = len(kept)
+        
+        # Convert cells as pandas' openpyxl reader does: blanks and errors are missing, whole floats are ints
+        data = [kept[0]] + [
+            [
+                '' if cell is None or cell in ERROR_CODES else int(cell) if isinstance(cell, float) and cell.is_integer() else cell
+                for cell in row
+            ]
+            for row in kept[1:filled]
+        ]
+        # A full parse drops blank rows only from sheets a single column wide
+        return TextParser(data, header=0, skip_blank_lines=len(names) <= 1).read()
+
+    def entries(self, sheet_name):
+        """Rows entered for a sheet, keyed by entry ID in the order they were added"""
+        with self._lock:
+            return dict(self._entries.get(sheet_name, {}))
+
+    def set_entry(self, sheet_name, entry_id, row):
+        """Insert or replace one entered row, or delete it when row is None"""
+        if sheet_name not in self._sheet_names:
+            return
+        with self._lock:
+            entries = self._entries.setdefault(sheet_name, {})
+            old_row = entries.get(entry_id)
+            if old_row is None and row is None:
+                return
+            if row is None:
+                del entries[entry_id]
+            else:
+                entries[entry_id] = row
+            self.entry_version += 1
+            
+            if self.database is not None:
+                self.database.set_entry(sheet_name, entry_id, row)
+            self._merged = {key: frame for key, frame in self._merged.items() if key[0] != sheet_name}
+            self._merged_bytes = {key: nbytes for key, nbytes in self._merged_bytes.items() if key[0] != sheet_name}
+            for name, aggregate in list(self.derived.items()):
+                absorbed = hasattr(aggregate, 'apply_row_change') and aggregate.apply_row_change(sheet_name, old_row, row)
+                if not absorbed:
+                    del self.derived[name]
+
+    def sheet_fingerprints(self):
+        """Content fingerprint of every sheet, computed from the raw xlsx on first use"""
+        if self._fingerprints is None:
+            with timed_span('fingerprint sheets', bytes=self.nbytes_raw):
+                self._fingerprints = sheet_fingerprints(self._file_bytes)
+        return self._fingerprints
+
+    def reuse_unchanged(self, previous):
+        """Take over what an earlier version of this workbook parsed and derived from sheets that did not change
+
+        Parsed sheets and column subsets are shared, snapshots are copied, and an
+        aggregate is kept when every sheet it read is unchanged and had no entered
+        rows. Returns the names of the sheets whose content changed, which is every
+        sheet when either version is not an xlsx and so has no fingerprints.
+        """
+        ours, theirs = self.sheet_fingerprints(), previous.sheet_fingerprints()
+        if not ours or not theirs:
+            return sorted(self._sheet_names)
+        unchanged = {name for name, fingerprint in ours.items() if theirs.get(name) == fingerprint}
+        
+        with timed_span('reuse unchanged sheets', sheets=len(unchanged)) as span, self._lock, previous.lock:
+            for name in unchanged:
+                if name in previous._sheets:
+                    self._sheets[name] = previous._sheets[name]
+                    self._sheet_bytes[name] = previous._sheet_bytes[name]
+                    if name in previous._sheet_bytes_parsed:
+                        self._sheet_bytes_parsed[name] = previous._sheet_bytes_parsed[name]
+                self._copy_snapshot(previous, name)
+            for key, subset in previous._column_subsets.items():
+                if key[0] in unchanged:
+                    self._column_subsets[key] = subset
+                    if key in previous._sheet_bytes:
+                        self._sheet_bytes[key] = previous._sheet_bytes[key]
+                    if key in previous._sheet_bytes_parsed:
+                        self._sheet_bytes_parsed[key] = previous._sheet_bytes_parsed[key]
+            
+            # Aggregates also depend on which sheets exist, so keep none when sheets were added or removed
+            if set(ours) == set(theirs):
+                for name, aggregate in list(previous.derived.items()):
+                    sheets = previous.derived_sheets.get(name)
+                    if sheets is None or not sheets <= unchanged or any(previous._entries.get(sheet) for sheet in sheets):
+                        continue
+                    # Aggregates absorbing entered rows change in place, so each workbook needs its own
+                    self.derived[name] = aggregate.copy(deep=False) if isinstance(aggregate, pd.DataFrame) else copy.deepcopy(aggregate)
+                    self.derived_sheets[name] = sheets
+                    if name in previous.derived_nbytes:
+                        self.derived_nbytes[name] = previous.derived_nbytes[name]
+            span['aggregates'] = len(self.derived)
+        return sorted(set(ours) - unchanged)
+
+    def _copy_snapshot(self, previous, sheet_name):
+        """Copy an unchanged sheet's snapshot from the earlier version, if both keep snapshots"""
+        if not (self.snapshot_dir and previous.snapshot_dir) or sheet_name not in self._sheet_names:
+            return
+        source = previous._snapshot_path(sheet_name)
+        target = self._snapshot_path(sheet_name)
+        if os.path.exists(target) or not os.path.exists(source):
+            return
+        try:
+            _write_atomically(target, lambda path: shutil.copyfile(source, path))
+        except OSError:
+            pass
+
+    def attach_database(self, database):
+        """Keep this workbook's sheets and entered rows in a WorkbookDatabase and total them there
+
+        Sheets are imported only when the database does not already hold this workbook,
+        streamed from the xlsx in chunks unless they were parsed already. Aggregates
+        built so far stay, except those over sheets with entered rows.
+        """
+        if not database.holds(self.content_key):
+            database.import_sheets(self.content_key, (
+                (name, self._sheet_chunks(name, SQL_IMPORT_CHUNK_ROWS)) for name in self._sheet_names
+            ))
+        with self._lock:
+            # Entered rows from an earlier run are replayed from the journal, not trusted
+            database.clear_entries()
+            for sheet_name, rows in self._entries.items():
+                for entry_id, row in rows.items():
+                    database.set_entry(sheet_name, entry_id, row)
+            self.database = database
+            entered = {sheet_name for sheet_name, rows in self._entries.items() if rows}
+            for name in [name for name in self.derived if self.derived_sheets.get(name, entered) & entered]:
+                del self.derived[name]
+
+    def detach_database(self):
+        """Stop using the attached database and close it, e.g. when the workbook leaves the cache"""
+        with self._lock:
+            database, self.database = self.database, None
+        if database is not None:
+            database.close()
+
+    def _sheet_chunks(self, sheet_name, chunk_rows):
+        """Yield a sheet's rows, without entered rows, as normalized DataFrames of up to chunk_rows
+
+        A sheet parsed already is sliced; otherwise rows are streamed from the xlsx,
+        so the whole sheet is never held in memory at once. Blank rows are skipped.
+        """
+        sheet = self._sheets.get(sheet_name)
+        if sheet is None and self._open().engine != 'openpyxl':
+            sheet = self._parsed_sheet(sheet_name)
+        if sheet is not None:
+            for start in range(0, max(len(sheet), 1), chunk_rows):
+                yield sheet.iloc[start:start + chunk_rows]
+            return
+        
+        with self.build_lock('xlsx'):
+            rows = self._open().book[sheet_name].iter_rows(values_only=True)
+            header = _column_names(next(rows, None) or ())
+            chunk, yielded = [], False
+            for row in rows:
+                if all(cell is None or cell == '' for cell in row):
+                    continue
+                chunk.append(tuple(row[:len(header)]) + (None,) * (len(header) - len(row)))
+                if len(chunk) == chunk_rows:
+                    yield normalize_sheet(sheet_name, pd.DataFrame(chunk, columns=header))
+                    chunk, yielded = [], True
+            if chunk or not yielded:
+                yield normalize_sheet(sheet_name, pd.DataFrame(chunk, columns=header))
+
+    def _with_entries(self, sheet_name, columns, parsed):
+        """Append a sheet's entered rows below its parsed rows, restricted to the same columns"""
+        rows = self._entries.get(sheet_name)
+        if not rows:
+            return parsed
+        key = (sheet_name, columns)
+        if key not in self._merged:
+            added = pd.DataFrame(list(rows.values()))
+            if columns is not None:
+                added = added[[column for column in parsed.columns if column in added]]
+            merged = pd.concat([parsed, added.dropna(axis=1, how='all')], ignore_index=True)
+            # Entered rows arrive as text and plain numbers, so bring the combined columns back to schema dtypes
+            self._merged[key] = normalize_sheet(sheet_name, merged)
+            self._merged_bytes[key] = int(self._merged[key].memory_usage(deep=True).sum())
+        return self._merged[key]
+
+    def _snapshot_path(self, sheet_name):
+        # Sheet names may not be valid file names, so snapshots are stored by position
+        return os.path.join(self.snapshot_dir, f"sheet_{self._sheet_names.index(sheet_name):02d}.arrow")
+
+    def _read_manifest(self):
+        """Sheet names from the snapshot manifest, or None without snapshots of the current version"""
+        if not self.snapshot_dir:
+            return None
+        try:
+            with open(os.path.join(self.snapshot_dir, 'manifest.json')) as f:
+                manifest = json.load(f)
+            return manifest['sheet_names'] if manifest.get('version') == snapshot_version() else None
+        except (OSError, ValueError, KeyError, AttributeError):
+            return None
+
+    def _remove_snapshots(self):
+        """Delete snapshots left by another version, so none of them is read before being rewritten"""
+        if not self.snapshot_dir:
+            return
+        try:
+            names = os.listdir(self.snapshot_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith('sheet_') and name.endswith('.arrow'):
+                try:
+                    os.remove(os.path.join(self.snapshot_dir, name))
+                except OSError:
+                    pass
+
+    def _write_manifest(self):
+        if not self.snapshot_dir:
+            return
+        
+        def write(path):
+            with open(path, 'w') as f:
+                json.dump({'version': snapshot_version(), 'sheet_names': self._sheet_names}, f)
+        
+        try:
+            _write_atomically(os.path.join(self.snapshot_dir, 'manifest.json'), write)
+        except OSError:
+            pass
+
+    def _load_snapshot(self, sheet_name, columns=None):
+        """Memory-map a sheet's Arrow snapshot and convert only the requested columns
+
+        The schema is applied again on the way out, which costs nothing for columns
+        that already have their schema dtype.
+        """
+        if not self.snapshot_dir:
+            return None
+        path = self._snapshot_path(sheet_name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+                if columns is not None:
+                    table = table.select([column for column in columns if column in table.column_names])
+                return normalize_sheet(sheet_name, table.to_pandas())
+        except (OSError, pa.ArrowException):
+            return None
+
+    def _save_snapshot(self, sheet_name, sheet):
+        """Write a parsed sheet as an uncompressed Arrow file; sheets Arrow cannot hold are skipped"""
+        if not self.snapshot_dir:
+            return
+        
+        # Columns mixing text and numbers (e.g. notes holding both) are stored as text
+        for column in sheet.columns[sheet.dtypes == object]:
+            if pd.api.types.infer_dtype(sheet[column], skipna=True) in ('mixed', 'mixed-integer'):
+                sheet = sheet.assign(**{column: sheet[column].map(lambda value: value if pd.isna(value) else str(value))})
+        
+        try:
+            _write_atomically(
+                self._snapshot_path(sheet_name),
+                lambda path: feather.write_feather(sheet, path, compression='uncompressed')
+            )
+        except (OSError, ValueError, TypeError, pa.ArrowException):
+            pass
+
+    @property
+    def lock(self):
+        """Re-entrant lock guarding the bookkeeping of parsed sheets, entered rows and derived aggregates
+
+        Held only briefly; parsing a sheet or building an aggregate holds its build_lock instead.
+        """
+        return self._lock
+
+    @property
+    def nbytes(self):
+        """Memory held by this workbook: the raw upload and everything parsed, merged with entered rows or derived so far"""
+        with self._lock:
+            derived = sum(self.derived_nbytes.get(name, 0) for name in self.derived)
+            return self.nbytes_raw + sum(self._sheet_bytes.values()) + sum(self._merged_bytes.values()) + derived
+
+    def sheet_stats(self):
+        """Rows and memory of every sheet parsed so far, and of the columns read from other sheets
+
+        Bytes Parsed is the memory before the sheet schema was applied; it is
+        missing for sheets read back from an already normalized snapshot.
+        """
+        with self._lock:
+            rows = [
+                (name, 'all', len(sheet), self._sheet_bytes_parsed.get(name), self._sheet_bytes[name])
+                for name, sheet in self._sheets.items()
+            ]
+            columns_read = {}
+            for (name, column), values in self._column_subsets.items():
+                if values is not None:
+                    columns_read.setdefault(name, []).append((column, len(values)))
+            for name, columns in columns_read.items():
+                keys = [(name, column) for column, _ in columns]
+                parsed = [self._sheet_bytes_parsed.get(key) for key in keys]
+                rows.append((
+                    name, ', '.join(column for column, _ in columns), columns[0][1],
+                    None if None in parsed else sum(parsed), sum(self._sheet_bytes[key] for key in keys)
+                ))
+        return pd.DataFrame(rows, columns=['Sheet', 'Columns', 'Rows', 'Bytes Parsed', 'Bytes'])
+
+def _write_atomically(path, write):
+    """Write a cache file under a temporary name and move it into place, so readers never see partial files"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# ====================
+# CLASS: ENTRY JOURNAL
+# ====================
+class EntryJournal:
+    """Append-only JSONL journal of rows added through the Data Entry forms
+
+    Each line is either an entry change, tagged with the content hash of the workbook
+    it belongs to, or a flush marker written when the changes so far went out in an
+    updated workbook download. An entry change carries the entry ID and the row's
+    new values, or null when the row was deleted, so replaying lines in order
+    rebuilds the current rows. Every session replays new lines on its next rerun.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, record):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def record_entry(self, workbook, sheet_name, row, entry_id=None):
+        """Persist a new row, an edit (with entry_id) or a deletion (row=None) and apply it straight away"""
+        self.append({
+            'kind': 'entry',
+            'workbook': workbook.content_key,
+            'sheet': sheet_name,
+            'entry_id': entry_id or uuid.uuid4().hex,
+            'row': row,
+            'recorded_at': datetime.now().isoformat(timespec='seconds')
+        })
+        self.sync(workbook)
+
+    def record_flush(self, workbook):
+        """Mark every change so far as included in an updated workbook download"""
+        self.append({'kind': 'flush', 'workbook': workbook.content_key})
+        self.sync(workbook)
+
+    def sync(self, workbook):
+        """Apply lines appended since the workbook last synced, reading only the new tail"""
+        # Sessions sharing a workbook may sync it at the same time; each line must apply once
+        with getattr(workbook, 'lock', None) or nullcontext():
+            self._apply_tail(workbook)
+
+    def _apply_tail(self, workbook):
+        try:
+            if os.path.getsize(self.path) <= workbook.journal_offset:
+                return
+            with open(self.path, 'rb') as f:
+                f.seek(workbook.journal_offset)
+                tail = f.read()
+        except OSError:
+            return
+        
+        # A line still being written by another session is picked up next time
+        complete = tail[:tail.rfind(b'\n') + 1]
+        offset = workbook.journal_offset
+        workbook.journal_offset += len(complete)
+        
+        for line in complete.splitlines(keepends=True):
+            line_offset, offset = offset, offset + len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('workbook') != workbook.content_key:
+                continue
+            if record.get('kind') == 'entry':
+                # Lines written before entries had IDs are identified by their position
+                entry_id = record.get('entry_id') or f"line-{line_offset}"
+                workbook.set_entry(record['sheet'], entry_id, record['row'])
+                workbook.pending_changes += 1
+            elif record.get('kind') == 'flush':
+                workbook.pending_changes = 0
+
+# ====================
+# CLASS: WORKBOOK DATABASE
+# ====================
+# Key columns indexed in every table that has them, next to each sheet's date columns
+SQL_INDEX_COLUMNS = ['Crop_Season_ID', 'Season_ID', 'Crop_ID']
+
+SQL_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Rows imported per batch, so a sheet streamed from the xlsx is never held whole in memory
+SQL_IMPORT_CHUNK_ROWS = 20000
+
+class WorkbookDatabase:
+    """Sheets of one workbook, plus its entered rows, in an embedded SQLite database
+
+    Every sheet becomes a table indexed on its key and date columns. On fact sheets,
+    the Crop_Season_ID index also carries the amount column, so per crop season
+    totals are read from the index alone. The database file outlives the process,
+    so a workbook imported once is never parsed again just to aggregate it.
+    Only the cost and revenue totals are computed here; other aggregates, such as
+    cash flow, dues and the master data lookups, still read the sheets in memory.
+    Entered rows are written in a transaction each and tagged with their entry ID
+    in an _entry_id column, so replaying the entry journal over them is harmless.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS _roots_meta (name TEXT PRIMARY KEY, value TEXT)')
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def holds(self, content_key):
+        """Whether a complete import of the workbook with this content hash is already stored"""
+        with self._lock:
+            stored = self._connection.execute(
+                "SELECT value FROM _roots_meta WHERE name = 'content_key'"
+            ).fetchone()
+        return stored is not None and stored[0] == content_key
+
+    def import_sheets(self, content_key, sheets):
+        """Replace the stored tables with (sheet name, DataFrame chunks) pairs and index them
+
+        Each sheet's chunks are appended in turn, so only one chunk is held at a time.
+        The content hash is recorded last, so an interrupted import is redone next time.
+        """
+        with self._lock, timed_span('import database', path=self.path) as span:
+            self._connection.execute("DELETE FROM _roots_meta WHERE name = 'content_key'")
+            self._connection.commit()
+            rows = 0
+            for sheet_name, chunks in sheets:
+                columns = None
+                for chunk in chunks:
+                    chunk.assign(_entry_id=None).to_sql(
+                        sheet_name, self._connection, if_exists='replace' if columns is None else 'append', index=False
+                    )
+                    columns = set(chunk.columns)
+                    rows += len(chunk)
+                if columns is not None:
+                    self._create_indexes(sheet_name, columns)
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO _roots_meta VALUES ('content_key', ?)", (content_key,)
+                )
+            span['rows'] = rows
+
+    def _create_indexes(self, sheet_name, columns):
+        amount_column = _fact_amount_columns().get(sheet_name)
+        date_columns = [column for column, kind in SHEET_SCHEMA.get(sheet_name, {}).items() if kind == 'date']
+        with self._connection:
+            for column in SQL_INDEX_COLUMNS + date_columns + ['_entry_id']:
+                if column not in columns and column != '_entry_id':
+                    continue
+                indexed = [column]
+                if column == 'Crop_Season_ID' and amount_column in columns:
+                    indexed.append(amount_column)
+                self._connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS {_quote(f"ix_{sheet_name}_{column}")} '
+                    f'ON {_quote(sheet_name)} ({", ".join(map(_quote, indexed))})'
+                )
+
+    def set_entry(self, sheet_name, entry_id, row):
+        """Insert or replace one entered row, or delete it when row is None, in a single transaction"""
+        if row is not None:
+            values = normalize_sheet(sheet_name, pd.DataFrame([row])).iloc[0]
+        with self._lock, self._connection:
+            columns = self._columns(sheet_name)
+            if columns is None:
+                return
+            self._connection.execute(f'DELETE FROM {_quote(sheet_name)} WHERE _entry_id = ?', (entry_id,))
+            if row is None:
+                return
+            for column in values.index.difference(columns, sort=False):
+                self._connection.execute(f'ALTER TABLE {_quote(sheet_name)} ADD COLUMN {_quote(column)}')
+            names = list(values.index) + ['_entry_id']
+            self._connection.execute(
+                f'INSERT INTO {_quote(sheet_name)} ({", ".join(map(_quote, names))}) '
+                f'VALUES ({", ".join("?" * len(names))})',
+                [_sql_value(value) for value in values] + [entry_id]
+            )
+
+    def clear_entries(self):
+        """Delete every entered row, keeping the imported sheets"""
+        with self._lock, self._connection:
+            for table in self._tables():
+                self._connection.execute(f'DELETE FROM {_quote(table)} WHERE _entry_id IS NOT NULL')
+
+    def _tables(self):
+        return [name for (name,) in self._connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name != '_roots_meta'"
+        )]
+
+    def _columns(self, sheet_name):
+        """Column names of a sheet's table, or None when the sheet was not imported"""
+        columns = [info[1] for info in self._connection.execute(f'PRAGMA table_info({_quote(sheet_name)})')]
+        return columns or None
+
+    def totals_cube(self):
+        """Cost and revenue by Crop_Season_ID and Category, aggregated in SQL
+
+        Same totals as the aggregation cube rolled up past month and the dimensions;
+        rows without a crop season keep a null key so the totals still add up.
+        """
+        with self._lock, timed_span('sql totals') as span:
+            selects, categories = [], []
+            for sheet_name, amount_column in _fact_amount_columns().items():
+                columns = self._columns(sheet_name)
+                if columns is None or amount_column not in columns:
+                    continue
+                record_sheet_reads([sheet_name])
+                category = COST_SHEET_COLUMNS.get(sheet_name, (None, 'Sales'))[1]
+                amount = f"TOTAL({_quote(amount_column)})"
+                cost, revenue = ('0.0', amount) if sheet_name == 'REVENUE_Sales' else (amount, '0.0')
+                if 'Crop_Season_ID' in columns:
+                    crop_season, group_by = 'Crop_Season_ID', ' GROUP BY Crop_Season_ID'
+                else:
+                    crop_season, group_by = 'NULL', ''
+                selects.append(
+                    f"SELECT {crop_season} AS Crop_Season_ID, ? AS Category, {cost} AS Cost, "
+                    f"{revenue} AS Revenue FROM {_quote(sheet_name)}{group_by}"
+                )
+                categories.append(category)
+            if not selects:
+                return pd.DataFrame(columns=['Crop_Season_ID', 'Category', 'Cost', 'Revenue'])
+            
+            cube = pd.read_sql_query(' UNION ALL '.join(selects), self._connection, params=categories)
+            span['rows'] = len(cube)
+        return cube
+
+    def close(self):
+        """Close the connection; the database file is kept for the next load of the same workbook"""
+        with self._lock:
+            self._connection.close()
+
+    def row_count(self):
+        """Rows stored across every sheet's table"""
+        with self._lock:
+            return sum(self._connection.execute(f'SELECT COUNT(*) FROM {_quote(table)}').fetchone()[0] for table in self._tables())
+
+def _fact_amount_columns():
+    """Fact sheet -> the column summed for its totals: every cost sheet, then sales"""
+    return {**{sheet_name: total_column for sheet_name, total_column, _, _ in COST_SHEETS}, 'REVENUE_Sales': 'Gross_Revenue'}
+
+def _quote(name):
+    """Quote a sheet or column name as an SQL identifier"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _sql_value(value):
+    """Store a normalized cell the way to_sql stores imported ones"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime(SQL_TIMESTAMP_FORMAT)
+    return value.item() if isinstance(value, np.generic) else value
+
+# ====================
+# CLASS: DIMENSION INDEX
+# ====================
+# Dimension -> master sheet and the key column its surrogate codes are assigned from
+DIMENSION_SHEETS = {
+    'farm': ('MASTER_Farm_Profile', 'Farm_ID'),
+    'season': ('MASTER_Season', 'Season_ID'),
+    'crop': ('MASTER_Crops', 'Crop_ID'),
+    'crop_season': ('Crop_Season_Master', 'Crop_Season_ID'),
+}
+
+class Dimension:
+    """One master sheet as an indexed lookup table: row i of the table describes surrogate code i
+
+    Built once per workbook. Facts are coded against a dimension once, and every
+    label or foreign key after that is an array take rather than a merge. Rows
+    entered into other sheets leave it valid.
+    """
+
+    def __init__(self, sheet_name, table, key_column):
+        self.sheet_name = sheet_name
+        if key_column in table:
+            table = table[table[key_column].notna()].drop_duplicates(key_column)
+        else:
+            table = table.iloc[:0].assign(**{key_column: pd.Series(dtype=object)})
+        self.table = table.reset_index(drop=True)
+        keys = self.table[key_column]
+        self.keys = pd.Index(keys.cat.categories.take(keys.cat.codes) if isinstance(keys.dtype, pd.CategoricalDtype) else keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return int(self.table.memory_usage(deep=True).sum()) + self.keys.memory_usage(deep=True)
+
+    def codes(self, values):
+        """Surrogate codes of key values, -1 where a value is not in the dimension"""
+        if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+            # Code the distinct values once and spread them over the rows; code -1 (missing) stays -1
+            category_codes = np.append(self.keys.get_indexer(values.cat.categories), -1)
+            return category_codes[values.cat.codes.to_numpy()].astype(np.int32)
+        return self.keys.get_indexer(values).astype(np.int32)
+
+    def take(self, column, codes):
+        """A column's value for each code, missing for code -1 or a column the sheet lacks"""
+        if column not in self.table:
+            return np.full(len(codes), np.nan)
+        return pd.api.extensions.take(self.table[column].array, codes, allow_fill=True)
+
+    def lookup(self, column, values):
+        """Resolve key values to one of the dimension's columns"""
+        return self.take(column, self.codes(values))
+
+    def apply_row_change(self, sheet_name, old_row, new_row):
+        return sheet_name != self.sheet_name
+
+def build_dimension(excel_data, name):
+    """Code the rows of one dimension's master sheet; a missing sheet gives an empty dimension"""
+    sheet_name, key_column = DIMENSION_SHEETS[name]
+    table = excel_data[sheet_name] if sheet_name in excel_data else pd.DataFrame(columns=[key_column])
+    return Dimension(sheet_name, table, key_column)
+
+def get_dimension(excel_data, name):
+    """Return one of the workbook's dimensions, building it on first use"""
+    return workbook_aggregate(excel_data, f"dimension:{name}", lambda data: build_dimension(data, name))
+
+# ====================
+# COST LEDGER ENGINE
+# ====================
+# Production phases in crop calendar order
+COST_PHASES = ('PRE_PROD', 'PROD', 'POST_PROD')
+
+# Cost sheet registry: each sheet, the column holding its rows' totals, the category
+# they roll up to and the production phase it belongs to. The ledger, cube, running
+# totals, SQL storage and pages all read this list, and every sheet in it is summed
+# in the same single pass, so a new cost sheet is one line here.
+COST_SHEETS = [
+    ('PRE_PROD_Land_Preparation', 'Total_Cost', 'Land Preparation', 'PRE_PROD'),
+    ('PRE_PROD_Seed_Costs', 'Total_Seed_Cost', 'Seeds', 'PRE_PROD'),
+    ('PRE_PROD_Organic_Manure', 'Total_Manure_Cost', 'Manure', 'PRE_PROD'),
+    ('PROD_Fertilizer_Application', 'Total_Fertilizer_Cost', 'Fertilizers', 'PROD'),
+    ('PROD_Irrigation_Costs', 'Total_Irrigation_Cost', 'Irrigation', 'PROD'),
+]
+
+COST_SHEET_COLUMNS = {sheet_name: (total_column, category) for sheet_name, total_column, category, _ in COST_SHEETS}
+COST_CATEGORY_PHASES = {category: phase for _, _, category, phase in COST_SHEETS}
+
+# A registered sheet without its own schema still gets its key, date and total typed
+SHEET_SCHEMA.update({
+    sheet_name: {'Crop_Season_ID': 'id', 'Date': 'date', total_column: 'number', 'Payment_Status': 'category'}
+    for sheet_name, total_column, _, _ in COST_SHEETS
+    if sheet_name not in SHEET_SCHEMA
+})
+
+# Dimensions of the aggregation cube, finest first; Crop_Season_ID determines the rest
+CUBE_DIMENSIONS = ['Crop_Season_ID', 'Farm_ID', 'Season_ID', 'Crop_ID', 'Category', 'Month']
+
+def _to_number(value):
+    """Read a single cell as a float, treating blanks and text as zero like the sheet totals do"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if pd.isna(number) else number
+
+def read_sheet_columns(excel_data, sheet_name, columns):
+    """Return just the given columns of a sheet, streaming only those when the workbook is lazy"""
+    if hasattr(excel_data, 'read_columns'):
+        return excel_data.read_columns(sheet_name, columns)
+    sheet = excel_data[sheet_name]
+    return sheet[[column for column in columns if column in sheet]]
+
+def _fact_rows(sheet, amount_column, date_column, category):
+    """Project one fact sheet onto the Crop_Season_ID, Category, Date and Amount columns"""
+    return pd.DataFrame({
+        'Crop_Season_ID': sheet['Crop_Season_ID'] if 'Crop_Season_ID' in sheet else None,
+        'Category': category,
+        'Date': _normalize_column(sheet[date_column], 'date') if date_column in sheet else pd.NaT,
+        'Amount': pd.to_numeric(sheet[amount_column], errors='coerce').fillna(0)
+    })
+
+def build_cost_ledger(excel_data):
+    """Stack every cost sheet into one long ledger of Crop_Season_ID, Category, Date and Amount"""
+    frames = [
+        _fact_rows(
+            read_sheet_columns(excel_data, sheet_name, ['Crop_Season_ID', 'Date', total_column]),
+            total_column, 'Date', category
+        )
+        for sheet_name, total_column, category, _ in COST_SHEETS
+        if sheet_name in excel_data
+    ]
+    
+    if not frames:
+        return pd.DataFrame({
+            'Crop_Season_ID': pd.Series(dtype=object),
+            'Category': pd.Series(dtype=object),
+            'Date': pd.Series(dtype='datetime64[ns]'),
+            'Amount': pd.Series(dtype=float)
+        })
+    return pd.concat(frames, ignore_index=True)
+
+def _cost_and_sales_facts(excel_data):
+    """Every cost and sale row as Crop_Season_ID, Category, Date, Amount, Cost and Revenue"""
+    ledger = build_cost_ledger(excel_data)
+    facts = [ledger.assign(Cost=ledger['Amount'], Revenue=0.0)]
+    if 'REVENUE_Sales' in excel_data:
+        sales = _fact_rows(
+            read_sheet_columns(excel_data, 'REVENUE_Sales', ['Crop_Season_ID', 'Sale_Date', 'Gross_Revenue']),
+            'Gross_Revenue', 'Sale_Date', 'Sales'
+        )
+        facts.append(sales.assign(Cost=0.0, Revenue=sales['Amount']))
+    return pd.concat(facts, ignore_index=True)
+
+def build_aggregation_cube(excel_data):
+    """Roll every cost and sale row up to Crop_Season x Farm x Season x Crop x Category x Month"""
+    facts = _cost_and_sales_facts(excel_data)
+    facts['Month'] = facts['Date'].dt.to_period('M')
+    
+    # Code each fact row's crop season once; its farm, season and crop are then array takes
+    crop_seasons = get_dimension(excel_data, 'crop_season')
+    codes = crop_seasons.codes(facts['Crop_Season_ID'])
+    for column in CUBE_DIMENSIONS[1:4]:
+        facts[column] = crop_seasons.take(column, codes)
+    
+    # Keep rows with unknown keys so roll-ups still add up to the sheet totals
+    return facts.groupby(CUBE_DIMENSIONS, dropna=False, sort=False, observed=True)[['Cost', 'Revenue']].sum().reset_index()
+
+def aggregate_nbytes(result):
+    """Memory held by an aggregate: a table's deep memory, or what an aggregate class reports as its nbytes"""
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    return int(getattr(result, 'nbytes', 0))
+
+def workbook_aggregate(excel_data, name, builder):
+    """Build an aggregate once per loaded workbook; plain dicts are recomputed on every call
+
+    The build holds only the aggregate's own build lock, so a page and a background
+    warm-up asking for the same aggregate share one build while other aggregates
+    and sheet reads go on. A result is stored only if no row was entered while it
+    was being built; otherwise it is returned as built and the next caller builds
+    it again. The sheets read while building are kept with it, so a re-upload
+    knows which aggregates are still valid.
+    """
+    derived = getattr(excel_data, 'derived', None)
+    if derived is None:
+        return builder(excel_data)
+    with excel_data.build_lock(('aggregate', name)):
+        with excel_data.lock:
+            built = name in derived
+            result = derived.get(name)
+            sheets = excel_data.derived_sheets.get(name, ())
+        if not built:
+            version = excel_data.entry_version
+            with timed_span(f"aggregate {name}") as span, tracking_sheet_reads() as sheets:
+                result = builder(excel_data)
+                if isinstance(result, pd.DataFrame):
+                    span['rows'] = len(result)
+                nbytes = span['bytes'] = aggregate_nbytes(result)
+            with excel_data.lock:
+                if excel_data.entry_version == version:
+                    derived[name] = result
+                    excel_data.derived_sheets[name] = sheets
+                    excel_data.derived_nbytes[name] = nbytes
+    # An aggregate built from this one depends on the same sheets
+    record_sheet_reads(sheets)
+    return result.copy(deep=False) if isinstance(result, pd.DataFrame) else result
+
+def get_aggregation_cube(excel_data):
+    """Return the workbook's aggregation cube, building it on first use"""
+    return workbook_aggregate(excel_data, 'cube', build_aggregation_cube)
+
+# ====================
+# CLASS: CASH FLOW LEDGER
+# ====================
+# Resampling rule of each cash flow frequency: calendar months, and weeks starting on Monday
+CASH_FLOW_FREQUENCIES = {'Monthly': 'MS', 'Weekly': 'W-MON'}
+
+def _day_after(date):
+    """Midnight after a date, the exclusive end of an inclusive range ending on it"""
+    return (pd.Timestamp(date).normalize() + pd.Timedelta(days=1)).to_datetime64()
+
+class CashFlowLedger:
+    """Every dated cost and sale row of a workbook in date order, for cash flow over time
+
+    Built once per workbook with the dates parsed and the rows sorted, so a date
+    range is two binary searches and a slice instead of a filter over every row.
+    Each row also carries its crop season's working capital, the cash put in and
+    not yet got back, as of that row. Rows without a date are only counted.
+    """
+
+    def __init__(self, facts):
+        dated = facts['Date'].notna()
+        self.undated_rows = int((~dated).sum())
+        frame = facts[dated].sort_values('Date', kind='stable', ignore_index=True)
+        frame['Net'] = frame['Inflow'] - frame['Outflow']
+        frame['Working_Capital'] = -frame.groupby('Crop_Season_ID', dropna=False, observed=True)['Net'].cumsum()
+        self.frame = frame
+        self.dates = pd.DatetimeIndex(frame['Date'])
+        # Crop season -> its row positions, which are in date order like the rows themselves
+        self.crop_season_rows = {
+            crop_season_id: positions
+            for crop_season_id, positions in frame.groupby('Crop_Season_ID', observed=True).indices.items()
+        }
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def nbytes(self):
+        """Memory of the sorted rows, their dates and the crop season row positions"""
+        positions = sum(rows.nbytes for rows in self.crop_season_rows.values())
+        return int(self.frame.memory_usage(deep=True).sum()) + self.dates.nbytes + positions
+
+    def span(self, start=None, end=None):
+        """First and past-the-last row position of an inclusive range of dates"""
+        first = 0 if start is None else int(self.dates.searchsorted(pd.Timestamp(start), side='left'))
+        last = len(self.dates) if end is None else int(self.dates.searchsorted(_day_after(end), side='left'))
+        return first, max(first, last)
+
+    def rows(self, start=None, end=None):
+        """Rows dated within an inclusive range, as a slice of the sorted ledger"""
+        first, last = self.span(start, end)
+        return self.frame.iloc[first:last]
+
+    def flows(self, frequency='Monthly', start=None, end=None):
+        """Outflow, inflow, net and cumulative net cash per period; periods without rows are zero"""
+        rows = self.rows(start, end)
+        flows = rows.resample(CASH_FLOW_FREQUENCIES[frequency], on='Date', closed='left', label='left')[
+            ['Outflow', 'Inflow', 'Net']
+        ].sum()
+        flows['Cumulative_Net'] = flows['Net'].cumsum()
+        return flows.rename_axis('Period').reset_index()
+
+    def working_capital(self, as_of=None):
+        """Each crop season's working capital after its last row up to a date"""
+        _, last = self.span(end=as_of)
+        latest = self.frame.iloc[:last].drop_duplicates('Crop_Season_ID', keep='last')
+        return latest[['Crop_Season_ID', 'Season_ID', 'Date', 'Working_Capital']].reset_index(drop=True)
+
+    def crop_season_history(self, crop_season_id, start=None, end=None):
+        """One crop season's rows within a date range, with its working capital after each"""
+        positions = self.crop_season_rows.get(crop_season_id, np.array([], dtype=np.intp))
+        dates = self.dates[positions]
+        first = 0 if start is None else dates.searchsorted(pd.Timestamp(start), side='left')
+        last = len(dates) if end is None else dates.searchsorted(_day_after(end), side='left')
+        return self.frame.iloc[positions[first:last]]
+
+    def season_to_date(self, as_of=None, by='Season_ID'):
+        """Cost, revenue and profit of every season, or crop season, from its first row up to a date"""
+        totals = self.rows(end=as_of).groupby(by, observed=True, sort=False)[['Outflow', 'Inflow']].sum()
+        totals = totals.rename(columns={'Outflow': 'Cost', 'Inflow': 'Revenue'})
+        totals['Profit'] = totals['Revenue'] - totals['Cost']
+        return totals.reset_index()
+
+def build_cash_flow_ledger(excel_data):
+    """Sort every dated cost and sale row once, labelled with its season"""
+    facts = _cost_and_sales_facts(excel_data)
+    facts = facts.drop(columns='Amount').rename(columns={'Cost': 'Outflow', 'Revenue': 'Inflow'})
+    crop_seasons = get_dimension(excel_data, 'crop_season')
+    facts['Season_ID'] = crop_seasons.take('Season_ID', crop_seasons.codes(facts['Crop_Season_ID']))
+    return CashFlowLedger(facts)
+
+def get_cash_flow_ledger(excel_data):
+    """Return the workbook's cash flow ledger, building it on first use"""
+    return workbook_aggregate(excel_data, 'cash_flow', build_cash_flow_ledger)
+
+# ====================
+# CLASS: DUES INDEX
+# ====================
+# Payment statuses that leave a cost row open. Cost sheets record no amount paid,
+# so a partly paid row is listed at its whole total.
+OPEN_PAYMENT_STATUSES = ('Pending', 'Partial')
+
+DUE_KINDS = ('Payable', 'Receivable')
+
+# Text columns of the dues items, stored as categoricals
+DUE_TEXT_COLUMNS = ['Kind', 'Record_ID', 'Crop_Season_ID', 'Counterparty', 'Status']
+
+# Age buckets of open items as (most days old, label); the last one has no limit
+DUE_AGE_BUCKETS = [(30, '0-30 days'), (60, '31-60 days'), (90, '61-90 days'), (None, 'Over 90 days')]
+
+class DuesIndex:
+    """Open payables and receivables of a workbook, indexed for "as of date X" questions
+
+    Built once per workbook. The items of each kind are sorted by date with a
+    running total, so the amount open as of a date, overall or per age bucket, is
+    a binary search and a subtraction rather than a scan. Counterparties and crop
+    seasons are coded once and keep their item positions, so per-group totals are
+    one bincount over the items up to the date. Items without a date are only counted.
+    """
+
+    def __init__(self, items):
+        self.undated_items = int(items['Date'].isna().sum())
+        self.items, self._dates, self._amounts, self._running, self._groups = {}, {}, {}, {}, {}
+        for kind in DUE_KINDS:
+            frame = items[(items['Kind'] == kind) & items['Date'].notna()]
+            frame = frame.sort_values('Date', kind='stable', ignore_index=True)
+            # Drop the other kind's categories, so each kind only holds labels of its own items
+            frame = frame.assign(**{
+                column: frame[column].cat.remove_unused_categories()
+                for column in frame if isinstance(frame[column].dtype, pd.CategoricalDtype)
+            })
+            self.items[kind] = frame
+            self._dates[kind] = frame['Date'].to_numpy()
+            self._amounts[kind] = frame['Amount'].to_numpy(dtype=float)
+            self._running[kind] = np.concatenate([[0.0], self._amounts[kind].cumsum()])
+            # Column -> (group code of each item, -1 when blank; group keys; key -> item positions)
+            self._groups[kind] = {}
+            for column in ('Counterparty', 'Crop_Season_ID'):
+                labels = frame[column].astype('category')
+                positions = {key: rows.astype(np.int32) for key, rows in frame.groupby(labels, observed=True).indices.items()}
+                self._groups[kind][column] = (labels.cat.codes.to_numpy(), labels.cat.categories, positions)
+        dated = items['Date'].dropna()
+        self.last_date = dated.max() if len(dated) else None
+
+    @property
+    def nbytes(self):
+        """Memory of the items of both kinds and the arrays indexing them"""
+        nbytes = 0
+        for kind in DUE_KINDS:
+            nbytes += int(self.items[kind].memory_usage(deep=True).sum())
+            nbytes += self._dates[kind].nbytes + self._amounts[kind].nbytes + self._running[kind].nbytes
+            for codes, keys, positions in self._groups[kind].values():
+                nbytes += codes.nbytes + keys.memory_usage(deep=True) + sum(rows.nbytes for rows in positions.values())
+        return nbytes
+
+    def _reference_date(self, as_of):
+        """The day ages are counted to: the given date, else the latest item's, else today"""
+        for date in (as_of, self.last_date):
+            if date is not None:
+                return pd.Timestamp(date).normalize()
+        return pd.Timestamp.now().normalize()
+
+    def _end(self, kind, as_of):
+        """Number of items of a kind dated on or before a date"""
+        dates = self._dates[kind]
+        return len(dates) if as_of is None else int(np.searchsorted(dates, _day_after(as_of), side='left'))
+
+    def total(self, kind, as_of=None):
+        """Amount of a kind open as of a date"""
+        return float(self._running[kind][self._end(kind, as_of)])
+
+    def aging(self, as_of=None):
+        """Amount open per age bucket as of a date (default: the latest item), one column per kind"""
+        as_of = self._reference_date(as_of)
+        aging = {'Age': [label for _, label in DUE_AGE_BUCKETS]}
+        for kind in DUE_KINDS:
+            dates, running = self._dates[kind], self._running[kind]
+            upper, amounts = self._end(kind, as_of), []
+            for most_days, _ in DUE_AGE_BUCKETS:
+                lower = 0 if most_days is None else min(
+                    int(np.searchsorted(dates, (as_of - pd.Timedelta(days=most_days)).to_datetime64(), side='left')), upper
+                )
+                amounts.append(float(running[upper] - running[lower]))
+                upper = lower
+            aging[kind] = amounts
+        return pd.DataFrame(aging)
+
+    def by(self, kind, column, as_of=None):
+        """Open items and amount per counterparty or crop season as of a date, largest first"""
+        codes, keys, _ = self._groups[kind][column]
+        end = self._end(kind, as_of)
+        codes, amounts = codes[:end], self._amounts[kind][:end]
+        known = codes >= 0
+        counts = np.bincount(codes[known], minlength=len(keys))
+        totals = pd.DataFrame({
+            column: np.asarray(keys, dtype=object),
+            'Items': counts,
+            'Amount': np.bincount(codes[known], weights=amounts[known], minlength=len(keys))
+        })[counts > 0]
+        return totals.sort_values('Amount', ascending=False, kind='stable', ignore_index=True)
+
+    def open_items(self, kind, as_of=None, counterparty=None, crop_season_id=None):
+        """Items of a kind open as of a date, oldest first, with their age in days and age bucket"""
+        dates = self._dates[kind]
+        end = self._end(kind, as_of)
+        positions = np.arange(end)
+        for column, key in (('Counterparty', counterparty), ('Crop_Season_ID', crop_season_id)):
+            if key is not None:
+                group = self._groups[kind][column][2].get(key, np.array([], dtype=np.intp))
+                positions = np.intersect1d(positions, group[group < end], assume_unique=True)
+        
+        items = self.items[kind].iloc[positions]
+        as_of = self._reference_date(as_of)
+        ages = (as_of - pd.DatetimeIndex(dates[positions]).normalize()).days
+        limits = [-np.inf] + [most_days for most_days, _ in DUE_AGE_BUCKETS[:-1]] + [np.inf]
+        return items.assign(
+            Age_Days=np.asarray(ages),
+            Age_Bucket=pd.cut(ages, limits, labels=[label for _, label in DUE_AGE_BUCKETS])
+        ).reset_index(drop=True)
+
+def _record_id_column(sheet_name):
+    """A sheet's own record ID column, the first identifier in its schema other than Crop_Season_ID"""
+    return next((
+        column for column, kind in SHEET_SCHEMA.get(sheet_name, {}).items()
+        if kind == 'id' and column != 'Crop_Season_ID'
+    ), None)
+
+def _due_items(sheet, kind, record_id_column, date_column, counterparty, status, amount):
+    """Project open rows of one sheet onto the columns of the dues index"""
+    return pd.DataFrame({
+        'Kind': kind,
+        'Record_ID': sheet[record_id_column].astype(object) if record_id_column in sheet else None,
+        'Crop_Season_ID': sheet['Crop_Season_ID'].astype(object) if 'Crop_Season_ID' in sheet else None,
+        'Counterparty': counterparty,
+        'Date': _normalize_column(sheet[date_column], 'date') if date_column in sheet else pd.NaT,
+        'Status': status,
+        'Amount': amount
+    }, index=sheet.index)
+
+def build_dues_index(excel_data):
+    """Collect pending and partly paid cost rows as payables and sales with money outstanding as receivables
+
+    Cost sheets name no payee, so payables are grouped by cost category; receivables
+    are grouped by buyer.
+    """
+    frames = []
+    for sheet_name, total_column, category, _ in COST_SHEETS:
+        if sheet_name not in excel_data:
+            continue
+        id_column = _record_id_column(sheet_name)
+        columns = [column for column in (id_column, 'Crop_Season_ID', 'Date', total_column, 'Payment_Status') if column]
+        sheet = read_sheet_columns(excel_data, sheet_name, columns)
+        if 'Payment_Status' not in sheet or total_column not in sheet:
+            continue
+        sheet = sheet[sheet['Payment_Status'].isin(OPEN_PAYMENT_STATUSES)]
+        frames.append(_due_items(sheet, 'Payable', id_column, 'Date', category, sheet['Payment_Status'].astype(object),
+                                 pd.to_numeric(sheet[total_column], errors='coerce').fillna(0)))
+    
+    if 'REVENUE_Sales' in excel_data:
+        columns = ['Sale_ID', 'Crop_Season_ID', 'Sale_Date', 'Buyer_Name', 'Payment_Received', 'Outstanding']
+        sales = read_sheet_columns(excel_data, 'REVENUE_Sales', columns)
+        if 'Outstanding' in sales:
+            outstanding = pd.to_numeric(sales['Outstanding'], errors='coerce').fillna(0)
+            sales, outstanding = sales[outstanding > 0], outstanding[outstanding > 0]
+            received = (pd.to_numeric(sales['Payment_Received'], errors='coerce').fillna(0)
+                        if 'Payment_Received' in sales else pd.Series(0.0, index=sales.index))
+            status = np.where(received > 0, 'Partial', 'Pending')
+            buyers = sales['Buyer_Name'].astype(object).fillna('Unknown buyer') if 'Buyer_Name' in sales else 'Unknown buyer'
+            frames.append(_due_items(sales, 'Receivable', 'Sale_ID', 'Sale_Date', buyers, status, outstanding))
+    
+    columns = ['Kind', 'Record_ID', 'Crop_Season_ID', 'Counterparty', 'Date', 'Status', 'Amount']
+    items = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({
+        column: pd.Series(dtype='datetime64[ns]' if column == 'Date' else float if column == 'Amount' else object)
+        for column in columns
+    })
+    crop_seasons = get_dimension(excel_data, 'crop_season')
+    items['Farm_ID'] = crop_seasons.take('Farm_ID', crop_seasons.codes(items['Crop_Season_ID']))
+    # Text columns are held as category codes; even unique record IDs then share one compact string index
+    return DuesIndex(items.astype({column: 'category' for column in DUE_TEXT_COLUMNS}))
+
+def get_dues_index(excel_data):
+    """Return the workbook's dues index, building it on first use"""
+    return workbook_aggregate(excel_data, 'dues', build_dues_index)
+
+# ====================
+# CLASS: RUNNING TOTALS
+# ====================
+def _with_added(totals, key, amount):
+    """A copy of a totals dict with an amount added to one key"""
+    return {**totals, key: totals.get(key, 0.0) + amount}
+
+class RunningTotals:
+    """Cost and revenue totals by crop season, season, cost category and phase, kept current row by row
+
+    Seeded once from the aggregation cube; after that an entered, edited or deleted
+    row only adds or subtracts its own amount, so data entry never re-sums a sheet.
+    """
+
+    def __init__(self, season_of):
+        self.season_of = season_of  # Crop_Season_ID -> Season_ID
+        self.total_cost = 0.0
+        self.total_revenue = 0.0
+        self.cost_by_category = {}
+        self.cost_by_crop_season = {}
+        self.revenue_by_crop_season = {}
+        self.cost_by_season = {}
+        self.revenue_by_season = {}
+
+    @classmethod
+    def from_cube(cls, cube, season_of):
+        totals = cls(season_of)
+        totals.total_cost = float(cube['Cost'].sum())
+        totals.total_revenue = float(cube['Revenue'].sum())
+        totals.cost_by_category = cube.groupby('Category', observed=True)['Cost'].sum().to_dict()
+        by_crop_season = cube.groupby('Crop_Season_ID', observed=True)[['Cost', 'Revenue']].sum()
+        totals.cost_by_crop_season = by_crop_season['Cost'].to_dict()
+        totals.revenue_by_crop_season = by_crop_season['Revenue'].to_dict()
+        by_season = cube.groupby('Season_ID', observed=True)[['Cost', 'Revenue']].sum()
+        totals.cost_by_season = by_season['Cost'].to_dict()
+        totals.revenue_by_season = by_season['Revenue'].to_dict()
+        return totals
+
+    def apply_row_change(self, sheet_name, old_row, new_row):
+        """Move the totals by one row's change; returns False when they must be rebuilt instead"""
+        if sheet_name == 'Crop_Season_Master':
+            return False
+        
+        if sheet_name in COST_SHEET_COLUMNS:
+            amount_column, category = COST_SHEET_COLUMNS[sheet_name]
+        elif sheet_name == 'REVENUE_Sales':
+            amount_column, category = 'Gross_Revenue', None
+        else:
+            return True
+        
+        for row, sign in ((old_row, -1), (new_row, 1)):
+            if row is not None:
+                self._add(row.get('Crop_Season_ID'), category, sign * _to_number(row.get(amount_column)))
+        return True
+
+    def _add(self, crop_season_id, category, amount):
+        # Other sessions may be iterating the totals dicts, so each change swaps in a new dict
+        if category is None:
+            self.total_revenue += amount
+            by_crop_season, by_season = 'revenue_by_crop_season', 'revenue_by_season'
+        else:
+            self.total_cost += amount
+            self.cost_by_category = _with_added(self.cost_by_category, category, amount)
+            by_crop_season, by_season = 'cost_by_crop_season', 'cost_by_season'
+        
+        if crop_season_id is None or pd.isna(crop_season_id):
+            return
+        setattr(self, by_crop_season, _with_added(getattr(self, by_crop_season), crop_season_id, amount))
+        season_id = self.season_of.get(crop_season_id)
+        if season_id is not None:
+            setattr(self, by_season, _with_added(getattr(self, by_season), season_id, amount))
+
+    @property
+    def cost_by_phase(self):
+        """Cost per production phase in crop calendar order, from the category totals"""
+        by_phase = dict.fromkeys(COST_PHASES, 0.0)
+        for category, amount in self.cost_by_category.items():
+            phase = COST_CATEGORY_PHASES.get(category)
+            if phase is not None:
+                by_phase[phase] = by_phase.get(phase, 0.0) + amount
+        return by_phase
+
+def build_running_totals(excel_data):
+    """Seed the running totals from a full roll-up of the aggregation cube, or of the workbook's database"""
+    crop_seasons = get_dimension(excel_data, 'crop_season')
+    season_ids = pd.Series(crop_seasons.take('Season_ID', np.arange(len(crop_seasons))), index=crop_seasons.keys)
+    season_of = season_ids.dropna().to_dict()
+    
+    # With an attached database the sheets are summed by indexed SQL instead of in memory
+    database = getattr(excel_data, 'database', None)
+    if database is None:
+        return RunningTotals.from_cube(get_aggregation_cube(excel_data), season_of)
+    cube = database.totals_cube()
+    cube['Season_ID'] = cube['Crop_Season_ID'].map(season_of)
+    return RunningTotals.from_cube(cube, season_of)
+
+def get_running_totals(excel_data):
+    """Return the workbook's running totals, seeding them on first use"""
+    return workbook_aggregate(excel_data, 'running_totals', build_running_totals)
+
+def compute_crop_season_pnl(excel_data):
+    """Compute cost, revenue, profit, ROI and per-acre figures for every crop season in one pass"""
+    totals = get_running_totals(excel_data)
+    pnl = excel_data.get('Crop_Season_Master', pd.DataFrame(columns=['Crop_Season_ID'])).copy()
+    
+    # Attach crop and season labels by taking from the coded dimensions
+    if 'MASTER_Crops' in excel_data and 'Crop_ID' in pnl:
+        crops = get_dimension(excel_data, 'crop')
+        crop_codes = crops.codes(pnl['Crop_ID'])
+        for column in ('Crop_Name', 'Category'):
+            pnl[column] = crops.take(column, crop_codes)
+    if 'MASTER_Season' in excel_data and 'Season_ID' in pnl:
+        pnl['Season_Name'] = get_dimension(excel_data, 'season').lookup('Season_Name', pnl['Season_ID'])
+    pnl['Crop_Name'] = pnl['Crop_Name'].fillna('Unknown') if 'Crop_Name' in pnl else 'Unknown'
+    
+    yields = pd.Series(dtype=float)
+    if 'POST_PROD_Yield_Record' in excel_data:
+        yield_record = read_sheet_columns(excel_data, 'POST_PROD_Yield_Record', ['Crop_Season_ID', 'Yield_Per_Acre'])
+        yield_record = yield_record.drop_duplicates('Crop_Season_ID')
+        yields = yield_record.set_index('Crop_Season_ID')['Yield_Per_Acre']
+    
+    area = pd.to_numeric(pnl['Area_Acres'], errors='coerce') if 'Area_Acres' in pnl else pd.Series(0.0, index=pnl.index)
+    pnl['Area_Acres'] = area
+    area = area.fillna(0)
+    pnl['Total_Cost'] = pnl['Crop_Season_ID'].map(totals.cost_by_crop_season).fillna(0)
+    pnl['Total_Revenue'] = pnl['Crop_Season_ID'].map(totals.revenue_by_crop_season).fillna(0)
+    pnl['Profit'] = pnl['Total_Revenue'] - pnl['Total_Cost']
+    pnl['ROI'] = (pnl['Profit'] / pnl['Total_Cost'].where(pnl['Total_Cost'] > 0) * 100).fillna(0)
+    pnl['Cost_Per_Acre'] = (pnl['Total_Cost'] / area.where(area > 0)).fillna(0)
+    pnl['Revenue_Per_Acre'] = (pnl['Total_Revenue'] / area.where(area > 0)).fillna(0)
+    pnl['Yield_Per_Acre'] = pd.to_numeric(pnl['Crop_Season_ID'].map(yields), errors='coerce').fillna(0)
+    
+    return pnl
+
+def get_crop_season_pnl(excel_data):
+    """Return the per crop season P&L table, computing it once per workbook"""
+    return workbook_aggregate(excel_data, 'crop_season_pnl', compute_crop_season_pnl)
+
+def compute_season_rollup(excel_data):
+    """One row per season, in order of first appearance, with cost and revenue from the running totals"""
+    pnl = get_crop_season_pnl(excel_data)
+    if 'Season_Name' not in pnl:
+        return pd.DataFrame(columns=['Season', 'Total Area', 'Total Cost', 'Total Revenue', 'Net Profit', 'ROI (%)'])
+    
+    rollup = pnl.groupby('Season_Name', sort=False, observed=True).agg(**{
+        'Total Area': ('Area_Acres', 'sum')
+    }).rename_axis('Season').reset_index()
+    
+    totals = get_running_totals(excel_data)
+    seasons = get_dimension(excel_data, 'season')
+    for column, by_season in (('Total Cost', totals.cost_by_season), ('Total Revenue', totals.revenue_by_season)):
+        amounts = pd.Series(by_season, dtype=float)
+        by_name = amounts.groupby(seasons.lookup('Season_Name', amounts.index)).sum()
+        rollup[column] = rollup['Season'].map(by_name).fillna(0)
+    rollup['Net Profit'] = rollup['Total Revenue'] - rollup['Total Cost']
+    rollup['ROI (%)'] = (rollup['Net Profit'] / rollup['Total Cost'].where(rollup['Total Cost'] > 0) * 100).fillna(0)
+    return rollup
+
+def get_season_rollup(excel_data):
+    """Return the season roll-up table, computing it once per workbook"""
+    return workbook_aggregate(excel_data, 'season_rollup', compute_season_rollup)
+
+# ====================
+# FUNCTION: REPORT ROW SELECTION
+# ====================
+def select_report_rows(sheet, crop_season_ids=None, date_column=None, date_range=None,
+                       payment_statuses=None, sort_by=None, ascending=True):
+    """Positions of a sheet's rows matching the report filters, in display order
+
+    Filters that are empty or name a column the sheet lacks are ignored; date_range
+    is an inclusive (start, end) pair of dates. Only positions are returned, so a
+    page of the result can be taken without copying the filtered rows.
+    """
+    mask = np.ones(len(sheet), dtype=bool)
+    if crop_season_ids and 'Crop_Season_ID' in sheet:
+        mask &= sheet['Crop_Season_ID'].isin(crop_season_ids).to_numpy()
+    if date_range and date_column in sheet:
+        dates = pd.to_datetime(sheet[date_column], errors='coerce')
+        start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)
+        mask &= ((dates >= start) & (dates < end)).to_numpy()
+    if payment_statuses and 'Payment_Status' in sheet:
+        mask &= sheet['Payment_Status'].isin(payment_statuses).to_numpy()
+    positions = np.flatnonzero(mask)
+    
+    if sort_by in sheet:
+        values = sheet[sort_by].iloc[positions].reset_index(drop=True)
+        try:
+            order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index
+        except TypeError:
+            # Columns mixing text and numbers sort by their text
+            order = values.astype(str).sort_values(ascending=ascending, kind='stable').index
+        positions = positions[order.to_numpy()]
+    return positions
+
+def report_filter_values(sheet, date_column=None):
+    """Crop season IDs, (first, last) date or None, and payment statuses a sheet's report can filter on"""
+    crop_season_ids = tuple(sheet['Crop_Season_ID'].dropna().unique()) if 'Crop_Season_ID' in sheet else ()
+    dates = pd.to_datetime(sheet[date_column], errors='coerce').dropna() if date_column in sheet else ()
+    date_bounds = (dates.min().date(), dates.max().date()) if len(dates) else None
+    statuses = tuple(sheet['Payment_Status'].dropna().unique()) if 'Payment_Status' in sheet else ()
+    return crop_season_ids, date_bounds, statuses
+
+def get_report_filter_values(excel_data, sheet_name, date_column=None):
+    """Return a sheet's report filter values, computed once per workbook until rows are entered"""
+    columns = ['Crop_Season_ID', 'Payment_Status'] + ([date_column] if date_column else [])
+    return workbook_aggregate(
+        excel_data, f"report_filters:{sheet_name}:{date_column}",
+        lambda data: report_filter_values(read_sheet_columns(data, sheet_name, columns), date_column)
+    )
+
+# ====================
+# FUNCTION: REPORT EXPORT
+# ====================
+EXPORT_FORMATS = ('.xlsx', '.csv', '.parquet')
+
+# Rows converted and written at a time, which bounds the memory an export needs
+EXPORT_CHUNK_ROWS = 20000
+
+def export_chunks(frame, rows=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Slices of a table, optionally restricted to and ordered by row positions, a chunk at a time"""
+    positions = np.arange(len(frame)) if rows is None else rows
+    for start in range(0, len(positions), chunk_rows):
+        yield frame.iloc[positions[start:start + chunk_rows]]
+    if len(positions) == 0:
+        yield frame.iloc[:0]
+
+def write_report(tables, output, extension, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Stream (name, frame, row positions or None) tables to a path or binary file
+
+    .xlsx gives one worksheet per table, written row by row in xlsxwriter's
+    constant_memory mode; .csv and .parquet give a zip archive with one file per
+    table, written a chunk at a time. Writing then holds about one chunk however
+    many rows are exported. Without xlsxwriter, .xlsx falls back to openpyxl,
+    which builds the whole workbook in memory before saving it.
+    """
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format {extension or '(none)'}; use one of {', '.join(EXPORT_FORMATS)}")
+    if extension == '.parquet' and pa is None:
+        raise ImportError("Parquet export needs pyarrow")
+    
+    with timed_span(f"export {extension}", tables=len(tables)):
+        if extension == '.xlsx':
+            _write_xlsx(tables, output, chunk_rows)
+            return
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, frame, rows in tables:
+                with archive.open(f"{_export_file_name(name)}{extension}", 'w') as member:
+                    if extension == '.csv':
+                        _write_csv(frame, rows, member, chunk_rows)
+                    else:
+                        _write_parquet(frame, rows, member, chunk_rows)
+
+def export_report(tables, extension, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write a report to a temporary file and return it rewound
+
+    Only generating the file is streamed. Whoever reads it decides what is held
+    after that: Streamlit's download button reads it whole and keeps the bytes in
+    its media file manager until the download is served.
+    """
+    output = tempfile.TemporaryFile()
+    write_report(tables, output, extension, chunk_rows)
+    output.seek(0)
+    return output
+
+def _export_file_name(name):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or 'table'
+
+def _write_csv(frame, rows, member, chunk_rows):
+    text = io.TextIOWrapper(member, encoding='utf-8', newline='')
+    for number, chunk in enumerate(export_chunks(frame, rows, chunk_rows)):
+        chunk.to_csv(text, header=number == 0, index=False)
+    text.flush()
+    text.detach()
+
+def _write_parquet(frame, rows, member, chunk_rows):
+    import pyarrow.parquet as parquet
+    writer = None
+    for chunk in export_chunks(frame, rows, chunk_rows):
+        table = pa.Table.from_pandas(chunk, preserve_index=False, schema=writer.schema if writer else None)
+        if writer is None:
+            writer = parquet.ParquetWriter(member, table.schema)
+        writer.write_table(table)
+    writer.close()
+
+def _write_xlsx(tables, output, chunk_rows):
+    if xlsxwriter is None:
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            for name, frame, rows in tables:
+                frame.iloc[rows if rows is not None else slice(None)].to_excel(writer, sheet_name=name[:31], index=False)
+        return
+    
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+    header = workbook.add_format({'bold': True})
+    for name, frame, rows in tables:
+        worksheet = workbook.add_worksheet(name[:31])
+        worksheet.write_row(0, 0, [str(column) for column in frame.columns], header)
+        row_number = 1
+        for chunk in export_chunks(frame, rows, chunk_rows):
+            # Blank cells for missing values; xlsxwriter rejects NaN
+            values = chunk.astype(object).where(chunk.notna(), None)
+            for record in values.itertuples(index=False, name=None):
+                worksheet.write_row(row_number, 0, record)
+                row_number += 1
+    workbook.close()
+
+# ====================
+# FUNCTION: SUMMARY METRICS
+# ====================
+def compute_summary_metrics(excel_data):
+    """Overall cost, revenue, net profit and ROI across every cost and revenue sheet, with cost per phase"""
+    # Totals are kept current by the running aggregates as entries arrive
+    totals = get_running_totals(excel_data)
+    total_cost = totals.total_cost
+    total_revenue = totals.total_revenue
+    
+    # Profit
+    net_profit = total_revenue - total_cost
+    roi = (net_profit / total_cost * 100) if total_cost > 0 else 0
+    
+    return {
+        'total_cost': total_cost,
+        'total_revenue': total_revenue,
+        'net_profit': net_profit,
+        'roi': roi,
+        'cost_by_phase': totals.cost_by_phase
+    }
+
+# ====================
+# FUNCTION: DATA ENTRY ROWS
+# ====================
+def complete_entry_row(sheet_name, row):
+    """Fill in an entered row's computed cost or revenue columns from its inputs"""
+    row = dict(row)
+    value = lambda column: _to_number(row.get(column))
+    
+    if sheet_name == 'PRE_PROD_Land_Preparation':
+        row['Total_Cost'] = value('Quantity') * value('Rate_Per_Unit')
+    elif sheet_name == 'PRE_PROD_Seed_Costs':
+        row['Seed_Cost'] = value('Qty_KG') * value('Rate_Per_KG')
+        row['Total_Seed_Cost'] = row['Seed_Cost'] + value('Treatment_Cost') + value('Biofertilizer_Cost')
+    elif sheet_name == 'PROD_Fertilizer_Application':
+        row['Fertilizer_Cost'] = value('Qty_KG') * value('Rate_Per_KG')
+        row['Total_Fertilizer_Cost'] = row['Fertilizer_Cost'] + value('Labor_Cost')
+    elif sheet_name == 'REVENUE_Sales':
+        row['Gross_Revenue'] = value('Qty_Qtls') * value('Rate_Per_Qtl')
+        row['Outstanding'] = max(row['Gross_Revenue'] - value('Payment_Received'), 0)
+    return row
+
+def build_updated_workbook(excel_data):
+    """Write every sheet, including journaled entries, to a new xlsx in one batch"""
+    output = io.BytesIO()
+    write_report([(sheet_name, excel_data[sheet_name], None) for sheet_name in excel_data], output, '.xlsx')
+    return output.getvalue()
@@ -0,0 +1,79 @@
+import io
+import logging
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roots_engine import WorkbookData, complete_entry_row
+
+# ====================
+# FIXTURES: SAMPLE WORKBOOK
+# ====================
+@pytest.fixture(scope='session')
+def roots_app():
+    """The Streamlit app module; importing it outside `streamlit run` only logs bare mode warnings"""
+    logging.disable(logging.WARNING)
+    try:
+        import app
+    finally:
+        logging.disable(logging.NOTSET)
+    return app
+
+@pytest.fixture(scope='session')
+def sample_bytes(roots_app):
+    """The app's sample template"""
+    return roots_app.create_sample_excel().getvalue()
+
+@pytest.fixture(scope='session')
+def sample_sheets(sample_bytes):
+    """Sheet name -> DataFrame of the sample template, as pandas reads it"""
+    return pd.read_excel(io.BytesIO(sample_bytes), sheet_name=None)
+
+@pytest.fixture
+def sample_workbook(sample_bytes):
+    """A freshly loaded sample workbook with nothing parsed or derived yet"""
+    return WorkbookData(sample_bytes)
+
+# ====================
+# HELPERS: MODIFIED WORKBOOKS
+# ====================
+def copy_sheets(sheets):
+    """Copies of every sheet, to modify without touching the session's sample sheets"""
+    return {name: sheet.copy() for name, sheet in sheets.items()}
+
+def workbook_bytes(sheets):
+    """xlsx bytes of a sheet name -> DataFrame mapping, in the mapping's order"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for sheet_name, sheet in sheets.items():
+            sheet.to_excel(writer, sheet_name=sheet_name, index=False)
+    return output.getvalue()
+
+def load_sheets(sheets):
+    """A freshly loaded workbook of a sheet name -> DataFrame mapping"""
+    return WorkbookData(workbook_bytes(sheets))
+
+# ====================
+# HELPERS: ENTERED ROWS
+# ====================
+# Rows entered by the tests, as the Data Entry forms would submit them; tests override what they check
+LAND_PREP_ENTRY = {
+    'Land_Prep_ID': 'LP007', 'Crop_Season_ID': 'CS001', 'Date': '2025-01-10', 'Operation_Type': 'Ploughing',
+    'Quantity': 2, 'Unit': 'times', 'Rate_Per_Unit': 500, 'Payment_Mode': 'Cash', 'Payment_Status': 'Paid'
+}
+SALE_ENTRY = {
+    'Sale_ID': 'SL007', 'Crop_Season_ID': 'CS002', 'Sale_Date': '2025-05-20', 'Product_Type': 'Main Product',
+    'Qty_Qtls': 10, 'Rate_Per_Qtl': 2000, 'Buyer_Name': 'Mandi', 'Payment_Received': 20000
+}
+
+def land_prep_entry(**values):
+    """A completed land preparation row, 2 x 500 paid in cash unless overridden"""
+    return complete_entry_row('PRE_PROD_Land_Preparation', {**LAND_PREP_ENTRY, **values})
+
+def sale_entry(**values):
+    """A completed sales row, 10 quintals at 2,000 paid in full unless overridden"""
+    return complete_entry_row('REVENUE_Sales', {**SALE_ENTRY, **values})
@@ -0,0 +1,163 @@
+import pandas as pd
+import pytest
+
+from conftest import copy_sheets, load_sheets, sale_entry
+from roots_engine import COST_SHEETS, get_cash_flow_ledger
+
+@pytest.fixture
+def ledger_sheets(sample_sheets):
+    """The sample sheets with one seed cost left undated"""
+    sheets = copy_sheets(sample_sheets)
+    sheets['PRE_PROD_Seed_Costs']['Date'] = sheets['PRE_PROD_Seed_Costs']['Date'].astype(object)
+    sheets['PRE_PROD_Seed_Costs'].loc[0, 'Date'] = None
+    return sheets
+
+@pytest.fixture
+def ledger_workbook(ledger_sheets):
+    return load_sheets(ledger_sheets)
+
+def plain_facts(sheets):
+    """Every cost and sale row as Crop_Season_ID, Date, Outflow and Inflow, straight from the raw sheets"""
+    frames = [
+        pd.DataFrame({
+            'Crop_Season_ID': sheets[sheet_name]['Crop_Season_ID'],
+            'Date': pd.to_datetime(sheets[sheet_name]['Date'], errors='coerce'),
+            'Outflow': pd.to_numeric(sheets[sheet_name][total_column], errors='coerce').astype(float),
+            'Inflow': 0.0
+        })
+        for sheet_name, total_column, _, _ in COST_SHEETS
+    ]
+    sales = sheets['REVENUE_Sales']
+    frames.append(pd.DataFrame({
+        'Crop_Season_ID': sales['Crop_Season_ID'],
+        'Date': pd.to_datetime(sales['Sale_Date'], errors='coerce'),
+        'Outflow': 0.0,
+        'Inflow': pd.to_numeric(sales['Gross_Revenue'], errors='coerce').astype(float)
+    }))
+    return pd.concat(frames, ignore_index=True)
+
+def plain_flows(facts, period, start=None, end=None):
+    """Cash flow per calendar period by a plain groupby, with empty periods in between filled with zero"""
+    dated = facts.dropna(subset=['Date'])
+    if start is not None:
+        dated = dated[dated['Date'] >= pd.Timestamp(start)]
+    if end is not None:
+        dated = dated[dated['Date'] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    sums = dated.groupby(dated['Date'].dt.to_period(period))[['Outflow', 'Inflow']].sum()
+    sums = sums.reindex(pd.period_range(sums.index.min(), sums.index.max(), freq=period), fill_value=0.0)
+    sums['Net'] = sums['Inflow'] - sums['Outflow']
+    sums['Cumulative_Net'] = sums['Net'].cumsum()
+    sums.index = sums.index.start_time
+    return sums
+
+def assert_flows_equal(flows, expected):
+    actual = flows.set_index('Period')[['Outflow', 'Inflow', 'Net', 'Cumulative_Net']]
+    assert list(actual.index) == list(expected.index)
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+# ====================
+# TESTS: FLOWS
+# ====================
+def test_monthly_flows_match_a_plain_groupby(ledger_workbook, ledger_sheets):
+    assert_flows_equal(get_cash_flow_ledger(ledger_workbook).flows('Monthly'), plain_flows(plain_facts(ledger_sheets), 'M'))
+
+def test_weekly_flows_start_on_monday_and_match_a_plain_groupby(ledger_workbook, ledger_sheets):
+    flows = get_cash_flow_ledger(ledger_workbook).flows('Weekly')
+    assert (flows['Period'].dt.dayofweek == 0).all()
+    # Pandas weeks ending on Sunday start on Monday
+    assert_flows_equal(flows, plain_flows(plain_facts(ledger_sheets), 'W-SUN'))
+
+@pytest.mark.parametrize('start, end', [
+    ('2024-07-01', '2024-12-31'),
+    ('2024-06-15', '2024-06-15'),
+    (None, '2024-08-31'),
+    ('2025-01-01', None),
+])
+def test_flows_over_a_date_range_include_both_ends(ledger_workbook, ledger_sheets, start, end):
+    expected = plain_flows(plain_facts(ledger_sheets), 'M', start, end)
+    assert_flows_equal(get_cash_flow_ledger(ledger_workbook).flows('Monthly', start, end), expected)
+
+def test_undated_rows_are_counted_but_not_in_any_period(ledger_workbook, ledger_sheets):
+    ledger = get_cash_flow_ledger(ledger_workbook)
+    facts = plain_facts(ledger_sheets)
+    assert ledger.undated_rows == 1
+    assert len(ledger) == len(facts) - 1
+    flows = ledger.flows()
+    assert flows['Outflow'].sum() == pytest.approx(facts['Outflow'].sum() - ledger_sheets['PRE_PROD_Seed_Costs'].loc[0, 'Total_Seed_Cost'])
+    assert flows['Inflow'].sum() == pytest.approx(facts['Inflow'].sum())
+
+# ====================
+# TESTS: RUNNING BALANCE
+# ====================
+@pytest.mark.parametrize('as_of', ['2024-09-30', '2025-01-31', None])
+def test_working_capital_is_the_net_cash_put_into_each_crop_season(ledger_workbook, ledger_sheets, as_of):
+    facts = plain_facts(ledger_sheets).dropna(subset=['Date'])
+    if as_of is not None:
+        facts = facts[facts['Date'] <= pd.Timestamp(as_of)]
+    expected = (facts['Outflow'] - facts['Inflow']).groupby(facts['Crop_Season_ID']).sum()
+
+    actual = get_cash_flow_ledger(ledger_workbook).working_capital(as_of).set_index('Crop_Season_ID')['Working_Capital']
+    assert actual.to_dict() == pytest.approx(expected.to_dict())
+
+def test_ledger_rows_are_in_date_order_with_a_running_balance_per_crop_season(ledger_workbook):
+    frame = get_cash_flow_ledger(ledger_workbook).frame
+    assert frame['Date'].is_monotonic_increasing
+    for _, rows in frame.groupby('Crop_Season_ID', observed=True):
+        assert rows['Working_Capital'].tolist() == pytest.approx((rows['Outflow'] - rows['Inflow']).cumsum().tolist())
+
+@pytest.mark.parametrize('start, end', [(None, None), ('2024-11-05', '2025-01-31'), ('2024-11-05', '2024-11-05')])
+def test_crop_season_history_carries_its_working_capital_after_each_day(ledger_workbook, ledger_sheets, start, end):
+    facts = plain_facts(ledger_sheets).dropna(subset=['Date'])
+    facts = facts[facts['Crop_Season_ID'] == 'CS002'].sort_values('Date', kind='stable')
+    # Rows of one day may come in another order, so compare the balance at the end of each day
+    expected = (facts['Outflow'] - facts['Inflow']).cumsum().groupby(facts['Date']).last()
+    expected = expected[(expected.index >= pd.Timestamp(start or expected.index.min())) &
+                        (expected.index <= pd.Timestamp(end or expected.index.max()))]
+
+    history = get_cash_flow_ledger(ledger_workbook).crop_season_history('CS002', start, end)
+    assert (history['Crop_Season_ID'] == 'CS002').all()
+    actual = history.groupby('Date')['Working_Capital'].last()
+    assert list(actual.index) == list(expected.index)
+    assert actual.tolist() == pytest.approx(expected.tolist())
+
+def test_crop_season_history_of_an_unknown_crop_season_is_empty(ledger_workbook):
+    assert get_cash_flow_ledger(ledger_workbook).crop_season_history('CS999').empty
+
+def test_season_to_date_matches_a_plain_groupby_by_season(ledger_workbook, ledger_sheets):
+    facts = plain_facts(ledger_sheets).dropna(subset=['Date'])
+    facts = facts[facts['Date'] <= pd.Timestamp('2025-01-31')]
+    season_of = ledger_sheets['Crop_Season_Master'].set_index('Crop_Season_ID')['Season_ID']
+    expected = facts.groupby(facts['Crop_Season_ID'].map(season_of))[['Outflow', 'Inflow']].sum()
+
+    actual = get_cash_flow_ledger(ledger_workbook).season_to_date('2025-01-31').set_index('Season_ID')
+    assert actual['Cost'].to_dict() == pytest.approx(expected['Outflow'].to_dict())
+    assert actual['Revenue'].to_dict() == pytest.approx(expected['Inflow'].to_dict())
+    assert actual['Profit'].to_dict() == pytest.approx((expected['Inflow'] - expected['Outflow']).to_dict())
+
+# ====================
+# TESTS: ENTERED ROWS
+# ====================
+def with_sales(sheets, *rows):
+    sales = pd.concat([sheets['REVENUE_Sales'], pd.DataFrame(list(rows))], ignore_index=True)
+    return {**sheets, 'REVENUE_Sales': sales}
+
+def test_edited_entry_replaces_its_earlier_values(ledger_workbook, ledger_sheets):
+    first = get_cash_flow_ledger(ledger_workbook)
+    sale = sale_entry(Sale_Date='2025-03-04', Product_Type='Straw', Rate_Per_Qtl=400, Payment_Received=4000)
+    ledger_workbook.set_entry('REVENUE_Sales', 'sale', sale)
+    assert_flows_equal(get_cash_flow_ledger(ledger_workbook).flows(), plain_flows(plain_facts(with_sales(ledger_sheets, sale)), 'M'))
+
+    edited = sale_entry(Sale_Date='2024-08-10', Qty_Qtls=3)
+    ledger_workbook.set_entry('REVENUE_Sales', 'sale', edited)
+    ledger = get_cash_flow_ledger(ledger_workbook)
+    assert ledger is not first
+    assert_flows_equal(ledger.flows(), plain_flows(plain_facts(with_sales(ledger_sheets, edited)), 'M'))
+    assert_flows_equal(ledger.flows('Weekly'), plain_flows(plain_facts(with_sales(ledger_sheets, edited)), 'W-SUN'))
+
+def test_entered_row_without_a_date_is_only_counted(ledger_workbook, ledger_sheets):
+    undated = sale_entry(Sale_Date='')
+    ledger_workbook.set_entry('REVENUE_Sales', 'undated', undated)
+
+    ledger = get_cash_flow_ledger(ledger_workbook)
+    assert ledger.undated_rows == 2
+    assert_flows_equal(ledger.flows(), plain_flows(plain_facts(ledger_sheets), 'M'))
@@ -0,0 +1,152 @@
+import pandas as pd
+import pytest
+
+from conftest import copy_sheets, land_prep_entry, load_sheets, sale_entry
+from roots_engine import DUE_KINDS, DUE_TEXT_COLUMNS, WorkbookData, get_dues_index
+
+@pytest.fixture
+def dues_sheets(sample_sheets):
+    """The sample sheets with a few costs left unpaid and two sales not fully paid
+
+    Open payables: IR004 (870, 2024-12-01), LP002 (300, 2025-01-01), partly paid
+    LP004 (800, 2025-01-15) and LP006 without a date. Open receivables: SL003
+    (198,000, nothing received, 2024-12-20) and SL001 (73,000 left, 2025-01-10).
+    """
+    sheets = copy_sheets(sample_sheets)
+    land = sheets['PRE_PROD_Land_Preparation']
+    land['Date'] = land['Date'].astype(object)
+    land.loc[1, ['Date', 'Payment_Status']] = ['2025-01-01', 'Pending']
+    land.loc[3, ['Date', 'Payment_Status']] = ['2025-01-15', 'Partial']
+    land.loc[5, ['Date', 'Payment_Status']] = [None, 'Pending']
+    sheets['PROD_Irrigation_Costs'].loc[3, ['Date', 'Payment_Status']] = ['2024-12-01', 'Pending']
+    sheets['PROD_Fertilizer_Application'].loc[2, 'Payment_Status'] = 'Paid'
+
+    sales = sheets['REVENUE_Sales']
+    sales.loc[0, ['Sale_Date', 'Payment_Received', 'Outstanding']] = ['2025-01-10', 200000, 73000]
+    sales.loc[2, ['Sale_Date', 'Payment_Received', 'Outstanding']] = ['2024-12-20', 0, 198000]
+    return sheets
+
+@pytest.fixture
+def dues_workbook(dues_sheets):
+    return load_sheets(dues_sheets)
+
+# ====================
+# TESTS: PAID AND UNPAID
+# ====================
+def test_only_pending_and_partly_paid_costs_are_payables(dues_workbook):
+    dues = get_dues_index(dues_workbook)
+    items = dues.open_items('Payable')
+    assert items['Record_ID'].tolist() == ['IR004', 'LP002', 'LP004']
+    assert items['Status'].tolist() == ['Pending', 'Pending', 'Partial']
+    assert items['Counterparty'].tolist() == ['Irrigation', 'Land Preparation', 'Land Preparation']
+    # A partly paid cost is due at its whole total
+    assert items['Amount'].tolist() == [870, 300, 800]
+    assert dues.undated_items == 1
+
+def test_only_sales_with_money_outstanding_are_receivables(dues_workbook, dues_sheets):
+    items = get_dues_index(dues_workbook).open_items('Receivable')
+    assert items['Record_ID'].tolist() == ['SL003', 'SL001']
+    assert items['Status'].tolist() == ['Pending', 'Partial']
+    assert items['Amount'].tolist() == [198000, 73000]
+    assert items['Counterparty'].tolist() == dues_sheets['REVENUE_Sales'].loc[[2, 0], 'Buyer_Name'].tolist()
+    assert (items['Farm_ID'] == 'F001').all()
+
+def test_paid_rows_are_left_out(sample_bytes):
+    dues = get_dues_index(WorkbookData(sample_bytes))
+    # The sample leaves one irrigation and one fertilizer bill pending and every sale paid in full
+    assert dues.open_items('Payable')['Record_ID'].tolist() == ['IR004', 'FR003']
+    assert dues.total('Receivable') == 0
+
+# ====================
+# TESTS: BOUNDARY DATES
+# ====================
+@pytest.mark.parametrize('as_of, payable, receivable', [
+    ('2024-11-30', 0, 0),
+    ('2024-12-01', 870, 0),
+    ('2024-12-31', 870, 198000),
+    ('2025-01-01', 1170, 198000),
+    ('2025-01-14', 1170, 271000),
+    ('2025-01-15', 1970, 271000),
+    (None, 1970, 271000),
+])
+def test_totals_include_items_dated_on_the_as_of_day(dues_workbook, as_of, payable, receivable):
+    dues = get_dues_index(dues_workbook)
+    assert dues.total('Payable', as_of) == payable
+    assert dues.total('Receivable', as_of) == receivable
+    assert dues.open_items('Payable', as_of)['Amount'].sum() == payable
+
+@pytest.mark.parametrize('as_of, expected', [
+    # LP002 is 30 days old on 2025-01-31 and 31 days old a day later
+    ('2025-01-31', {'0-30 days': 1100, '31-60 days': 0, '61-90 days': 870, 'Over 90 days': 0}),
+    ('2025-02-01', {'0-30 days': 800, '31-60 days': 300, '61-90 days': 870, 'Over 90 days': 0}),
+    # IR004 is 90 days old on 2025-03-01 and 91 days old a day later, when LP002 is 60 days old
+    ('2025-03-01', {'0-30 days': 0, '31-60 days': 1100, '61-90 days': 870, 'Over 90 days': 0}),
+    ('2025-03-02', {'0-30 days': 0, '31-60 days': 1100, '61-90 days': 0, 'Over 90 days': 870}),
+])
+def test_age_buckets_include_their_last_day(dues_workbook, as_of, expected):
+    dues = get_dues_index(dues_workbook)
+    aging = dues.aging(as_of).set_index('Age')['Payable']
+    assert aging.to_dict() == expected
+
+    items = dues.open_items('Payable', as_of)
+    by_bucket = items.groupby('Age_Bucket', observed=False)['Amount'].sum()
+    assert by_bucket.to_dict() == expected
+
+def test_ages_default_to_the_latest_item_date(dues_workbook):
+    dues = get_dues_index(dues_workbook)
+    assert dues.last_date == pd.Timestamp('2025-01-15')
+    assert dues.open_items('Payable')['Age_Days'].tolist() == [45, 14, 0]
+
+def test_groups_add_up_items_up_to_the_as_of_day(dues_workbook):
+    dues = get_dues_index(dues_workbook)
+    by_counterparty = dues.by('Payable', 'Counterparty')
+    assert by_counterparty.values.tolist() == [['Land Preparation', 2, 1100], ['Irrigation', 1, 870]]
+    by_crop_season = dues.by('Payable', 'Crop_Season_ID', '2025-01-14')
+    assert by_crop_season.values.tolist() == [['CS002', 1, 870], ['CS001', 1, 300]]
+
+    items = dues.open_items('Payable', '2025-01-15', counterparty='Land Preparation', crop_season_id='CS002')
+    assert items['Record_ID'].tolist() == ['LP004']
+
+# ====================
+# TESTS: MEMORY
+# ====================
+def test_items_hold_text_as_categories_of_their_own_kind(dues_workbook):
+    dues = get_dues_index(dues_workbook)
+    for kind in DUE_KINDS:
+        for column in DUE_TEXT_COLUMNS:
+            assert isinstance(dues.items[kind][column].dtype, pd.CategoricalDtype), (kind, column)
+    assert set(dues.items['Payable']['Counterparty'].cat.categories) == {'Irrigation', 'Land Preparation'}
+    assert dues_workbook.derived_nbytes['dues'] == dues.nbytes > 0
+
+# ====================
+# TESTS: ENTERED ROWS
+# ====================
+# A land preparation bill of 1,000 entered after the fixture's last item date
+ENTERED_PREP = {'Date': '2025-02-01', 'Payment_Status': 'Pending'}
+
+def test_rows_entered_after_the_index_was_built_are_included(dues_workbook):
+    first = get_dues_index(dues_workbook)
+    dues_workbook.set_entry('PRE_PROD_Land_Preparation', 'prep', land_prep_entry(**ENTERED_PREP))
+    dues = get_dues_index(dues_workbook)
+    assert dues is not first
+    assert dues.total('Payable') == 2970
+    assert dues.total('Payable', '2025-01-31') == 1970
+    assert dues.open_items('Payable')['Record_ID'].tolist()[-1] == 'LP007'
+
+    sale = sale_entry(Crop_Season_ID='CS003', Sale_Date='2025-02-05', Qty_Qtls=5, Rate_Per_Qtl=1000, Buyer_Name='FPO', Payment_Received=0)
+    dues_workbook.set_entry('REVENUE_Sales', 'sale', sale)
+    receivables = get_dues_index(dues_workbook).open_items('Receivable')
+    assert receivables.iloc[-1][['Record_ID', 'Counterparty', 'Status', 'Amount']].tolist() == ['SL007', 'FPO', 'Pending', 5000]
+
+def test_entered_rows_paid_off_or_deleted_leave_the_dues(dues_workbook):
+    dues_workbook.set_entry('PRE_PROD_Land_Preparation', 'prep', land_prep_entry(**ENTERED_PREP))
+    assert get_dues_index(dues_workbook).total('Payable') == 2970
+
+    dues_workbook.set_entry('PRE_PROD_Land_Preparation', 'prep', land_prep_entry(**{**ENTERED_PREP, 'Payment_Status': 'Paid'}))
+    assert get_dues_index(dues_workbook).total('Payable') == 1970
+
+    dues_workbook.set_entry('PRE_PROD_Land_Preparation', 'prep', land_prep_entry(**{**ENTERED_PREP, 'Payment_Status': 'Partial'}))
+    assert get_dues_index(dues_workbook).open_items('Payable')['Status'].tolist()[-1] == 'Partial'
+
+    dues_workbook.set_entry('PRE_PROD_Land_Preparation', 'prep', None)
+    assert get_dues_index(dues_workbook).total('Payable') == 1970
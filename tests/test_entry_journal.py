@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+from conftest import land_prep_entry, sale_entry
+from roots_engine import (
+    EntryJournal, WorkbookData, build_updated_workbook, complete_entry_row, compute_summary_metrics, get_running_totals
+)
+
+@pytest.fixture
+def journal(tmp_path):
+    return EntryJournal(str(tmp_path / 'journal.jsonl'))
+
+def assert_same_metrics(actual, expected):
+    for name in ('total_cost', 'total_revenue', 'net_profit', 'roi'):
+        assert actual[name] == pytest.approx(expected[name]), name
+    assert actual['cost_by_phase'] == pytest.approx(expected['cost_by_phase'])
+
+# ====================
+# TESTS: REPLAY
+# ====================
+def test_replay_rebuilds_entries_on_a_fresh_load(sample_bytes, journal):
+    first = WorkbookData(sample_bytes)
+    journal.record_entry(first, 'PRE_PROD_Land_Preparation', land_prep_entry())
+    journal.record_entry(first, 'REVENUE_Sales', sale_entry(), entry_id='sale')
+    journal.record_entry(first, 'REVENUE_Sales', sale_entry(Qty_Qtls=12), entry_id='sale')
+    journal.append({'kind': 'entry', 'workbook': 'another workbook', 'sheet': 'REVENUE_Sales',
+                    'entry_id': 'other', 'row': sale_entry(Sale_ID='SL999')})
+
+    second = WorkbookData(sample_bytes)
+    journal.sync(second)
+
+    for sheet_name in ('PRE_PROD_Land_Preparation', 'REVENUE_Sales'):
+        assert second.entries(sheet_name) == first.entries(sheet_name)
+    assert list(second.entries('REVENUE_Sales')) == ['sale']
+    assert second.entries('REVENUE_Sales')['sale']['Gross_Revenue'] == 24000
+    assert second.pending_changes == 3
+    assert len(second['REVENUE_Sales']) == len(first['REVENUE_Sales']) == 7
+
+def test_deleted_entries_stay_deleted_on_replay(sample_bytes, journal):
+    first = WorkbookData(sample_bytes)
+    journal.record_entry(first, 'PRE_PROD_Land_Preparation', land_prep_entry(), entry_id='prep')
+    journal.record_entry(first, 'PRE_PROD_Land_Preparation', None, entry_id='prep')
+
+    second = WorkbookData(sample_bytes)
+    journal.sync(second)
+    assert second.entries('PRE_PROD_Land_Preparation') == {}
+    assert len(second['PRE_PROD_Land_Preparation']) == 6
+
+# ====================
+# TESTS: TAIL SYNC
+# ====================
+def test_sync_applies_only_lines_added_since_the_last_sync(sample_bytes, journal):
+    writer, reader = WorkbookData(sample_bytes), WorkbookData(sample_bytes)
+    journal.sync(reader)
+    assert reader.journal_offset == 0
+
+    journal.record_entry(writer, 'PRE_PROD_Land_Preparation', land_prep_entry(), entry_id='prep')
+    journal.sync(reader)
+    assert reader.journal_offset == os.path.getsize(journal.path) == writer.journal_offset
+    assert list(reader.entries('PRE_PROD_Land_Preparation')) == ['prep']
+
+    # Syncing again without new lines changes nothing
+    journal.sync(reader)
+    assert reader.pending_changes == 1
+
+def test_sync_leaves_a_partly_written_line_for_later(sample_bytes, journal):
+    reader = WorkbookData(sample_bytes)
+    line = json.dumps({'kind': 'entry', 'workbook': reader.content_key, 'sheet': 'REVENUE_Sales',
+                       'entry_id': 'sale', 'row': sale_entry()}) + '\n'
+    with open(journal.path, 'w', encoding='utf-8') as f:
+        f.write(line[:40])
+
+    journal.sync(reader)
+    assert reader.journal_offset == 0
+    assert reader.entries('REVENUE_Sales') == {}
+
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write(line[40:])
+    journal.sync(reader)
+    assert reader.journal_offset == len(line.encode())
+    assert list(reader.entries('REVENUE_Sales')) == ['sale']
+
+# ====================
+# TESTS: FLUSH MARKERS
+# ====================
+def test_flush_marker_clears_pending_changes(sample_bytes, journal):
+    workbook = WorkbookData(sample_bytes)
+    journal.record_entry(workbook, 'PRE_PROD_Land_Preparation', land_prep_entry())
+    journal.record_entry(workbook, 'REVENUE_Sales', sale_entry())
+    assert workbook.pending_changes == 2
+
+    journal.record_flush(workbook)
+    assert workbook.pending_changes == 0
+    journal.record_entry(workbook, 'REVENUE_Sales', sale_entry(Sale_ID='SL008'))
+    assert workbook.pending_changes == 1
+
+    # Flushed rows are still entries; the marker only says they went out in a download
+    replayed = WorkbookData(sample_bytes)
+    journal.sync(replayed)
+    assert replayed.pending_changes == 1
+    assert len(replayed.entries('REVENUE_Sales')) == 2
+
+def test_flush_marker_of_another_workbook_is_ignored(sample_bytes, journal):
+    workbook = WorkbookData(sample_bytes)
+    journal.record_entry(workbook, 'REVENUE_Sales', sale_entry())
+    journal.append({'kind': 'flush', 'workbook': 'another workbook'})
+    journal.sync(workbook)
+    assert workbook.pending_changes == 1
+
+# ====================
+# TESTS: INCREMENTAL TOTALS
+# ====================
+def test_add_edit_delete_keep_totals_equal_to_a_fresh_load(sample_bytes, journal):
+    workbook = WorkbookData(sample_bytes)
+    before = compute_summary_metrics(workbook)
+    running_totals = workbook.derived['running_totals']
+
+    journal.record_entry(workbook, 'PRE_PROD_Land_Preparation', land_prep_entry(), entry_id='prep')
+    journal.record_entry(workbook, 'REVENUE_Sales', sale_entry(), entry_id='sale')
+    journal.record_entry(workbook, 'PRE_PROD_Land_Preparation', land_prep_entry(Quantity=3, Crop_Season_ID='CS003'), entry_id='prep')
+    journal.record_entry(workbook, 'PROD_Fertilizer_Application', complete_entry_row('PROD_Fertilizer_Application', {
+        'Fertilizer_ID': 'FR008', 'Crop_Season_ID': 'CS002', 'Date': '2025-02-01', 'Qty_KG': 50,
+        'Rate_Per_KG': 30, 'Labor_Cost': 200, 'Payment_Status': 'Pending'
+    }), entry_id='fertilizer')
+    journal.record_entry(workbook, 'REVENUE_Sales', None, entry_id='sale')
+
+    # The running totals absorbed every change rather than being rebuilt
+    assert workbook.derived['running_totals'] is running_totals
+    incremental = compute_summary_metrics(workbook)
+    assert incremental['total_cost'] == pytest.approx(before['total_cost'] + 1500 + 1700)
+    assert incremental['total_revenue'] == pytest.approx(before['total_revenue'])
+
+    reloaded = WorkbookData(build_updated_workbook(workbook))
+    assert_same_metrics(incremental, compute_summary_metrics(reloaded))
+
+# ====================
+# TESTS: CONCURRENT READERS
+# ====================
+def test_readers_never_see_totals_or_entries_change_size(sample_bytes):
+    workbook = WorkbookData(sample_bytes)
+    totals = get_running_totals(workbook)
+    # Switch threads as often as possible, so a reader is caught mid-iteration if a dict can change under it
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    errors, done = [], threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                totals.cost_by_phase
+                for _ in totals.cost_by_crop_season.items():
+                    pass
+                workbook.entries('PRE_PROD_Land_Preparation')
+        except RuntimeError as error:
+            errors.append(error)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    try:
+        for number in range(300):
+            workbook.set_entry('PRE_PROD_Land_Preparation', f"prep-{number}",
+                               land_prep_entry(Land_Prep_ID=f"LP{number + 100}", Crop_Season_ID=f"CS{number + 100}"))
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+    assert workbook.derived['running_totals'] is totals
+    assert len(totals.cost_by_crop_season) >= 300
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from conftest import workbook_bytes
+from roots_engine import WorkbookData, get_crop_season_pnl
+
+def fully_parsed(file_bytes):
+    """A workbook with every sheet parsed whole, so column reads are sliced from the parsed sheets"""
+    workbook = WorkbookData(file_bytes)
+    for sheet_name in workbook:
+        workbook[sheet_name]
+    return workbook
+
+def with_second_total_cost(sheets):
+    """The sample sheets with a land preparation column repeating the Total_Cost header"""
+    land = sheets['PRE_PROD_Land_Preparation']
+    land = pd.concat([land, pd.DataFrame({'Total_Cost': [1] * len(land)})], axis=1)
+    return {**sheets, 'PRE_PROD_Land_Preparation': land}
+
+# ====================
+# TESTS: STREAMED COLUMNS
+# ====================
+@pytest.mark.parametrize('snapshots', [False, True])
+def test_every_sheet_reads_back_as_a_full_parse_gives_it(sample_bytes, tmp_path, snapshots):
+    parsed = fully_parsed(sample_bytes)
+    workbook = WorkbookData(sample_bytes, snapshot_dir=str(tmp_path) if snapshots else None)
+    for sheet_name in workbook:
+        expected = parsed[sheet_name]
+        pd.testing.assert_frame_equal(workbook.read_columns(sheet_name, list(expected.columns)), expected)
+
+def test_columns_read_in_several_passes_match_one_read(sample_bytes):
+    expected = fully_parsed(sample_bytes)['REVENUE_Sales']
+    workbook = WorkbookData(sample_bytes)
+    workbook.read_columns('REVENUE_Sales', ['Sale_ID', 'Gross_Revenue'])
+    workbook.read_columns('REVENUE_Sales', ['Gross_Revenue', 'Sale_Date', 'Not_A_Column'])
+    columns = ['Sale_Date', 'Sale_ID', 'Buyer_Name', 'Gross_Revenue']
+    pd.testing.assert_frame_equal(workbook.read_columns('REVENUE_Sales', columns), expected[columns])
+
+def test_blank_rows_between_filled_rows_are_kept(sample_sheets):
+    sales = sample_sheets['REVENUE_Sales']
+    blank = pd.DataFrame([[None] * len(sales.columns)], columns=sales.columns)
+    file_bytes = workbook_bytes({**sample_sheets, 'REVENUE_Sales': pd.concat([sales.iloc[:2], blank, sales.iloc[2:]])})
+
+    expected = fully_parsed(file_bytes)['REVENUE_Sales'][['Sale_ID', 'Gross_Revenue']]
+    assert len(expected) == len(sales) + 1
+    pd.testing.assert_frame_equal(WorkbookData(file_bytes).read_columns('REVENUE_Sales', ['Sale_ID', 'Gross_Revenue']), expected)
+
+# ====================
+# TESTS: REPEATED HEADERS
+# ====================
+def test_repeated_header_is_read_as_its_own_column(sample_sheets, tmp_path):
+    file_bytes = workbook_bytes(with_second_total_cost(sample_sheets))
+    columns = ['Crop_Season_ID', 'Total_Cost', 'Total_Cost.1']
+    expected = fully_parsed(file_bytes)['PRE_PROD_Land_Preparation']
+    assert expected.columns[-1] == 'Total_Cost.1'
+
+    for workbook in (WorkbookData(file_bytes), WorkbookData(file_bytes, snapshot_dir=str(tmp_path))):
+        subset = workbook.read_columns('PRE_PROD_Land_Preparation', columns)
+        pd.testing.assert_frame_equal(subset, expected[columns])
+        assert subset['Total_Cost'].tolist() == sample_sheets['PRE_PROD_Land_Preparation']['Total_Cost'].tolist()
+
+def test_repeated_header_leaves_crop_season_totals_alone(sample_sheets, sample_bytes):
+    file_bytes = workbook_bytes(with_second_total_cost(sample_sheets))
+    expected = get_crop_season_pnl(fully_parsed(sample_bytes))
+    pd.testing.assert_frame_equal(get_crop_season_pnl(WorkbookData(file_bytes)), expected)
+    pd.testing.assert_frame_equal(get_crop_season_pnl(fully_parsed(file_bytes)), expected)
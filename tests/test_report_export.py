@@ -0,0 +1,80 @@
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import roots_engine
+from roots_engine import export_report, get_crop_season_pnl
+
+def report_tables(workbook):
+    """A whole aggregate table and a sheet restricted to, and ordered by, row positions"""
+    return [
+        ('Crop Season P&L', get_crop_season_pnl(workbook), None),
+        ('REVENUE_Sales', workbook['REVENUE_Sales'], np.array([4, 0, 2])),
+    ]
+
+def expected_rows(frame, rows):
+    rows = frame if rows is None else frame.iloc[rows]
+    return rows.reset_index(drop=True)
+
+def as_plain(frame):
+    """Categoricals as their values, since only Parquet keeps them"""
+    return frame.astype({column: object for column in frame if isinstance(frame[column].dtype, pd.CategoricalDtype)})
+
+# ====================
+# TESTS: XLSX
+# ====================
+@pytest.mark.parametrize('xlsx_writer', ['xlsxwriter', 'openpyxl'])
+def test_xlsx_has_one_worksheet_per_table_with_the_chosen_rows(sample_workbook, monkeypatch, xlsx_writer):
+    if xlsx_writer == 'xlsxwriter' and roots_engine.xlsxwriter is None:
+        pytest.skip("xlsxwriter is not installed")
+    if xlsx_writer == 'openpyxl':
+        monkeypatch.setattr(roots_engine, 'xlsxwriter', None)
+    tables = report_tables(sample_workbook)
+
+    with export_report(tables, '.xlsx', chunk_rows=2) as output:
+        sheets = pd.read_excel(output, sheet_name=None)
+    assert list(sheets) == [name for name, _, _ in tables]
+    for name, frame, rows in tables:
+        pd.testing.assert_frame_equal(sheets[name], as_plain(expected_rows(frame, rows)), check_dtype=False)
+
+# ====================
+# TESTS: ZIP OF CSV OR PARQUET
+# ====================
+def read_members(output, extension):
+    with zipfile.ZipFile(output) as archive:
+        return {
+            name: pd.read_csv(io.BytesIO(archive.read(name))) if extension == '.csv' else pd.read_parquet(io.BytesIO(archive.read(name)))
+            for name in archive.namelist()
+        }
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_zip_has_one_file_per_table_written_a_chunk_at_a_time(sample_workbook, extension):
+    tables = report_tables(sample_workbook)
+    with export_report(tables, extension, chunk_rows=2) as output:
+        members = read_members(output, extension)
+
+    assert list(members) == [f"Crop_Season_P_L{extension}", f"REVENUE_Sales{extension}"]
+    for (name, frame, rows), member in zip(tables, members.values()):
+        expected = expected_rows(frame, rows)
+        if extension == '.parquet':
+            pd.testing.assert_frame_equal(member, expected)
+        else:
+            assert list(member.columns) == list(expected.columns)
+            assert len(member) == len(expected)
+            numbers = expected.select_dtypes('number').columns
+            pd.testing.assert_frame_equal(member[numbers], expected[numbers], check_dtype=False)
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_table_without_rows_keeps_its_header(sample_workbook, extension):
+    sales = sample_workbook['REVENUE_Sales']
+    with export_report([('Sales', sales, np.array([], dtype=int))], extension) as output:
+        member, = read_members(output, extension).values()
+    assert list(member.columns) == list(sales.columns)
+    assert member.empty
+
+def test_unknown_format_is_refused(sample_workbook):
+    with pytest.raises(ValueError, match='Unsupported export format'):
+        export_report(report_tables(sample_workbook), '.json')
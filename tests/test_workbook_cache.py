@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from conftest import sale_entry
+from roots_engine import WorkbookData, get_cash_flow_ledger, get_dues_index
+
+# ====================
+# TESTS: MEMORY ACCOUNTING
+# ====================
+def test_cash_flow_and_dues_are_counted_with_the_workbook(sample_bytes):
+    workbook = WorkbookData(sample_bytes)
+    before = workbook.nbytes
+    ledger, dues = get_cash_flow_ledger(workbook), get_dues_index(workbook)
+
+    assert workbook.derived_nbytes['cash_flow'] == ledger.nbytes > 0
+    assert workbook.derived_nbytes['dues'] == dues.nbytes > 0
+    assert workbook.nbytes >= before + ledger.nbytes + dues.nbytes
+
+def test_sheets_merged_with_entered_rows_are_counted(sample_bytes):
+    workbook = WorkbookData(sample_bytes)
+    workbook['REVENUE_Sales']
+    before = workbook.nbytes
+    workbook.set_entry('REVENUE_Sales', 'sale', sale_entry())
+    merged = workbook['REVENUE_Sales']
+    assert workbook.nbytes == before + merged.memory_usage(deep=True).sum()
+
+def test_columns_read_on_their_own_are_let_go_once_the_sheet_is_parsed(sample_bytes):
+    workbook = WorkbookData(sample_bytes)
+    workbook.read_columns('REVENUE_Sales', ['Sale_ID', 'Gross_Revenue'])
+    workbook['REVENUE_Sales']
+    stats = workbook.sheet_stats()
+    assert stats[stats['Sheet'] == 'REVENUE_Sales']['Columns'].tolist() == ['all']
+    assert workbook.nbytes == workbook.nbytes_raw + stats['Bytes'].sum()
+
+# ====================
+# TESTS: EVICTION
+# ====================
+def test_built_cash_flow_and_dues_pages_push_a_workbook_out_of_the_cache(roots_app, sample_bytes):
+    first = WorkbookData(sample_bytes, content_key='first')
+    second = WorkbookData(sample_bytes, content_key='second')
+    for sheet_name in first:
+        first[sheet_name]
+    cache = roots_app.WorkbookCache(max_entries=5)
+    # Both workbooks fit until the cash flow and dues pages are built
+    cache.max_bytes = first.nbytes + second.nbytes
+
+    cache.put('first', first)
+    cache.put('second', second)
+    assert len(cache) == 2
+
+    get_cash_flow_ledger(first)
+    get_dues_index(first)
+    assert cache.get('second') is second
+    assert cache.peek('first') is None
+    assert cache.evicted_bytes == first.nbytes
+
+# ====================
+# TESTS: PRUNING FILES
+# ====================
+def workbook_files(directory, keys, suffix):
+    """One empty file, or directory when suffix is empty, per content key, loaded in the given order"""
+    for loaded_at, key in enumerate(keys):
+        path = directory / f"{key}{suffix}"
+        if suffix:
+            path.write_bytes(b'')
+        else:
+            path.mkdir()
+            (path / 'manifest.json').write_text('{}')
+        os.utime(path, (loaded_at, loaded_at))
+
+def test_pruning_keeps_the_files_of_cached_workbooks(roots_app, sample_bytes, tmp_path):
+    a, b, c = (letter * 64 for letter in 'abc')
+    workbook_files(tmp_path, [a, b, c], '.sqlite')
+    cache = roots_app.WorkbookCache(max_entries=2)
+
+    # Load A, load B, open A again, load C: the cache keeps A, which was used more recently than B
+    for key in (a, b):
+        cache.put(key, WorkbookData(sample_bytes, content_key=key))
+    cache.get(a)
+    cache.put(c, WorkbookData(sample_bytes, content_key=c))
+    assert sorted(cache.keys()) == [a, c]
+
+    roots_app.prune_workbook_files(str(tmp_path), keep=cache.max_entries, cached=cache.keys(), suffix='.sqlite')
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"{a}.sqlite", f"{c}.sqlite"]
+
+@pytest.mark.parametrize('suffix', ['.sqlite', ''])
+def test_pruning_keeps_the_newest_files_of_evicted_workbooks_in_the_room_left(roots_app, tmp_path, suffix):
+    a, b, c, d = (letter * 64 for letter in 'abcd')
+    workbook_files(tmp_path, [a, b, c, d], suffix)
+    (tmp_path / 'notes.txt').write_text('not a workbook')
+
+    roots_app.prune_workbook_files(str(tmp_path), keep=3, cached=[a], suffix=suffix)
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted([f"{a}{suffix}", f"{c}{suffix}", f"{d}{suffix}", 'notes.txt'])
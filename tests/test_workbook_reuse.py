@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+
+import roots_engine
+from conftest import copy_sheets, land_prep_entry, workbook_bytes
+from roots_engine import (
+    WorkbookData, compute_summary_metrics, get_cash_flow_ledger, get_crop_season_pnl,
+    get_dues_index, get_season_rollup
+)
+
+# Aggregates every page builds
+ALL_AGGREGATES = {
+    'cube', 'running_totals', 'crop_season_pnl', 'season_rollup', 'cash_flow', 'dues',
+    'dimension:crop', 'dimension:crop_season', 'dimension:season'
+}
+
+def load_with_aggregates(file_bytes):
+    workbook = WorkbookData(file_bytes)
+    compute_summary_metrics(workbook)
+    get_crop_season_pnl(workbook)
+    get_season_rollup(workbook)
+    get_cash_flow_ledger(workbook)
+    get_dues_index(workbook)
+    assert set(workbook.derived) == ALL_AGGREGATES
+    return workbook
+
+def modified(sheets, sheet_name, change):
+    sheets = copy_sheets(sheets)
+    change(sheets[sheet_name])
+    return sheets
+
+def rename_wheat(crops):
+    crops.loc[crops['Crop_Name'] == 'Wheat', 'Crop_Name'] = 'Durum Wheat'
+
+# ====================
+# TESTS: REUSE UNCHANGED
+# ====================
+def test_changed_master_sheet_keeps_aggregates_that_never_read_it(sample_sheets):
+    previous = load_with_aggregates(workbook_bytes(sample_sheets))
+    new_bytes = workbook_bytes(modified(sample_sheets, 'MASTER_Crops', rename_wheat))
+    workbook = WorkbookData(new_bytes)
+
+    assert workbook.reuse_unchanged(previous) == ['MASTER_Crops']
+    assert set(workbook.derived) == {
+        'cube', 'running_totals', 'cash_flow', 'dues', 'dimension:crop_season', 'dimension:season'
+    }
+    # Aggregates absorbing entered rows are copied, never shared between versions
+    assert workbook.derived['running_totals'] is not previous.derived['running_totals']
+
+    fresh = WorkbookData(new_bytes)
+    pnl = get_crop_season_pnl(workbook)
+    assert 'Durum Wheat' in set(pnl['Crop_Name'])
+    pd.testing.assert_frame_equal(pnl, get_crop_season_pnl(fresh))
+    assert compute_summary_metrics(workbook) == compute_summary_metrics(fresh)
+
+def test_changed_fact_sheet_keeps_only_the_master_data_lookups(sample_sheets):
+    previous = load_with_aggregates(workbook_bytes(sample_sheets))
+
+    def double_first_sale(sales):
+        sales.loc[0, ['Qty_Qtls', 'Gross_Revenue', 'Payment_Received']] *= 2
+    new_bytes = workbook_bytes(modified(sample_sheets, 'REVENUE_Sales', double_first_sale))
+    workbook = WorkbookData(new_bytes)
+
+    assert workbook.reuse_unchanged(previous) == ['REVENUE_Sales']
+    assert set(workbook.derived) == {'dimension:crop', 'dimension:crop_season', 'dimension:season'}
+
+    metrics = compute_summary_metrics(workbook)
+    assert metrics['total_revenue'] == pytest.approx(compute_summary_metrics(previous)['total_revenue'] + 273000)
+    assert metrics == compute_summary_metrics(WorkbookData(new_bytes))
+
+def test_aggregates_over_sheets_with_entered_rows_are_not_carried_over(sample_sheets):
+    previous = load_with_aggregates(workbook_bytes(sample_sheets))
+    previous.set_entry('PRE_PROD_Land_Preparation', 'prep', land_prep_entry())
+    # Running totals absorbed the row, so they are still held by the earlier version
+    assert 'running_totals' in previous.derived
+
+    workbook = WorkbookData(workbook_bytes(modified(sample_sheets, 'MASTER_Crops', rename_wheat)))
+    assert workbook.reuse_unchanged(previous) == ['MASTER_Crops']
+    assert set(workbook.derived) == {'dimension:crop_season', 'dimension:season'}
+
+def test_unchanged_workbook_keeps_every_aggregate(sample_sheets):
+    file_bytes = workbook_bytes(sample_sheets)
+    previous = load_with_aggregates(file_bytes)
+    workbook = WorkbookData(file_bytes)
+
+    assert workbook.reuse_unchanged(previous) == []
+    assert set(workbook.derived) == ALL_AGGREGATES
+    assert workbook.derived_sheets == previous.derived_sheets
+
+def test_added_sheet_keeps_parsed_sheets_but_no_aggregates(sample_sheets):
+    previous = load_with_aggregates(workbook_bytes(sample_sheets))
+    sheets = {**sample_sheets, 'Notes': pd.DataFrame({'Note': ['new sheet']})}
+    workbook = WorkbookData(workbook_bytes(sheets))
+
+    assert workbook.reuse_unchanged(previous) == ['Notes']
+    assert workbook.derived == {}
+    assert sorted(workbook.sheet_stats()['Sheet']) == sorted(previous.sheet_stats()['Sheet'])
+
+def test_workbook_without_fingerprints_reuses_nothing(sample_sheets, monkeypatch):
+    previous = load_with_aggregates(workbook_bytes(sample_sheets))
+    # Files other than xlsx, such as .xls, have no sheet fingerprints to compare
+    monkeypatch.setattr(roots_engine, 'sheet_fingerprints', lambda file_bytes: {})
+    workbook = WorkbookData(workbook_bytes(modified(sample_sheets, 'MASTER_Crops', rename_wheat)))
+
+    assert workbook.sheet_fingerprints() == {}
+    assert workbook.reuse_unchanged(previous) == sorted(workbook)
+    assert workbook.derived == {}
+    assert workbook.sheet_stats().empty